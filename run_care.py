@@ -1,5 +1,13 @@
 import sys
 import carereport.views.care_app
-from carereport import app
+from carereport import app, mainwindow
+from carereport.views.startup import (Startup, StartupSplash, care_stages,
+                                      window_needs)
+
+startup = Startup(care_stages())
+splash = StartupSplash(startup, mainwindow)
+splash.show()
+mainwindow.wait_for(startup, window_needs)
+startup.start()
 
 sys.exit(app.exec())
@@ -20,28 +20,49 @@ import getpass
 from sqlalchemy import create_engine
 from sqlalchemy.orm import DeclarativeBase
 from configparser import ConfigParser
-from sqlalchemy import (String, DateTime)
-from sqlalchemy.orm import sessionmaker, mapped_column
+from sqlalchemy import (String, DateTime, Integer, text)
+from sqlalchemy.orm import sessionmaker, mapped_column, declared_attr
+from carereport.routing import RoutingSession, replica_uris
 
 
 config = ConfigParser()
 success = config.read('localcarereport.cfg')
 if success:
     dburi = config['DATABASE']['SQLALCHEMY_DATABASE_URI']
-    engine = create_engine(dburi, isolation_level="READ UNCOMMITTED")
-    Session = sessionmaker(bind=engine)
+    isolation_level = config['DATABASE'].get('ISOLATION_LEVEL',
+                                             'READ COMMITTED')
+    engine = create_engine(dburi, isolation_level=isolation_level)
+    replicas = [create_engine(uri, isolation_level=isolation_level)
+                for uri in replica_uris(config['DATABASE'])]
+    Session = sessionmaker(bind=engine, class_=RoutingSession,
+                           replicas=replicas,
+                           read_your_writes=config['DATABASE'].getfloat(
+                               'READ_YOUR_WRITES_SECONDS', 5.0))
     session = Session()
 else:
     raise FileNotFoundError('Configuration file not loaded!')
 
 
 class Base(DeclarativeBase):
-    """ Add mutation fields to each table """
+    """ Add mutation fields to each table
+
+    The version is counted up with each update. An update of a row that
+    was changed by someone else since it was read fails with a
+    StaleDataError, instead of overwriting the other change.
+    """
 
     user = mapped_column(String(25), default=getpass.getuser,
                          onupdate=getpass.getuser)
     updated_at = mapped_column(DateTime, default=datetime.now,
                                onupdate=datetime.now)
+    version_id = mapped_column(Integer, nullable=False,
+                               server_default=text("1"))
+
+    @declared_attr.directive
+    def __mapper_args__(cls):
+        """ Let the ORM check and count up the version """
+
+        return {"version_id_col": cls.__table__.c.version_id}
 
 
 def validate_field_existance(instance, key, field, raise_on_empty):
@@ -56,5 +77,13 @@ from carereport.models.patient import Patient, Intake
 from carereport.models.medical import (Medication, ExaminationRequest,
                                        ExaminationResult, DietHeader,
                                        DietLines, Diagnose)
-from carereport.views.care_app import mainwindow
+from carereport.models.bulkimport import ImportKey, ImportProgress
+from carereport.models.archive import archive_tables
+from carereport.models.suggestions import TermUsage
+from carereport.models.termsnapshot import open_snapshot, save_snapshot
+from carereport.views.care_app import mainwindow, app
 from carereport.views.scripts_patient import new_current_patient_emitter
+from carereport.views.charttabs import chart_tab_providers
+
+open_snapshot()
+app.aboutToQuit.connect(save_snapshot)
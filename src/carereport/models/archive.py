@@ -0,0 +1,218 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+""" This module moves closed records to archive tables.
+
+Medication that has ended, examination requests that were executed or
+refused and diets that have expired are not needed for the daily care of
+a patient. When they are older than the archive age they are moved to an
+archive table with the same columns, so the tables used every day stay
+small.
+
+The age is set in days in the configuration file:
+
+    [ARCHIVE]
+    AGE_DAYS = 730
+
+Records are moved in chunks, each chunk in its own transaction. If the
+archiving is interrupted it can simply be started again. Queries that need
+the history, like reports over a past period, can include the archive
+with :py:func:`with_archive`.
+"""
+
+import sys
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Callable
+from sqlalchemy import (Table, Column, DateTime, Integer, and_, or_,
+                        exists, func, select, insert, delete, union_all)
+from sqlalchemy.orm import aliased
+from carereport import Base, Session, config
+from .medical import (Medication, ExaminationRequest, ExaminationResult,
+                      DietHeader, DietLines, DiagnoseExaminations)
+
+
+def archive_table(table):
+    """ Return the archive table for table
+
+    The archive has the same columns, without the constraints, and the
+    time the row was archived. The archive has a key of its own, the id a
+    row had in table is indexed only: a database may hand out an id again
+    after the row with it was deleted, and a row archived later with that
+    id must still fit in the archive.
+    """
+
+    return Table(f"{table.name}_archive", Base.metadata,
+                 Column("archive_id", Integer, primary_key=True),
+                 *(Column(column.name, column.type,
+                          index=column.primary_key)
+                   for column in table.columns),
+                 Column("archived_at", DateTime, default=func.now()))
+
+
+archive_tables = {table.name: archive_table(table)
+                  for table in (Medication.__table__,
+                                ExaminationRequest.__table__,
+                                ExaminationResult.__table__,
+                                DietHeader.__table__,
+                                DietLines.__table__)}
+
+
+def with_archive(model):
+    """ Return model including its archive, for use in queries
+
+    The result is an alias of the model, that can be selected and used in
+    conditions like the model itself::
+
+        all_medication = with_archive(Medication)
+        select(all_medication).where(all_medication.patient_id == 12)
+
+    """
+
+    table = model.__table__
+    archive = archive_tables[table.name]
+    all_rows = union_all(select(table),
+                         select(*(archive.c[column.name]
+                                  for column in table.columns)))
+    return aliased(model, all_rows.subquery(f"{table.name}_all"))
+
+
+def archive_age():
+    """ The number of days after which closed records are archived """
+
+    return config.getint("ARCHIVE", "AGE_DAYS", fallback=730)
+
+
+def ended_medication(cutoff):
+    """ Medication that ended before cutoff """
+
+    return Medication.end_date < cutoff
+
+
+def closed_requests(cutoff):
+    """ Requests executed or refused before cutoff
+
+    Requests that support a diagnose stay, the diagnose refers to them.
+    """
+
+    return and_(or_(ExaminationRequest.date_execution < cutoff,
+                    and_(ExaminationRequest.request_refused.is_not(None),
+                         ExaminationRequest.request_refused != "",
+                         ExaminationRequest.date_request < cutoff)),
+                ~exists().where(DiagnoseExaminations.examination_id ==
+                                ExaminationRequest.id))
+
+
+def expired_diets(cutoff):
+    """ Diets that ended before cutoff """
+
+    return DietHeader.end_date < cutoff
+
+
+@dataclass
+class ArchiveRule():
+    """ Which records of a model are archived
+
+        :model: The model class of the records
+        :closed: Function returning the condition for records closed
+                     before the cutoff date passed
+        :children: Tuples of the model and the foreign key of records that
+                     are archived with their parent
+
+    """
+
+    model: type
+    closed: Callable
+    children: list = field(default_factory=list)
+
+
+archive_rules = [ArchiveRule(Medication, ended_medication),
+                 ArchiveRule(ExaminationRequest, closed_requests,
+                             [(ExaminationResult,
+                               ExaminationResult.request_id)]),
+                 ArchiveRule(DietHeader, expired_diets,
+                             [(DietLines, DietLines.diet_id)])]
+
+
+class Archiver():
+    """ Move closed records older than the archive age to the archive
+
+    The archiver uses a session of its own, unless one is passed, as each
+    chunk is committed.
+    """
+
+    def __init__(self, age_days=None, chunk_size=1000,
+                 archive_session=None):
+
+        self.age_days = archive_age() if age_days is None else age_days
+        self.chunk_size = chunk_size
+        self.archive_session = archive_session
+
+    @property
+    def cutoff(self):
+        """ Records closed before this date are archived """
+
+        return date.today() - timedelta(days=self.age_days)
+
+    def run(self):
+        """ Archive the records of all rules
+
+        Returns a dictionary of table name to the number of rows moved.
+        """
+
+        archive_session = self.archive_session or Session()
+        try:
+            moved = {}
+            for rule in archive_rules:
+                self.archive(archive_session, rule, moved)
+            return moved
+        finally:
+            if self.archive_session is None:
+                archive_session.close()
+
+    def archive(self, archive_session, rule, moved):
+        """ Archive the closed records of rule chunk by chunk """
+
+        closed = rule.closed(self.cutoff)
+        while ids := archive_session.scalars(
+                select(rule.model.id).where(closed)
+                .order_by(rule.model.id).limit(self.chunk_size)).all():
+            for child, foreign_key in rule.children:
+                self.move(archive_session, child, foreign_key.in_(ids),
+                          moved)
+            self.move(archive_session, rule.model, rule.model.id.in_(ids),
+                      moved)
+            archive_session.commit()
+
+    def move(self, archive_session, model, condition, moved):
+        """ Copy the rows of model meeting condition and delete them """
+
+        table = model.__table__
+        archive = archive_tables[table.name]
+        columns = [column.name for column in table.columns]
+        archive_session.execute(
+            insert(archive).from_select(columns,
+                                        select(table).where(condition)))
+        count = archive_session.execute(
+            delete(table).where(condition)).rowcount
+        moved[table.name] = moved.get(table.name, 0) + count
+
+
+if __name__ == "__main__":
+    age_days = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    for table_name, count in Archiver(age_days).run().items():
+        print(f"{table_name}: {count} rows archived")
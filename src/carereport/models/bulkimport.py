@@ -0,0 +1,551 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+""" This module imports patients and their records in bulk.
+
+Data from other systems arrives in transfer files, CSV or JSON lines, one
+file per type of record. Each row has a key from the other system, and rows
+for e.g. medication have the key of their patient. The import maps these
+keys to the ids in this system, keeping the mapping in a table, so a
+patient file can be imported today and the medication tomorrow.
+
+The rows are imported in chunks. A chunk is checked as a whole, inserted
+with multi row inserts and committed together with the progress in the
+file. An import that is interrupted can be started again and continues
+after the last chunk committed. Rows that cannot be imported are reported
+as rejects with the reason. The rows are checked with the column checks of
+the models, a chunk the database still refuses is rolled back to a
+savepoint and all its rows are rejected.
+
+The record types and their fields are:
+
+    :patient: key, surname, initials, birthdate, sex
+    :intake: key, patient_key, date_intake, result
+    :medication: key, patient_key, medication, frequency, frequency_type,
+                     start_date, end_date
+    :examination: key, patient_key, date_request, examination_kind,
+                      examaning_department, requester_name,
+                      requester_department, date_execution, request_refused
+    :diet: key, patient_key, diet_name, permanent_diet, start_date,
+               end_date, food_name, application_type, description
+
+A key can be in a file once. A diet has a row per diet line, the rows of a
+diet must follow each other, a diet key found again further on is rejected
+with all its rows.
+Dates are in ISO format (2025-03-01).
+"""
+
+import csv
+import getpass
+import os
+import sys
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from itertools import groupby, islice
+from typing import Callable, Optional
+import ujson
+from sqlalchemy import String, Integer, Index, insert, select
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import mapped_column
+from carereport import Base, session
+from .patient import Patient, Intake
+from .medical import Medication, ExaminationRequest, DietHeader, DietLines
+from .columnchecks import check_columns, column_rules
+
+
+class UnknownRecordTypeError(ValueError):
+    """ The record type is not one that can be imported """
+
+    pass
+
+
+class UnknownFileTypeError(ValueError):
+    """ Only CSV and JSON lines files can be imported """
+
+    pass
+
+
+class ParentNotImportedError(ValueError):
+    """ The record refers to a key that has not been imported """
+
+    pass
+
+
+class KeyAlreadyImportedError(ValueError):
+    """ A record with this key was imported before """
+
+    pass
+
+
+class DuplicateKeyError(ValueError):
+    """ The key is used by more than one record in the file """
+
+    pass
+
+
+class ImportKey(Base):
+    """ The id a key from another system was imported as
+
+        :source: The name of the system the data comes from
+        :record_type: The type of record imported
+        :source_key: The key in the source system
+        :target_id: The id of the record in this system
+
+    """
+
+    __tablename__ = "importkeys"
+
+    id = mapped_column(Integer, primary_key=True)
+    source = mapped_column(String(56), nullable=False)
+    record_type = mapped_column(String(12), nullable=False)
+    source_key = mapped_column(String(56), nullable=False)
+    target_id = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (Index("bysourcekey", "source", "record_type",
+                            "source_key", unique=True),)
+
+
+class ImportProgress(Base):
+    """ How far the import of a file has come
+
+    The number of rows done is committed with each chunk of rows.
+    """
+
+    __tablename__ = "importprogress"
+
+    id = mapped_column(Integer, primary_key=True)
+    source = mapped_column(String(56), nullable=False)
+    file_name = mapped_column(String(256), nullable=False)
+    rows_done = mapped_column(Integer, nullable=False, default=0)
+
+    __table_args__ = (Index("bysourcefile", "source", "file_name",
+                            unique=True),)
+
+
+@dataclass
+class Reject():
+    """ A row that was not imported
+
+        :line: The number of the row in the file, starting at 1
+        :key: The key of the row, if it had one
+        :reason: Why the row was rejected
+
+    """
+
+    line: int
+    key: Optional[str]
+    reason: str
+
+
+@dataclass
+class ImportReport():
+    """ The outcome of importing one file """
+
+    record_type: str
+    file_name: str
+    rows_read: int = 0
+    imported: int = 0
+    skipped: int = 0
+    rejects: list = field(default_factory=list)
+
+
+def optional_date(value):
+    """ Convert an ISO date string to a date, empty is None """
+
+    if value in (None, ""):
+        return None
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+
+def optional_text(value):
+    """ Empty strings from a CSV file are None """
+
+    return None if value == "" else value
+
+
+def flag(value):
+    """ Convert a yes/no value to a boolean """
+
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "j", "ja")
+
+
+def patient_values(row):
+    """ Column values for a patient row """
+
+    return {"surname": row.get("surname"),
+            "initials": row.get("initials"),
+            "birthdate": optional_date(row.get("birthdate")),
+            "sex": row.get("sex") or " "}
+
+
+def intake_values(row):
+    """ Column values for an intake row """
+
+    return {"date_intake": optional_date(row.get("date_intake")),
+            "result": row.get("result")}
+
+
+def whole_number(value):
+    """ Convert a number to an int, other values are left to the checks """
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def medication_values(row):
+    """ Column values for a medication row """
+
+    return {"medication": row.get("medication"),
+            "frequency": whole_number(row.get("frequency") or 1),
+            "frequency_type": row.get("frequency_type", "per dag"),
+            "start_date": (optional_date(row.get("start_date"))
+                           or date.today()),
+            "end_date": optional_date(row.get("end_date"))}
+
+
+def examination_values(row):
+    """ Column values for an examination request row """
+
+    return {"date_request": (optional_date(row.get("date_request"))
+                             or date.today()),
+            "examination_kind": row.get("examination_kind"),
+            "examaning_department": row.get("examaning_department"),
+            "requester_name": row.get("requester_name"),
+            "requester_department": optional_text(
+                row.get("requester_department")),
+            "date_execution": optional_date(row.get("date_execution")),
+            "request_refused": optional_text(row.get("request_refused"))}
+
+
+def diet_values(row):
+    """ Column values for the header of a diet row """
+
+    return {"diet_name": row.get("diet_name"),
+            "permanent_diet": flag(row.get("permanent_diet", False)),
+            "start_date": optional_date(row.get("start_date")),
+            "end_date": optional_date(row.get("end_date"))}
+
+
+def diet_line_values(row):
+    """ Column values for the diet line of a diet row """
+
+    return {"food_name": row.get("food_name"),
+            "application_type": row.get("application_type"),
+            "description": optional_text(row.get("description"))}
+
+
+@dataclass
+class RecordType():
+    """ How to import a type of record
+
+        :name: The name of the record type in transfer files
+        :model: The model class the records are imported into
+        :values: Function returning the column values for a row. The
+                     values are checked with the column checks of the model.
+        :parent: The record type the rows refer to, if any
+
+    """
+
+    name: str
+    model: type
+    values: Callable
+    parent: Optional[str] = None
+
+
+record_types = {"patient": RecordType("patient", Patient, patient_values),
+                "intake": RecordType("intake", Intake, intake_values,
+                                     parent="patient"),
+                "medication": RecordType("medication", Medication,
+                                         medication_values,
+                                         parent="patient"),
+                "examination": RecordType("examination", ExaminationRequest,
+                                          examination_values,
+                                          parent="patient"),
+                "diet": RecordType("diet", DietHeader, diet_values,
+                                   parent="patient")}
+
+
+def read_rows(path):
+    """ Generate the rows of a CSV or JSON lines file as dictionaries """
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        with open(path, newline="", encoding="utf-8") as transfer_file:
+            yield from csv.DictReader(transfer_file)
+    elif extension in (".jsonl", ".json"):
+        with open(path, encoding="utf-8") as transfer_file:
+            for line in transfer_file:
+                if line.strip():
+                    yield ujson.loads(line)
+    else:
+        raise UnknownFileTypeError(f"Cannot import {path}")
+
+
+class BulkImport():
+    """ Import transfer files from a source system in chunks
+
+    The rows of a chunk are checked together, their parents are looked up
+    with one query and they are inserted with a multi row insert. Each chunk
+    is committed with the progress of the import.
+    """
+
+    def __init__(self, source, chunk_size=5000, reject_file=None):
+
+        self.source = source
+        self.chunk_size = chunk_size
+        self.reject_writer = (csv.writer(reject_file) if reject_file
+                              else None)
+
+    def import_file(self, record_type_name, path):
+        """ Import the file at path as records of type record_type_name """
+
+        if record_type_name not in record_types:
+            raise UnknownRecordTypeError(f"Cannot import {record_type_name}")
+        record_type = record_types[record_type_name]
+        report = ImportReport(record_type=record_type_name,
+                              file_name=os.path.basename(path))
+        progress = self.progress_for(report.file_name)
+        report.skipped = progress.rows_done
+        numbered = islice(enumerate(read_rows(path), start=1),
+                          progress.rows_done, None)
+        for chunk in self.chunks(record_type, numbered):
+            self.import_chunk(record_type, chunk, report)
+            progress.rows_done += len(chunk)
+            report.rows_read += len(chunk)
+            session.commit()
+        return report
+
+    def progress_for(self, file_name):
+        """ Return the progress for file_name, starting it if new
+
+        A new progress is committed right away, also when the file turns
+        out to have no rows to import.
+        """
+
+        progress = session.scalars(
+            select(ImportProgress).where(
+                ImportProgress.source == self.source,
+                ImportProgress.file_name == file_name)).one_or_none()
+        if progress is None:
+            progress = ImportProgress(source=self.source,
+                                      file_name=file_name, rows_done=0)
+            session.add(progress)
+            session.commit()
+        return progress
+
+    def chunks(self, record_type, numbered):
+        """ Generate lists of at most chunk size numbered rows
+
+        The rows of one diet are never split over chunks.
+        """
+
+        if record_type.name != "diet":
+            while chunk := list(islice(numbered, self.chunk_size)):
+                yield chunk
+            return
+        chunk = []
+        for _, diet_rows in groupby(numbered,
+                                    key=lambda row: row[1].get("key")):
+            chunk.extend(diet_rows)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def reject(self, report, line, key, reason):
+        """ Record a rejected row """
+
+        rejected = Reject(line=line, key=key, reason=str(reason))
+        report.rejects.append(rejected)
+        if self.reject_writer:
+            self.reject_writer.writerow([report.file_name, rejected.line,
+                                         rejected.key, rejected.reason])
+
+    def known_keys(self, record_type_name, keys):
+        """ Return a dictionary of key to id for keys already imported """
+
+        if not keys:
+            return {}
+        return dict(session.execute(
+            select(ImportKey.source_key, ImportKey.target_id).where(
+                ImportKey.source == self.source,
+                ImportKey.record_type == record_type_name,
+                ImportKey.source_key.in_(keys))).all())
+
+    def import_chunk(self, record_type, chunk, report):
+        """ Check, map and insert the rows of a chunk
+
+        The rows accepted are inserted in a savepoint. When the database
+        refuses them, the savepoint is rolled back and the rows of the
+        chunk are rejected.
+        """
+
+        keys = {str(row["key"]) for _, row in chunk if row.get("key")}
+        duplicates = self.known_keys(record_type.name, keys)
+        parent_ids = {}
+        if record_type.parent:
+            parent_keys = {str(row.get("patient_key")) for _, row in chunk}
+            parent_ids = self.known_keys(record_type.parent, parent_keys)
+        converted = []
+        rejected_keys = set()
+        seen = set()
+        previous = None
+        for line, row in chunk:
+            key = str(row["key"]) if row.get("key") else None
+            repeated = key in seen and (record_type.name != "diet"
+                                        or key != previous)
+            seen.add(key)
+            previous = key
+            try:
+                if key is None:
+                    raise ValueError("key cannot be empty")
+                if key in duplicates:
+                    raise KeyAlreadyImportedError(f"{key} already imported")
+                if repeated:
+                    raise DuplicateKeyError(f"{key} is in the file more"
+                                            " than once")
+                values = record_type.values(row)
+                if record_type.parent:
+                    parent_key = str(row.get("patient_key"))
+                    if parent_key not in parent_ids:
+                        raise ParentNotImportedError(
+                            f"{record_type.parent} {parent_key} not imported")
+                    values["patient_id"] = parent_ids[parent_key]
+                line_values = (diet_line_values(row)
+                               if record_type.name == "diet" else None)
+            except (ValueError, TypeError) as error:
+                self.reject(report, line, key, error)
+                rejected_keys.add(key)
+                continue
+            converted.append((line, key, values, line_values))
+        accepted = self.checked(record_type, converted, rejected_keys,
+                                report)
+        if record_type.name == "diet":
+            accepted = self.whole_diets(accepted, rejected_keys, report)
+        if not accepted:
+            return
+        stamp = {"user": getpass.getuser(), "updated_at": datetime.now()}
+        try:
+            with session.begin_nested():
+                self.insert_records(record_type, accepted, stamp)
+        except (IntegrityError, DataError) as error:
+            for line, key, _, _ in accepted:
+                self.reject(report, line, key,
+                            f"Chunk refused by the database: {error.orig}")
+            return
+        report.imported += len({key for _, key, _, _ in accepted})
+
+    def checked(self, record_type, converted, rejected_keys, report):
+        """ The converted rows passing the column checks of the model
+
+        The diet lines of diet rows are checked too.
+        """
+
+        if not converted:
+            return []
+        lines = [line for line, _, _, _ in converted]
+        failing = check_columns(
+            record_type.model,
+            {name: [values[name] for _, _, values, _ in converted]
+             for name in column_rules[record_type.model].columns}, lines)
+        if record_type.name == "diet":
+            failing = check_columns(
+                DietLines,
+                {name: [line_values[name]
+                        for _, _, _, line_values in converted]
+                 for name in column_rules[DietLines].columns},
+                lines) | failing
+        accepted = []
+        for row, (line, key, values, line_values) in enumerate(converted):
+            if row in failing:
+                self.reject(report, line, key, failing[row])
+                rejected_keys.add(key)
+            else:
+                accepted.append((line, key, values, line_values))
+        return accepted
+
+    def whole_diets(self, accepted, rejected_keys, report):
+        """ Only import diets of which all lines were accepted """
+
+        whole = []
+        for line, key, values, line_values in accepted:
+            if key in rejected_keys:
+                self.reject(report, line, key, "Diet has a rejected line")
+            else:
+                whole.append((line, key, values, line_values))
+        return whole
+
+    def inserted_ids(self, model, rows):
+        """ Insert rows into the table of model, return their ids in order
+
+        Dialects that cannot return the ids of a multi row insert in the
+        order of the rows, like MySQL, insert a row at a time.
+        """
+
+        dialect = session.get_bind(mapper=model).dialect
+        if dialect.insert_executemany_returning_sort_by_parameter_order:
+            return session.scalars(
+                insert(model).returning(model.id,
+                                        sort_by_parameter_order=True),
+                rows).all()
+        return [session.execute(insert(model.__table__),
+                                row).inserted_primary_key[0]
+                for row in rows]
+
+    def insert_records(self, record_type, accepted, stamp):
+        """ Insert the accepted rows and remember their keys
+
+        The rows of a key follow each other, for a diet they are the lines
+        of one diet with the same header.
+        """
+
+        first_of_key = {}
+        for _, key, values, _ in accepted:
+            first_of_key.setdefault(key, values | stamp)
+        ids = self.inserted_ids(record_type.model, list(first_of_key.values()))
+        id_for_key = dict(zip(first_of_key, ids))
+        session.execute(insert(ImportKey),
+                        [{"source": self.source,
+                          "record_type": record_type.name,
+                          "source_key": key,
+                          "target_id": target_id,
+                          **stamp}
+                         for key, target_id in id_for_key.items()])
+        if record_type.name == "diet":
+            session.execute(insert(DietLines),
+                            [{**line_values, **stamp,
+                              "diet_id": id_for_key[key]}
+                             for _, key, _, line_values in accepted])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("Usage: bulkimport.py source record_type file")
+        sys.exit(2)
+    report = BulkImport(sys.argv[1],
+                        reject_file=sys.stderr).import_file(sys.argv[2],
+                                                            sys.argv[3])
+    print(f"{report.file_name}: {report.rows_read} rows read, "
+          f"{report.imported} imported, {len(report.rejects)} rejected, "
+          f"{report.skipped} done before")
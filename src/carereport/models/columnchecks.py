@@ -0,0 +1,365 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+""" This module checks columns of values against the rules of the models.
+
+The models check a value when it is assigned to an attribute. For bulk
+loads and scans of the data in the database that means building an object
+per row. The checks here take a whole column (a list) of values for an
+attribute and return a mask, with a byte per row that is 1 if the row is
+wrong. The error class is the one the model raises for the rule, so errors
+can be reported the same way as for the models.
+
+Columns are passed as a dictionary of attribute name to list of values, the
+same position in each list is the same row.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable
+from sqlalchemy import select
+from carereport import session
+from .patient import (Patient, Intake, EmptyNameError,
+                      BirthdateMustBeInPastError, SexInvalidError,
+                      IntakeResultIsMandatoryError,
+                      IntakeCannotBeInFutureError)
+from .medical import (Medication, ExaminationRequest, DietHeader, DietLines,
+                      Treatment,
+                      EndDateBeforeStartError, MedicationIsMandatoryError,
+                      FrequencyMustBeANumber, FrequencyMustHaveTypeError,
+                      ExaminationKindIsMandatoryError,
+                      ExamaningDepartmentIsMandatoryError,
+                      RequesterIsMandatoryError, ExecutionBeforeRequestError,
+                      ExecutedCannotBeRefusedError,
+                      PermanentDietWithStartDateError,
+                      DietLinesFoodNameMissingError,
+                      DietLinesApplicationMissingError,
+                      DescriptionIsMandatoryError, DescriptionIsTooShortError,
+                      ManagerIsMandatoryError, NameIsMandatoryError)
+
+
+@dataclass
+class ColumnErrors():
+    """ The rows failing a rule for a column
+
+        :error: The exception class the model raises for the rule
+        :message: The message for the exception
+        :mask: A byte per row, 1 if the row fails the rule
+
+    """
+
+    error: type
+    message: str
+    mask: bytearray
+
+    def __bool__(self):
+        """ True if any row fails the rule """
+
+        return any(self.mask)
+
+    def rows(self):
+        """ Return the numbers (starting at 0) of the rows failing """
+
+        return [row for row, wrong in enumerate(self.mask) if wrong]
+
+    def exception(self, row, number=None):
+        """ Return the exception for the rule for row
+
+        The message names the row by number, default its position.
+        """
+
+        return self.error(f"{self.message} (row "
+                          f"{row if number is None else number})")
+
+
+def empty_mask(values):
+    """ Mask of the values that are None or an empty string """
+
+    return bytearray(value is None or value == "" for value in values)
+
+
+def check_filled(values, error, key):
+    """ Values must be filled, like validate_field_existance """
+
+    return ColumnErrors(error, f"{key} cannot be empty", empty_mask(values))
+
+
+def check_birthdates(birthdates, today=None):
+    """ Birth dates cannot be in the future """
+
+    today = today or date.today()
+    return ColumnErrors(BirthdateMustBeInPastError,
+                        "Birthdate is not in the past",
+                        bytearray(birthdate is not None and birthdate > today
+                                  for birthdate in birthdates))
+
+
+def check_intake_dates(intake_dates, today=None):
+    """ Intakes cannot be in the future """
+
+    today = today or date.today()
+    return ColumnErrors(IntakeCannotBeInFutureError, "Intake is in future",
+                        bytearray(intake_date is not None
+                                  and intake_date > today
+                                  for intake_date in intake_dates))
+
+
+def check_sexes(sexes):
+    """ Sex must be one of the valid sexes of a patient
+
+    A sex that was never given is stored empty, that is not an error.
+    """
+
+    return ColumnErrors(SexInvalidError, "Sex is not a valid sex",
+                        bytearray(sex not in Patient.valid_sex
+                                  and sex not in (None, "")
+                                  for sex in sexes))
+
+
+def check_frequencies(frequencies):
+    """ Frequencies must be whole numbers of at least 1 """
+
+    return ColumnErrors(FrequencyMustBeANumber,
+                        "Frequency must be a positive number",
+                        bytearray(not isinstance(frequency, int)
+                                  or frequency < 1
+                                  for frequency in frequencies))
+
+
+def check_periods(start_dates, end_dates):
+    """ Where both are filled, the end date must be after the start date """
+
+    return ColumnErrors(EndDateBeforeStartError,
+                        "End date is before/equal start",
+                        bytearray(start is not None and end is not None
+                                  and end <= start
+                                  for start, end in zip(start_dates,
+                                                        end_dates)))
+
+
+def check_executions(date_requests, date_executions):
+    """ An execution date cannot be before the date of the request """
+
+    return ColumnErrors(ExecutionBeforeRequestError,
+                        "Execution cannot be before request",
+                        bytearray(executed is not None
+                                  and executed < requested
+                                  for requested, executed
+                                  in zip(date_requests, date_executions)))
+
+
+def check_refusals(date_executions, refusals):
+    """ An executed request cannot be refused """
+
+    return ColumnErrors(ExecutedCannotBeRefusedError,
+                        "You cannot refuse an executed request",
+                        bytearray(bool(refused) and bool(executed)
+                                  for executed, refused
+                                  in zip(date_executions, refusals)))
+
+
+def check_permanent_diets(permanent_diets, start_dates, end_dates):
+    """ A permanent diet cannot have a start or end date """
+
+    return ColumnErrors(PermanentDietWithStartDateError,
+                        "Start or end date not valid on permanent diet",
+                        bytearray(bool(permanent) and bool(start or end)
+                                  for permanent, start, end
+                                  in zip(permanent_diets, start_dates,
+                                         end_dates)))
+
+
+def check_descriptions(descriptions, minimum_length=25):
+    """ A treatment description must be filled and long enough
+
+    Returns the errors for empty and for too short descriptions.
+    """
+
+    empty = empty_mask(descriptions)
+    return [ColumnErrors(DescriptionIsMandatoryError,
+                         "description cannot be empty", empty),
+            ColumnErrors(DescriptionIsTooShortError,
+                         "Description must be longer",
+                         bytearray(not is_empty
+                                   and len(description) < minimum_length
+                                   for is_empty, description
+                                   in zip(empty, descriptions)))]
+
+
+def patient_checks(columns):
+    """ The checks for columns of patients """
+
+    return [check_filled(columns["surname"], EmptyNameError, "surname"),
+            check_filled(columns["initials"], EmptyNameError, "initials"),
+            check_birthdates(columns["birthdate"]),
+            check_sexes(columns["sex"])]
+
+
+def intake_checks(columns):
+    """ The checks for columns of intakes """
+
+    return [check_intake_dates(columns["date_intake"]),
+            check_filled(columns["result"], IntakeResultIsMandatoryError,
+                         "result")]
+
+
+def medication_checks(columns):
+    """ The checks for columns of medication """
+
+    return [check_filled(columns["medication"], MedicationIsMandatoryError,
+                         "medication"),
+            check_frequencies(columns["frequency"]),
+            check_filled(columns["frequency_type"],
+                         FrequencyMustHaveTypeError, "frequency_type"),
+            check_periods(columns["start_date"], columns["end_date"])]
+
+
+def examination_checks(columns):
+    """ The checks for columns of examination requests """
+
+    return [check_filled(columns["examination_kind"],
+                         ExaminationKindIsMandatoryError,
+                         "examination_kind"),
+            check_filled(columns["examaning_department"],
+                         ExamaningDepartmentIsMandatoryError,
+                         "examaning_department"),
+            check_filled(columns["requester_name"],
+                         RequesterIsMandatoryError, "requester_name"),
+            check_executions(columns["date_request"],
+                             columns["date_execution"]),
+            check_refusals(columns["date_execution"],
+                           columns["request_refused"])]
+
+
+def diet_checks(columns):
+    """ The checks for columns of diet headers """
+
+    return [check_filled(columns["diet_name"], NameIsMandatoryError,
+                         "diet_name"),
+            check_permanent_diets(columns["permanent_diet"],
+                                  columns["start_date"],
+                                  columns["end_date"])]
+
+
+def diet_line_checks(columns):
+    """ The checks for columns of diet lines """
+
+    return [check_filled(columns["food_name"], DietLinesFoodNameMissingError,
+                         "food_name"),
+            check_filled(columns["application_type"],
+                         DietLinesApplicationMissingError,
+                         "application_type")]
+
+
+def treatment_checks(columns):
+    """ The checks for columns of treatments """
+
+    return [check_filled(columns["manager"], ManagerIsMandatoryError,
+                         "manager"),
+            check_filled(columns["name"], NameIsMandatoryError, "name"),
+            *check_descriptions(columns["description"])]
+
+
+@dataclass
+class ColumnRules():
+    """ The checks for a model and the columns they need
+
+        :model: The model class
+        :columns: The names of the attributes the checks use
+        :checks: Function returning the list of column errors for columns
+
+    """
+
+    model: type
+    columns: tuple
+    checks: Callable
+
+
+column_rules = {
+    Patient: ColumnRules(Patient, ("surname", "initials", "birthdate",
+                                   "sex"),
+                         patient_checks),
+    Intake: ColumnRules(Intake, ("date_intake", "result"), intake_checks),
+    Medication: ColumnRules(Medication, ("medication", "frequency",
+                                         "frequency_type", "start_date",
+                                         "end_date"),
+                            medication_checks),
+    ExaminationRequest: ColumnRules(ExaminationRequest,
+                                    ("examination_kind",
+                                     "examaning_department",
+                                     "requester_name", "date_request",
+                                     "date_execution", "request_refused"),
+                                    examination_checks),
+    DietHeader: ColumnRules(DietHeader, ("diet_name", "permanent_diet",
+                                         "start_date", "end_date"),
+                            diet_checks),
+    DietLines: ColumnRules(DietLines, ("food_name", "application_type"),
+                           diet_line_checks),
+    Treatment: ColumnRules(Treatment, ("manager", "name", "description"),
+                           treatment_checks)}
+
+
+def first_errors(errors, numbers=None):
+    """ Return a dictionary of row number to the first error of the row
+
+    The errors are the column errors of all checks on the same columns,
+    in the order the model would find them. With numbers, the messages
+    name the rows by their number, like the line in a file.
+    """
+
+    failing = {}
+    for column_errors in errors:
+        for row in column_errors.rows():
+            if row not in failing:
+                failing[row] = column_errors.exception(
+                    row, None if numbers is None else numbers[row])
+    return failing
+
+
+def check_columns(model, columns, numbers=None):
+    """ Check columns of values for model
+
+    Returns a dictionary of row number to the first error for that row,
+    rows that pass all checks are not in it. Numbers are the numbers of
+    the rows for the messages, default their position.
+    """
+
+    return first_errors(column_rules[model].checks(columns), numbers)
+
+
+def scan(model, chunk_size=10000):
+    """ Check the rows of model stored in the database
+
+    Only the columns needed for the checks are read, chunk_size rows at a
+    time, without making objects. Generates tuples of the id of a wrong
+    row and the error.
+    """
+
+    rules = column_rules[model]
+    scan_stmt = (select(model.id, *(getattr(model, name)
+                                    for name in rules.columns))
+                 .order_by(model.id)
+                 .execution_options(yield_per=chunk_size))
+    result = session.execute(scan_stmt)
+    try:
+        for rows in result.partitions():
+            ids, *values = zip(*rows)
+            failing = check_columns(model, dict(zip(rules.columns, values)))
+            for row, error in sorted(failing.items()):
+                yield ids[row], error
+    finally:
+        result.close()
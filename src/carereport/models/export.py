@@ -0,0 +1,149 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+""" This module exports the complete records of all patients.
+
+Each patient is written as one JSON document on a line (JSON lines), with
+the intakes, medication, examination requests and their results, diets and
+their lines, diagnoses and treatments of the patient nested in it. The
+export is meant for transfers to other systems and for audits.
+
+The patients are read in pages, the chart of each page is loaded with a
+select-in query per relationship. After writing a page the objects are
+removed from the session, so the memory used does not grow with the size
+of the database.
+"""
+
+import gzip
+import sys
+from datetime import date, datetime
+import ujson
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import selectinload
+from carereport import Session
+from .patient import Patient
+from .medical import Diagnose
+
+
+def column_values(instance):
+    """ Return a dictionary of the column values of instance
+
+    Dates and times are written in ISO format.
+    """
+
+    values = {}
+    for attribute in inspect(instance).mapper.column_attrs:
+        value = getattr(instance, attribute.key)
+        if isinstance(value, (date, datetime)):
+            value = value.isoformat()
+        values[attribute.key] = value
+    return values
+
+
+def nested(instance, **children):
+    """ The column values of instance with the lists of children added """
+
+    return column_values(instance) | children
+
+
+def patient_document(patient):
+    """ Return the complete record of patient as a dictionary """
+
+    return nested(
+        patient,
+        intakes=[nested(intake,
+                        results=[column_values(result)
+                                 for result in intake.results])
+                 for intake in patient.intakes],
+        medication=[column_values(medication)
+                    for medication in patient.medication],
+        exam_requests=[nested(request,
+                              results=[column_values(result)
+                                       for result in request.result])
+                       for request in patient.exam_requests],
+        diets=[nested(diet,
+                      diet_lines=[column_values(line)
+                                  for line in diet.diet_lines])
+               for diet in patient.diets],
+        diagnoses=[nested(diagnose,
+                          examinations=[request.id for request
+                                        in diagnose.examinations],
+                          treatments=[nested(treatment,
+                                             results=[column_values(result)
+                                                      for result
+                                                      in treatment.results])
+                                      for treatment in diagnose.treatments])
+                   for diagnose in patient.diagnoses])
+
+
+def export_patients(out, batch_size=500, export_session=None):
+    """ Write all patients to the text file out, one per line
+
+    The patients are read in pages of batch_size, continuing after the id
+    of the last patient written. The export uses a session of its own,
+    unless export_session is passed, because the session is emptied after
+    each page. It returns the number of patients written.
+    """
+
+    own_session = export_session is None
+    if own_session:
+        export_session = Session()
+    chart_options = (*Patient.chart_options(),
+                     selectinload(Patient.diagnoses).selectinload(
+                         Diagnose.examinations))
+    written = 0
+    last_id = 0
+    try:
+        while patients := export_session.scalars(
+                select(Patient).where(Patient.id > last_id)
+                .options(*chart_options)
+                .order_by(Patient.id).limit(batch_size)).all():
+            for patient in patients:
+                out.write(ujson.dumps(patient_document(patient),
+                                      ensure_ascii=False))
+                out.write("\n")
+            written += len(patients)
+            last_id = patients[-1].id
+            export_session.expunge_all()
+    finally:
+        if own_session:
+            export_session.close()
+    return written
+
+
+def export_file(path, compress=False, batch_size=500):
+    """ Export all patients to the file at path
+
+    With compress the file is written with gzip. It returns the number of
+    patients written.
+    """
+
+    if compress:
+        with gzip.open(path, "wt", encoding="utf-8") as export_out:
+            return export_patients(export_out, batch_size)
+    with open(path, "w", encoding="utf-8") as export_out:
+        return export_patients(export_out, batch_size)
+
+
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:]
+                 if argument != "--gzip"]
+    if len(arguments) != 1:
+        print("Usage: export.py [--gzip] file")
+        sys.exit(2)
+    written = export_file(arguments[0], compress="--gzip" in sys.argv)
+    print(f"{written} patients exported to {arguments[0]}")
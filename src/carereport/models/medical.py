@@ -31,10 +31,16 @@ Things related to non-medical care (ward, diet) are not defined
 in this module.
 """
 
+from collections import defaultdict
+from dataclasses import dataclass
 from datetime import date
+from time import perf_counter
+from typing import Callable
 from sqlalchemy import (String, Date, Integer, text, ForeignKey, Index,
-                        select, event, Boolean)
-from sqlalchemy.orm import (mapped_column, validates, relationship)
+                        CheckConstraint, select, insert, func, event,
+                        Boolean, and_, or_, inspect)
+from sqlalchemy.orm import (mapped_column, validates, relationship,
+                            contains_eager, joinedload, selectinload)
 from carereport import (Base, session, validate_field_existance)
 
 
@@ -152,6 +158,12 @@ class ExaminationWithoutResultError(ValueError):
     pass
 
 
+class ExaminationNotFoundError(ValueError):
+    """ The examination request to link does not exist """
+
+    pass
+
+
 class ManagerIsMandatoryError(ValueError):
     """ A treatment must have a manager """
 
@@ -195,6 +207,15 @@ class Medication(Base):
     patient_id = mapped_column(ForeignKey("patients.id"), index=True)
     patient = relationship("Patient", back_populates="medication")
 
+    __table_args__ = (CheckConstraint("medication <> ''",
+                                      name="medication_filled"),
+                      CheckConstraint("frequency >= 1",
+                                      name="frequency_positive"),
+                      CheckConstraint("frequency_type <> ''",
+                                      name="frequency_type_filled"),
+                      CheckConstraint("end_date > start_date",
+                                      name="medication_end_after_start"))
+
     @classmethod
     def medication_for_patient(cls, patient):
         """ Return current medication for a patient """
@@ -203,6 +224,32 @@ class Medication(Base):
                 if medication.end_date is None
                 or medication.end_date >= date.today()]
 
+    @staticmethod
+    def is_active_clause(for_date):
+        """ The SQL condition for medication to be used on for_date """
+
+        return or_(Medication.end_date.is_(None),
+                   Medication.end_date >= for_date)
+
+    @staticmethod
+    def page_for_patient(patient, after=None, limit=100, history=False):
+        """ Return a page of the medication of patient, the newest first
+
+        Without history the medication used today is returned, with history
+        the medication stopped. See chart_page for after and limit. The
+        page is read without flushing, changes not saved are not in it, an
+        unsaved patient has no pages.
+        """
+
+        if patient.id is None:
+            return []
+        active = Medication.is_active_clause(date.today())
+        with session.no_autoflush:
+            return session.scalars(chart_page(
+                select(Medication).where(Medication.patient_id == patient.id,
+                                         ~active if history else active),
+                Medication.id, after, limit)).all()
+
     @validates("start_date")
     def validate_start_date(self, key, start_date):
         """ Validate that the start date is before the end date """
@@ -291,7 +338,15 @@ class ExaminationRequest(Base):
                              back_populates="examinations")
 
     __table_args__ = (Index("bydepdate", "examaning_department",
-                            "date_request"),)
+                            "date_request"),
+                      CheckConstraint("examination_kind <> ''",
+                                      name="examination_kind_filled"),
+                      CheckConstraint("examaning_department <> ''",
+                                      name="examaning_department_filled"),
+                      CheckConstraint("requester_name <> ''",
+                                      name="requester_name_filled"),
+                      CheckConstraint("date_execution >= date_request",
+                                      name="execution_after_request"))
 
     @validates("examination_kind")
     def validate_examination_kind(self, key, examination_kind):
@@ -356,18 +411,48 @@ class ExaminationRequest(Base):
                     or request.date_execution >= current_date)
                 and not request.request_refused]
 
+    @staticmethod
+    def is_open_clause(for_date):
+        """ The SQL condition for a request to be open on for_date """
+
+        return and_(or_(ExaminationRequest.date_execution.is_(None),
+                        ExaminationRequest.date_execution >= for_date),
+                    or_(ExaminationRequest.request_refused.is_(None),
+                        ExaminationRequest.request_refused == ""))
+
+    @staticmethod
+    def page_for_patient(patient, after=None, limit=100, history=False):
+        """ Return a page of the examination requests of patient
+
+        Without history the open requests are returned, with history the
+        executed or refused ones. The results are loaded with the page.
+        See chart_page for after and limit.
+        """
+
+        if patient.id is None:
+            return []
+        requested = ExaminationRequest.is_open_clause(date.today())
+        with session.no_autoflush:
+            return session.scalars(chart_page(
+                select(ExaminationRequest)
+                .where(ExaminationRequest.patient_id == patient.id,
+                       ~requested if history else requested)
+                .options(selectinload(ExaminationRequest.result)),
+                ExaminationRequest.id, after, limit)).all()
+
     @staticmethod
     def requests_for_department(department):
         """ List outstanding requests per department.
 
         The department variable may be part (substring) of a department
-        name.
+        name. The work list is read from a replica.
         """
 
         selection = select(ExaminationRequest).where(
             ExaminationRequest.examaning_department.like(
                 "%" + department + "%")).order_by(
-                    ExaminationRequest.date_request.asc())
+                    ExaminationRequest.date_request.asc()).execution_options(
+                        replica=True)
         return list(session.execute(selection))
 
 
@@ -387,6 +472,9 @@ class ExaminationResult(Base):
     request_id = mapped_column(ForeignKey("examrequest.id"), index=True)
     request = relationship("ExaminationRequest", back_populates="result")
 
+    __table_args__ = (CheckConstraint("examination_executor <> ''",
+                                      name="examination_executor_filled"),)
+
     @validates("examination_executor")
     def validate_executor(self, key, executor):
         """ The executor is mandatory for a result """
@@ -424,6 +512,14 @@ class DietHeader(Base):
     patient_id = mapped_column(ForeignKey("patients.id"), index=True)
     patient = relationship("Patient", back_populates="diets")
 
+    __table_args__ = (Index("bycurrent", "patient_id", "permanent_diet",
+                            "start_date", "end_date"),
+                      CheckConstraint("diet_name <> ''",
+                                      name="diet_name_filled"),
+                      CheckConstraint("NOT permanent_diet OR (start_date IS"
+                                      " NULL AND end_date IS NULL)",
+                                      name="permanent_diet_no_dates"))
+
     @validates("start_date")
     def validate_start_date(self, key, start_date):
         """ A start date is only permitted on a temporary diet """
@@ -464,27 +560,78 @@ class DietHeader(Base):
 
         return "diet0001", self.id
 
+    @staticmethod
+    def is_current_clause(for_date, diet_header=None):
+        """ The SQL condition for a diet to be current on for_date
+
+        Pass diet_header to use the condition on an alias of the diets.
+        """
+
+        if diet_header is None:
+            diet_header = DietHeader
+        return or_(diet_header.permanent_diet.is_(True),
+                   and_(diet_header.start_date <= for_date,
+                        or_(diet_header.end_date.is_(None),
+                            diet_header.end_date > for_date)))
+
+    def is_current(self, for_date):
+        """ Is this diet current on for_date? In memory version """
+
+        return (self.permanent_diet
+                or (self.start_date <= for_date
+                    and (self.end_date is None
+                         or self.end_date > for_date)))
+
     @staticmethod
     def _current_diet(patient, for_date):
-        """ Return current diets for patient as a list
+        """ Generate the current diets for patient
 
-        TODO: replace with a generator
+        A patient that is not in the database yet, also one added but not
+        flushed, has its diets filtered in memory, otherwise the bycurrent
+        index is used.
         """
-        return [diet_header for diet_header in patient.diets
-                if diet_header.permanent_diet
-                or (diet_header.start_date <= for_date
-                    and (diet_header.end_date is None
-                         or diet_header.end_date > for_date))]
+
+        if not inspect(patient).has_identity:
+            yield from (diet_header for diet_header in patient.diets
+                        if diet_header.is_current(for_date))
+            return
+        yield from session.scalars(
+            select(DietHeader).where(DietHeader.patient_id == patient.id,
+                                     DietHeader.is_current_clause(for_date))
+            .order_by(DietHeader.id))
+
+    @staticmethod
+    def current_diet_lines(patient, for_date=None):
+        """ Generate the diet lines for patient current on for_date
+
+        The lines are selected together with their header in one query,
+        the header is available as the diet of each line without further
+        loading. If no date is passed, today is used.
+        """
+
+        if for_date is None:
+            for_date = date.today()
+        if not inspect(patient).has_identity:
+            for diet in DietHeader._current_diet(patient, for_date):
+                yield from diet.diet_lines
+            return
+        result = session.scalars(
+            select(DietLines).join(DietLines.diet)
+            .where(DietHeader.patient_id == patient.id,
+                   DietHeader.is_current_clause(for_date))
+            .options(contains_eager(DietLines.diet))
+            .order_by(DietHeader.id, DietLines.id)
+            .execution_options(yield_per=100))
+        try:
+            yield from result
+        finally:
+            result.close()
 
     @staticmethod
-    def get_diets(patient, for_date):
+    def get_diets(patient, for_date=None):
         """ Return the diet lines for patient for the date for_date """
 
-        diet_list = []
-        for diet in DietHeader._current_diet(patient, for_date):
-            for line in diet.diet_lines:
-                diet_list.append(line)
-        return diet_list
+        return list(DietHeader.current_diet_lines(patient, for_date))
 
 
 class DietLines(Base):
@@ -504,6 +651,11 @@ class DietLines(Base):
     diet_id = mapped_column(ForeignKey("dietheader.id"), index=True)
     diet = relationship("DietHeader", back_populates="diet_lines")
 
+    __table_args__ = (CheckConstraint("food_name <> ''",
+                                      name="food_name_filled"),
+                      CheckConstraint("application_type <> ''",
+                                      name="application_type_filled"))
+
     @validates("food_name")
     def validate_food_name(self, key, food_name):
         """ A food name is mandatory """
@@ -546,6 +698,9 @@ class Diagnose(Base):
     patient_id = mapped_column(ForeignKey("patients.id"), index=True)
     patient = relationship("Patient", back_populates="diagnoses")
 
+    __table_args__ = (CheckConstraint("description <> ''",
+                                      name="diagnose_description_filled"),)
+
     @validates("description")
     def validate_description(self, key, description):
         """ A description cannot be empty """
@@ -562,6 +717,83 @@ class Diagnose(Base):
                 "An examination must have a result for a diagnose")
         return examination
 
+    def link_examinations(self, examinations):
+        """ Link many examination requests to this diagnose at once
+
+        The results and patients of the requests are checked with one
+        query, instead of loading them per request. If any request has no
+        result or is for another patient, nothing is linked. Requests
+        already linked are skipped, the others are linked with one multi
+        row insert. It returns the number of requests linked.
+
+        A diagnose or requests not saved yet are added to the session and
+        flushed first, the links need their ids.
+        """
+
+        session.add(self)
+        session.add_all(examinations)
+        session.flush()
+        wanted = {examination.id for examination in examinations}
+        if not wanted:
+            return 0
+        result_count = func.count(ExaminationResult.id.distinct())
+        link_count = func.count(DiagnoseExaminations.diagnose_id)
+        found = {request_id: (patient_id, results, links)
+                 for request_id, patient_id, results, links
+                 in session.execute(
+                     select(ExaminationRequest.id,
+                            ExaminationRequest.patient_id,
+                            result_count, link_count)
+                     .outerjoin(ExaminationRequest.result)
+                     .outerjoin(DiagnoseExaminations,
+                                and_(DiagnoseExaminations.examination_id ==
+                                     ExaminationRequest.id,
+                                     DiagnoseExaminations.diagnose_id ==
+                                     self.id))
+                     .where(ExaminationRequest.id.in_(wanted))
+                     .group_by(ExaminationRequest.id,
+                               ExaminationRequest.patient_id))}
+        new_links = []
+        for request_id in sorted(wanted):
+            if request_id not in found:
+                raise ExaminationNotFoundError(
+                    f"Examination request {request_id} does not exist")
+            patient_id, results, links = found[request_id]
+            if not results:
+                raise ExaminationWithoutResultError(
+                    "An examination must have a result for a diagnose")
+            if patient_id != self.patient_id:
+                raise DiagnoseAndExaminationNotSamePatientError(
+                    "Diagnose and examination must be for same patient")
+            if not links:
+                new_links.append({"diagnose_id": self.id,
+                                  "examination_id": request_id})
+        if new_links:
+            session.execute(insert(DiagnoseExaminations), new_links)
+            session.expire(self, ["examinations"])
+            for examination in examinations:
+                session.expire(examination, ["diagnoses"])
+        return len(new_links)
+
+    @staticmethod
+    def page_for_patient(patient, after=None, limit=100):
+        """ Return a page of the diagnoses of patient with treatment counts
+
+        Each row holds the diagnose and its number of treatments, counted
+        for the page only. See chart_page for after and limit.
+        """
+
+        if patient.id is None:
+            return []
+        treatments = (select(func.count(Treatment.id))
+                      .where(Treatment.diagnose_id == Diagnose.id)
+                      .scalar_subquery())
+        with session.no_autoflush:
+            return session.execute(chart_page(
+                select(Diagnose, treatments)
+                .where(Diagnose.patient_id == patient.id),
+                Diagnose.id, after, limit)).all()
+
     def patients_match(self):
         """ Patients for diagnose and examination the same?
 
@@ -609,10 +841,17 @@ class Treatment(Base):
     manager = mapped_column(String(56), nullable=False)
     name = mapped_column(String(56), nullable=False)
     description = mapped_column(String(256), nullable=False)
-    diagnose_id = mapped_column(ForeignKey("diagnose.id"))
+    diagnose_id = mapped_column(ForeignKey("diagnose.id"), index=True)
     diagnoses = relationship("Diagnose", back_populates="treatments")
     results = relationship("TreatmentResult", back_populates="treatment")
 
+    __table_args__ = (CheckConstraint("manager <> ''",
+                                      name="manager_filled"),
+                      CheckConstraint("name <> ''",
+                                      name="treatment_name_filled"),
+                      CheckConstraint("description <> ''",
+                                      name="treatment_description_filled"))
+
     @validates("manager")
     def validate_manager(self, key, manager):
         """ A manager is required for a treatment """
@@ -654,6 +893,11 @@ class TreatmentResult(Base):
     treatment_id = mapped_column(ForeignKey("treatment.id"))
     treatment = relationship("Treatment", back_populates="results")
 
+    __table_args__ = (CheckConstraint("author <> ''",
+                                      name="author_filled"),
+                      CheckConstraint("description <> ''",
+                                      name="result_description_filled"))
+
     @validates("author")
     def validate_author(self, key, author):
         """ An author is required for a treatment result """
@@ -669,14 +913,181 @@ class TreatmentResult(Base):
                                         DescriptionIsMandatoryError)
 
 
+@dataclass
+class FlushRule():
+    """ A rule checked on flush, with counters on its use
+
+        :check: The function doing the check, called with the session
+                    and a list of instances
+        :depends_on: The attributes the rule looks at. Stored instances
+                         are only checked if one of these changed.
+        :calls: The number of times the rule was run
+        :checked: The number of instances checked
+        :skipped: The number of instances skipped, as nothing changed
+        :seconds: The time spent in the rule
+
+    """
+
+    check: Callable
+    depends_on: tuple = ()
+    calls: int = 0
+    checked: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+
+    def must_check(self, instance):
+        """ Must the rule check instance?
+
+        New instances are always checked, stored instances only if an
+        attribute the rule depends on has changed.
+        """
+
+        state = inspect(instance)
+        if not state.persistent or not self.depends_on:
+            return True
+        return any(state.attrs[attribute].history.has_changes()
+                   for attribute in self.depends_on)
+
+    def run(self, session, instances):
+        """ Check the instances that need checking, keeping the counters """
+
+        to_check = [instance for instance in instances
+                    if self.must_check(instance)]
+        self.skipped += len(instances) - len(to_check)
+        if not to_check:
+            return
+        started = perf_counter()
+        try:
+            self.check(session, to_check)
+        finally:
+            self.calls += 1
+            self.checked += len(to_check)
+            self.seconds += perf_counter() - started
+
+
+class FlushValidation():
+    """ Entity level checks on the new and changed instances of a flush
+
+    The checks are rules registered per class. A rule gets all instances of
+    its class in the flush at once, so it can load the relationships it
+    needs with one query for all of them, instead of a lazy load for each
+    instance. A rule declares the attributes it depends on, and changed
+    instances are only checked when one of these attributes changed.
+    """
+
+    def __init__(self):
+
+        self.rules = defaultdict(list)
+
+    def rule(self, cls, depends_on=()):
+        """ Register the decorated function as a rule for cls """
+
+        def register(rule_function):
+            self.rules[cls].append(FlushRule(check=rule_function,
+                                             depends_on=tuple(depends_on)))
+            return rule_function
+        return register
+
+    def validate(self, session, instances):
+        """ Run the rules for instances, grouped by class """
+
+        instances_per_class = defaultdict(list)
+        for instance in instances:
+            instances_per_class[type(instance)].append(instance)
+        with session.no_autoflush:
+            for cls, rules in self.rules.items():
+                if cls not in instances_per_class:
+                    continue
+                for flush_rule in rules:
+                    flush_rule.run(session, instances_per_class[cls])
+
+    def statistics(self):
+        """ Return the counters per rule, keyed on the name of the rule """
+
+        return {flush_rule.check.__name__: (flush_rule.calls,
+                                            flush_rule.checked,
+                                            flush_rule.skipped,
+                                            flush_rule.seconds)
+                for rules in self.rules.values() for flush_rule in rules}
+
+
+def chart_page(statement, key, after=None, limit=100):
+    """ Limit statement to one page of a chart, the highest key first
+
+    The page starts after the row with key value after, so reading a page
+    uses the index on the key instead of skipping the rows before it.
+    """
+
+    if after is not None:
+        statement = statement.where(key < after)
+    return statement.order_by(key.desc()).limit(limit)
+
+
+def load_unloaded(session, cls, instances, attribute, *options):
+    """ Load attribute for the stored instances that did not load it yet
+
+    All of them are loaded with one query, using joined loader options.
+    """
+
+    ids = [inspect(instance).identity[0] for instance in instances
+           if inspect(instance).persistent
+           and attribute in inspect(instance).unloaded]
+    if ids:
+        session.scalars(select(cls).where(cls.id.in_(ids))
+                        .options(*options)).unique().all()
+
+
+flush_validation = FlushValidation()
+
+
+@flush_validation.rule(ExaminationResult,
+                       depends_on=("request", "request_id"))
+def results_have_request(session, results):
+    """ Each examination result must have a request """
+
+    request_ids = set()
+    for result in results:
+        if "request" not in inspect(result).unloaded:
+            result.is_request_set(session)
+        elif result.request_id is None:
+            raise ResultMustBeForRequestError(
+                "Examination result must have request")
+        else:
+            request_ids.add(result.request_id)
+    if request_ids:
+        found = set(session.scalars(
+            select(ExaminationRequest.id)
+            .where(ExaminationRequest.id.in_(request_ids))))
+        if request_ids - found:
+            raise ResultMustBeForRequestError(
+                "Examination result must have request")
+
+
+@flush_validation.rule(DietHeader, depends_on=("diet_lines",))
+def diets_have_lines(session, diets):
+    """ Each diet must have lines """
+
+    load_unloaded(session, DietHeader, diets, "diet_lines",
+                  joinedload(DietHeader.diet_lines))
+    for diet in diets:
+        diet.has_lines()
+
+
+@flush_validation.rule(ExaminationRequest,
+                       depends_on=("diagnoses", "patient", "patient_id"))
+def requests_match_diagnose_patients(session, requests):
+    """ Requests must be for the patient of the diagnoses they support """
+
+    load_unloaded(session, ExaminationRequest, requests, "diagnoses",
+                  joinedload(ExaminationRequest.diagnoses)
+                  .joinedload(Diagnose.patient),
+                  joinedload(ExaminationRequest.patient))
+    for request in requests:
+        request.patients_match()
+
+
 @event.listens_for(session, "before_flush")
 def before_flush(session, flush_context, instances):
     """ Execute entity level checks before saving """
 
-    for instance in session.dirty | session.new:
-        if isinstance(instance, ExaminationResult):
-            instance.is_request_set(session)
-        if isinstance(instance, DietHeader):
-            instance.has_lines()
-        if isinstance(instance, ExaminationRequest):
-            instance.patients_match()
+    flush_validation.validate(session, session.dirty | session.new)
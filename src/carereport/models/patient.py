@@ -22,11 +22,12 @@ and the like. It does not have medical data nor hospitalization info
 from datetime import date
 from typing import List
 from sqlalchemy import (String, Date, Integer, ForeignKey,
-                        Index, select)
+                        Index, CheckConstraint, select, and_, inspect)
 from sqlalchemy.orm import (mapped_column, validates, relationship,
-                            Mapped)
+                            Mapped, selectinload)
 from carereport import (Base, validate_field_existance, session)
-from .medical import DietHeader
+from .medical import (DietHeader, Medication, ExaminationRequest,
+                      Diagnose, Treatment)
 
 
 class EmptyNameError(ValueError):
@@ -93,7 +94,10 @@ class Patient(Base):
         relationship(back_populates="patient")
 
     __table_args__ = (Index("byname", "surname"),
-                      Index("bybirthdate", "birthdate"))
+                      Index("bybirthdate", "birthdate"),
+                      CheckConstraint("surname <> ''", name="surname_filled"),
+                      CheckConstraint("sex IN ('F', 'M', 'X', ' ', '')",
+                                      name="sex_valid"))
 
     valid_sex = {"F": "female",
                  "M": "male",
@@ -122,11 +126,55 @@ class Patient(Base):
             raise SexInvalidError(f"{sex} is not in a valid sex")
         return sex
 
-    def get_diets(self, for_date=date.today()):
-        """ Return the diet lines for the date for_date """
+    def get_diets(self, for_date=None):
+        """ Return the diet lines for the date for_date, default today """
 
         return DietHeader.get_diets(self, for_date)
 
+    @staticmethod
+    def chart_options(*parts):
+        """ The loader options to load the chart of a patient
+
+        Parts names the parts of the chart to load: "medication",
+        "exam_requests", "diets", "intakes" and "diagnoses". Without parts
+        the complete chart is loaded.
+        """
+
+        exam_requests = selectinload(Patient.exam_requests)
+        options = {"medication": (selectinload(Patient.medication),),
+                   "exam_requests": (
+                       exam_requests.selectinload(ExaminationRequest.result),
+                       exam_requests.selectinload(
+                           ExaminationRequest.diagnoses)),
+                   "diets": (selectinload(Patient.diets).selectinload(
+                       DietHeader.diet_lines),),
+                   "intakes": (selectinload(Patient.intakes).selectinload(
+                       Intake.results),),
+                   "diagnoses": (selectinload(Patient.diagnoses)
+                                 .selectinload(Diagnose.treatments)
+                                 .selectinload(Treatment.results),)}
+        return tuple(option for part in parts or options
+                     for option in options[part])
+
+    @staticmethod
+    def load_chart(patient, *parts):
+        """ Load the medical and care data of the patient at once
+
+        Each relationship is loaded with one select-in query, the number
+        of queries does not depend on the size of the chart. Collections
+        already loaded are left as they are, so unsaved changes are kept.
+        After this, using the relationships does not cause lazy loads.
+        Only the parts of the chart named are loaded, see chart_options.
+        """
+
+        identity = inspect(patient).identity
+        if identity is None:
+            return patient
+        with session.no_autoflush:
+            return session.scalars(
+                select(Patient).where(Patient.id == identity[0])
+                .options(*Patient.chart_options(*parts))).one()
+
     @staticmethod
     def patient_search(search_params):
         """ The method returns patients selected based on the parameters
@@ -138,10 +186,11 @@ class Patient(Base):
             :surname: (part of) the surname of the patient(s) to be found
             :initials: (part of) the initials of the patient(s) to be found
 
-        The routine returns a list of patients.
+        The routine returns a list of patients. The search is read from a
+        replica, a patient to be changed is read again with from_primary.
         """
 
-        patient_qry = select(Patient)
+        patient_qry = select(Patient).execution_options(replica=True)
         if search_params[0]:
             patient_qry = patient_qry.where(Patient.birthdate==
                                             search_params[0])
@@ -154,6 +203,18 @@ class Patient(Base):
         rows = session.execute(patient_qry).all()
         return [row[0] for row in rows]
 
+    @staticmethod
+    def from_primary(patient):
+        """ Read a patient found by a search again from the primary
+
+        A replica may be behind, its version of the patient would fail the
+        version check when the patient is changed.
+        """
+
+        if inspect(patient).persistent and not session.is_modified(patient):
+            session.refresh(patient)
+        return patient
+
 
 class Intake(Base):
     """ An intake has taken place. This is the result.
@@ -178,6 +239,9 @@ class Intake(Base):
     patient_id = mapped_column(ForeignKey("patients.id"), index=True)
     patient = relationship("Patient", back_populates="intakes")
 
+    __table_args__ = (CheckConstraint("result <> ''",
+                                      name="intake_result_filled"),)
+
     @validates("result")
     def validate_intake_result(self, key, result):
         """ Result of the intake is mandatory """
@@ -219,3 +283,40 @@ class IntakeResult(Base):
 
     __table_args__ = (Index("by_link", "link_type",
                             "link_key"),)
+
+    link_classes = {"medi0001": Medication,
+                    "exam0001": ExaminationRequest,
+                    "diet0001": DietHeader}
+
+    @staticmethod
+    def resolve_links(intakes, include_archive=False):
+        """ Return the items linked to the intakes
+
+        The result is a dictionary of intake to a list of the linked
+        medication, examination requests and diets. The links are resolved
+        per link type, in one query joining on the by_link index, so the
+        number of queries does not depend on the number of intakes. With
+        include_archive the archived items are resolved too.
+        """
+
+        # The archive tables copy the column types of the patient keys, so
+        # the archive is imported after the patient model is made
+        from .archive import with_archive
+
+        linked = {intake: [] for intake in intakes}
+        intake_for_id = {intake.id: intake for intake in linked
+                         if intake.id is not None}
+        if not intake_for_id:
+            return linked
+        for link_type, link_model in IntakeResult.link_classes.items():
+            link_class = (with_archive(link_model) if include_archive
+                          else link_model)
+            link_stmt = (select(IntakeResult.intake_id, link_class)
+                         .join(link_class,
+                               and_(IntakeResult.link_type == link_type,
+                                    IntakeResult.link_key == link_class.id))
+                         .where(IntakeResult.intake_id.in_(intake_for_id))
+                         .order_by(IntakeResult.id))
+            for intake_id, item in session.execute(link_stmt):
+                linked[intake_for_id[intake_id]].append(item)
+        return linked
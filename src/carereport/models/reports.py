@@ -0,0 +1,254 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+""" This module holds reports over all patients.
+
+Reports are not about one patient, like the rest of the system, but about
+the whole of the patients. Think of the kitchen, wanting to know which diet
+rules must be taken into account when preparing the food for a day.
+
+The reports are computed in the database, not by walking the patients
+one by one.
+"""
+
+import csv
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from itertools import groupby
+from operator import itemgetter
+import ujson
+from sqlalchemy import select, func, or_, and_
+from carereport import session
+from .medical import DietHeader, DietLines
+from .patient import Patient
+from .archive import with_archive
+
+
+@dataclass
+class KitchenRule():
+    """ One diet rule the kitchen must apply on a day.
+
+        :food_name: The food (product) the rule is about
+        :application_type: How the rule must be applied
+        :patients: The patients this rule applies to as tuples of id,
+                        surname and initials
+
+    """
+
+    food_name: str
+    application_type: str
+    patients: list = field(default_factory=list)
+
+    @property
+    def count(self):
+        """ The number of patients for this rule """
+
+        return len(self.patients)
+
+    def as_dict(self):
+        """ The rule as a dictionary, e.g. for serialising """
+
+        return {"food_name": self.food_name,
+                "application_type": self.application_type,
+                "count": self.count,
+                "patients": [{"id": patient_id,
+                              "surname": surname,
+                              "initials": initials}
+                             for patient_id, surname, initials
+                             in self.patients]}
+
+
+def diet_tables(include_archive=False):
+    """ Return the diet headers and lines to report on
+
+    With include_archive these include the archived diets, for reports
+    on dates in the past.
+    """
+
+    if include_archive:
+        return with_archive(DietHeader), with_archive(DietLines)
+    return DietHeader, DietLines
+
+
+def kitchen_report(for_date=None, include_archive=False):
+    """ Generate the diet rules for all patients current on for_date
+
+    The rules are grouped by food name and application type. All rows come
+    from one query, ordered such that a rule can be yielded as soon as its
+    last patient is read. If no date is passed, today is used.
+    """
+
+    if for_date is None:
+        for_date = date.today()
+    header, line = diet_tables(include_archive)
+    rule_stmt = (select(line.food_name, line.application_type,
+                        Patient.id, Patient.surname, Patient.initials)
+                 .join(header, line.diet_id == header.id)
+                 .join(Patient, header.patient_id == Patient.id)
+                 .where(DietHeader.is_current_clause(for_date, header))
+                 .distinct()
+                 .order_by(line.food_name, line.application_type,
+                           Patient.surname, Patient.id)
+                 .execution_options(yield_per=1000))
+    result = session.execute(rule_stmt)
+    try:
+        for (food_name, application_type), rows in groupby(
+                result, key=itemgetter(0, 1)):
+            yield KitchenRule(food_name=food_name,
+                              application_type=application_type,
+                              patients=[tuple(row[2:]) for row in rows])
+    finally:
+        result.close()
+
+
+def kitchen_counts(for_date=None, include_archive=False):
+    """ Return the number of patients per diet rule for for_date
+
+    This is the summary of the kitchen report, counted by the database.
+    It returns a list of tuples food name, application type and count.
+    """
+
+    if for_date is None:
+        for_date = date.today()
+    header, line = diet_tables(include_archive)
+    count_stmt = (select(line.food_name, line.application_type,
+                         func.count(header.patient_id.distinct()))
+                  .join(header, line.diet_id == header.id)
+                  .where(DietHeader.is_current_clause(for_date, header))
+                  .group_by(line.food_name, line.application_type)
+                  .order_by(line.food_name, line.application_type))
+    return [tuple(row) for row in session.execute(count_stmt)]
+
+
+def kitchen_report_csv(out, for_date=None, include_archive=False):
+    """ Write the kitchen report to the text file out as CSV
+
+    Each patient for a rule gets a row, so the file can be sorted and
+    filtered in a spreadsheet.
+    """
+
+    writer = csv.writer(out)
+    writer.writerow(["food_name", "application_type", "count",
+                     "patient_id", "surname", "initials"])
+    for rule in kitchen_report(for_date, include_archive):
+        for patient in rule.patients:
+            writer.writerow([rule.food_name, rule.application_type,
+                             rule.count, *patient])
+
+
+def kitchen_report_json(out, for_date=None, include_archive=False):
+    """ Write the kitchen report to the text file out as a JSON array
+
+    The rules are written one at a time, the report is never completely
+    in memory.
+    """
+
+    out.write("[")
+    for seqno, rule in enumerate(kitchen_report(for_date, include_archive)):
+        if seqno:
+            out.write(",\n")
+        out.write(ujson.dumps(rule.as_dict(), ensure_ascii=False))
+    out.write("]\n")
+
+
+@dataclass
+class DietCalendar():
+    """ The diet lines active per patient for a range of days
+
+        :start_date: The first day of the calendar
+        :days: For each day a dictionary of patient id to a tuple with
+                   the ids of the diet lines active that day. Days on which
+                   nothing changes for a patient share the tuple.
+
+    """
+
+    start_date: date
+    days: list = field(default_factory=list)
+
+    def for_date(self, for_date):
+        """ Return the patient to diet lines dictionary for for_date """
+
+        day = (for_date - self.start_date).days
+        if day < 0 or day >= len(self.days):
+            raise IndexError(f"{for_date} is not in the calendar")
+        return self.days[day]
+
+    def lines_for(self, for_date, patient_id):
+        """ Return the diet line ids for the patient on for_date """
+
+        return self.for_date(for_date).get(patient_id, ())
+
+
+def diet_calendar(start_date, number_of_days, include_archive=False):
+    """ Compute the active diet lines for all patients for a range of days
+
+    The diets overlapping the range are read once, as intervals. The days
+    are then swept in order: a line is added to its patient on the day its
+    diet starts and removed on the day it ends, like
+    :py:meth:`DietHeader.is_current` does for a single day. A diet ending
+    on or before its start is current on no day and is skipped. A range
+    of no days gives an empty calendar.
+    """
+
+    if number_of_days <= 0:
+        return DietCalendar(start_date=start_date)
+    end_date = start_date + timedelta(days=number_of_days)
+    header, line = diet_tables(include_archive)
+    interval_stmt = (select(line.id, header.patient_id,
+                            header.permanent_diet, header.start_date,
+                            header.end_date)
+                     .join(header, line.diet_id == header.id)
+                     .where(header.patient_id.is_not(None),
+                            or_(header.permanent_diet.is_(True),
+                                and_(header.start_date < end_date,
+                                     or_(header.end_date.is_(None),
+                                         header.end_date > start_date))))
+                     .execution_options(yield_per=1000))
+    starting = [[] for _ in range(number_of_days)]
+    ending = [[] for _ in range(number_of_days)]
+    for line_id, patient_id, permanent, diet_start, diet_end in\
+            session.execute(interval_stmt):
+        if (not permanent and diet_end is not None
+                and diet_end <= diet_start):
+            continue
+        if permanent or diet_start <= start_date:
+            first_day = 0
+        else:
+            first_day = (diet_start - start_date).days
+        starting[first_day].append((patient_id, line_id))
+        if not permanent and diet_end is not None and diet_end < end_date:
+            ending[(diet_end - start_date).days].append((patient_id, line_id))
+    calendar = DietCalendar(start_date=start_date)
+    active = {}
+    current_day = {}
+    for day in range(number_of_days):
+        changed = set()
+        for patient_id, line_id in ending[day]:
+            active.get(patient_id, set()).discard(line_id)
+            changed.add(patient_id)
+        for patient_id, line_id in starting[day]:
+            active.setdefault(patient_id, set()).add(line_id)
+            changed.add(patient_id)
+        if changed:
+            current_day = dict(current_day)
+            for patient_id in changed:
+                if active.get(patient_id):
+                    current_day[patient_id] = tuple(sorted(active[patient_id]))
+                else:
+                    current_day.pop(patient_id, None)
+        calendar.days.append(current_day)
+    return calendar
@@ -0,0 +1,225 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+""" This module proposes stored terms for misspelled words.
+
+A medication or an examination is easily mistyped. For these fields the
+stored terms close to what was typed are proposed, like a spellchecker
+does. Closeness is the number of characters inserted, deleted, replaced
+or swapped to get from one to the other.
+
+The index is a deletion dictionary: for each term the strings made by
+deleting up to max_distance characters from its first prefix_length
+characters point to the term. A typed word is looked up by its own
+deletions, so only a few terms are compared in full. Taking only the
+start of the terms keeps the number of deletions per term small, however
+many terms there are.
+"""
+
+from sqlalchemy import event
+from carereport import session
+from .suggestions import term_index, saved_terms
+
+
+def edit_distance(word, term, max_distance):
+    """ The number of edits between word and term
+
+    Edits are inserting, deleting or replacing a character or swapping
+    two adjacent ones. Beyond max_distance the counting stops and
+    max_distance + 1 is returned.
+    """
+
+    if abs(len(word) - len(term)) > max_distance:
+        return max_distance + 1
+    before = None
+    previous = list(range(len(term) + 1))
+    for i, character in enumerate(word, 1):
+        current = [i] + [0] * len(term)
+        for j, term_character in enumerate(term, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + (character != term_character))
+            if (before is not None and i > 1 and j > 1
+                    and character == term[j - 2]
+                    and word[i - 2] == term_character):
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        before, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+class DeletionIndex():
+    """ Terms indexed by the deletions of their first characters """
+
+    def __init__(self, terms=(), max_distance=2, prefix_length=7):
+
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.terms = {}
+        self.deletions = {}
+        for term in terms:
+            self.add(term)
+
+    def __len__(self):
+
+        return len(self.terms)
+
+    def deletes(self, key):
+        """ Return key and the strings made by deleting characters of it """
+
+        key = key[:self.prefix_length]
+        found = {key}
+        edits = [key]
+        for _ in range(self.max_distance):
+            edits = [edit[:i] + edit[i + 1:]
+                     for edit in edits for i in range(len(edit))]
+            edits = [edit for edit in edits if edit not in found]
+            found.update(edits)
+        return found
+
+    def add(self, term):
+        """ Add a term to the index """
+
+        key = term.casefold()
+        if not key or key in self.terms:
+            return
+        self.terms[key] = term
+        for delete in self.deletes(key):
+            self.deletions.setdefault(delete, []).append(key)
+
+    def lookup(self, word, max_distance=None):
+        """ Return the terms within max_distance edits of word
+
+        The result is a list of tuples of term and distance, ordered on the
+        distance. Case does not count as a difference.
+        """
+
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        word = word.casefold()
+        if not word:
+            return []
+        candidates = {key for delete in self.deletes(word)
+                      for key in self.deletions.get(delete, ())}
+        found = []
+        for key in candidates:
+            distance = edit_distance(word, key, max_distance)
+            if distance <= max_distance:
+                found.append((self.terms[key], distance))
+        found.sort(key=lambda item: (item[1], item[0].casefold()))
+        return found
+
+
+spelling_fields = ("medication", "examination_kind")
+
+
+class SpellingIndex():
+    """ The deletion indexes for the fields corrections are proposed for
+
+    The index for a field is built from the terms in the term index, the
+    first time corrections are asked for the field. Terms saved in a
+    transaction wait in pending until the commit.
+    """
+
+    def __init__(self, fields=spelling_fields, terms=term_index,
+                 max_distance=2):
+
+        self.fields = fields
+        self.term_index = terms
+        self.max_distance = max_distance
+        self.indexes = {}
+        self.pending = set()
+
+    def index(self, field):
+        """ Return the index for field, building it if needed """
+
+        if field not in self.indexes:
+            self.indexes[field] = DeletionIndex(
+                self.term_index.trie(field), self.max_distance)
+        return self.indexes[field]
+
+    def corrections(self, field, word, limit=5):
+        """ Return at most limit stored terms of field close to word
+
+        The closest terms come first, equally close terms the most used
+        first.
+        """
+
+        trie = self.term_index.trie(field)
+        found = self.index(field).lookup(word)
+        found.sort(key=lambda item: (item[1], -trie.uses(item[0])))
+        return [term for term, _ in found[:limit]]
+
+    def add(self, field, term):
+        """ Add a term for field, if the index is built """
+
+        if field in self.indexes:
+            self.indexes[field].add(term)
+
+    def reset(self):
+        """ Forget the indexes, they are built again when needed """
+
+        self.indexes.clear()
+        self.pending.clear()
+
+    def suggester(self, field):
+        """ Return a function proposing terms for what was typed
+
+        Terms starting with the text are proposed; if there are none, the
+        corrections for it are.
+        """
+
+        def suggest(prefix):
+            return (self.term_index.suggest(field, prefix)
+                    or self.corrections(field, prefix))
+
+        return suggest
+
+
+spelling_index = SpellingIndex()
+
+
+@event.listens_for(session, "after_flush")
+def index_saved_terms(session, flush_context):
+    """ Keep the terms just saved for the built indexes """
+
+    spelling_index.pending.update(
+        (field, term) for field, term in saved_terms(session)
+        if field in spelling_index.fields)
+
+
+@event.listens_for(session, "after_commit")
+def commit_indexed_terms(session):
+    """ The terms saved are in the database, add them to the indexes """
+
+    for field, term in spelling_index.pending:
+        spelling_index.add(field, term)
+    spelling_index.pending.clear()
+
+
+@event.listens_for(session, "after_rollback")
+def rollback_indexed_terms(session):
+    """ Forget the terms saved and the indexes of tries loaded again
+
+    The term index drops the tries loaded while saving first, its
+    listener is registered when the suggestions module is imported.
+    """
+
+    spelling_index.pending.clear()
+    for field in list(spelling_index.indexes):
+        if field not in spelling_index.term_index.tries:
+            del spelling_index.indexes[field]
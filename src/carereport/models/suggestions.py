@@ -0,0 +1,476 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+""" This module proposes terms already in the database while typing.
+
+For a number of fields, like the food name of a diet line or the kind of
+an examination, the values already used are proposed when a user starts
+typing. The terms of a field are read once, on first use, into a prefix
+trie, so looking up the terms for what was typed does not need the
+database.
+
+The terms used most are proposed first. The number of times each term was
+saved is kept in a summary table, counted up after each flush. The tries
+are counted up when the transaction is committed, so a rollback leaves
+them as they were. Each node of a trie keeps its most used terms, so a
+lookup does not count.
+
+With a snapshot of the summary opened, a field is loaded from the snapshot
+and only the summary rows changed since the snapshot was written are read
+(see termsnapshot).
+"""
+
+import threading
+from collections import Counter
+from sqlalchemy import (String, Integer, Index, select, insert, update,
+                        func, event, inspect)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import mapped_column
+from carereport import Base, session
+from .medical import (DietHeader, DietLines, Medication, ExaminationRequest,
+                      Treatment)
+
+
+class TermUsage(Base):
+    """ The number of times a term was saved for a field
+
+        :field: The name of the field in the term index
+        :term: The term
+        :uses: The number of times it was saved
+
+    """
+
+    __tablename__ = "termusage"
+
+    id = mapped_column(Integer, primary_key=True)
+    field = mapped_column(String(32), nullable=False)
+    term = mapped_column(String(256), nullable=False)
+    uses = mapped_column(Integer, nullable=False, default=0)
+
+    __table_args__ = (Index("byfieldterm", "field", "term", unique=True),)
+
+
+def save_counted(connection, field, usage):
+    """ Save the uses counted for field in the summary
+
+    Another workstation may have counted and saved the field first, the
+    insert then fails on the unique index and is rolled back to a
+    savepoint. Returns whether the uses were saved.
+    """
+
+    try:
+        with connection.begin_nested():
+            connection.execute(insert(TermUsage.__table__),
+                               [{"field": field, "term": term, "uses": uses}
+                                for term, uses in usage])
+    except IntegrityError:
+        return False
+    return True
+
+
+def count_up(connection, field, term, count):
+    """ Count up the uses of term for field in the summary
+
+    A term not in the summary is inserted. If another workstation inserted
+    it since the update, the insert fails on the unique index, is rolled
+    back to a savepoint and the row is updated after all.
+    """
+
+    summary = TermUsage.__table__
+    count_up_stmt = (update(summary)
+                     .where(summary.c.field == field,
+                            summary.c.term == term)
+                     .values(uses=summary.c.uses + count))
+    if connection.execute(count_up_stmt).rowcount:
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(insert(summary),
+                               [{"field": field, "term": term,
+                                 "uses": count}])
+    except IntegrityError:
+        connection.execute(count_up_stmt)
+
+
+class TrieNode():
+    """ A node in the prefix trie
+
+        :children: The nodes for the next character, None for a leaf
+        :term: The term ending in this node, if any
+        :uses: The number of uses of the term
+        :top: The nodes of the most used terms from this node on
+
+    """
+
+    __slots__ = ("children", "term", "uses", "top")
+
+    def __init__(self):
+
+        self.children = None
+        self.term = None
+        self.uses = 0
+        self.top = None
+
+
+def ranking(node):
+    """ Most used terms first, equally used ones alphabetically """
+
+    return (-node.uses, node.term.casefold())
+
+
+class PrefixTrie():
+    """ Terms in a trie on their case folded characters
+
+    Each node keeps the top_size most used terms starting with its prefix.
+    Looking up the terms for a prefix takes a step per character of the
+    prefix and returns the top of the node reached.
+    """
+
+    def __init__(self, terms=(), top_size=10):
+
+        self.root = TrieNode()
+        self.size = 0
+        self.top_size = top_size
+        for term in terms:
+            self.add(term)
+
+    def __len__(self):
+
+        return self.size
+
+    def path(self, key, create=False):
+        """ Return the nodes from the root to the node for key
+
+        If the node for key does not exist, the list is empty.
+        """
+
+        node = self.root
+        nodes = [node]
+        for character in key:
+            if node.children is None:
+                if not create:
+                    return []
+                node.children = {}
+            child = node.children.get(character)
+            if child is None:
+                if not create:
+                    return []
+                child = node.children[character] = TrieNode()
+            node = child
+            nodes.append(node)
+        return nodes
+
+    def add(self, term, uses=1):
+        """ Add uses to a term, adding the term if it is new """
+
+        if not term:
+            return
+        nodes = self.path(term.casefold(), create=True)
+        node = nodes[-1]
+        if node.term is None:
+            self.size += 1
+        node.term = term
+        node.uses += uses
+        for path_node in nodes:
+            self.rank(path_node, node)
+
+    def rank(self, path_node, node):
+        """ Put the term of node in the top of path_node if it belongs """
+
+        if path_node.top is None:
+            path_node.top = []
+        top = path_node.top
+        if node not in top:
+            if (len(top) >= self.top_size
+                    and ranking(node) >= ranking(top[-1])):
+                return
+            top.append(node)
+        top.sort(key=ranking)
+        del top[self.top_size:]
+
+    def __iter__(self):
+
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.term is not None:
+                yield node.term
+            if node.children:
+                stack.extend(node.children.values())
+
+    def __contains__(self, term):
+
+        nodes = self.path(term.casefold())
+        return bool(nodes) and nodes[-1].term is not None
+
+    def uses(self, term):
+        """ The number of uses of term """
+
+        nodes = self.path(term.casefold())
+        return nodes[-1].uses if nodes else 0
+
+    def suggest(self, prefix, limit=10):
+        """ Return at most limit terms starting with prefix
+
+        The prefix is matched regardless of case. The most used terms come
+        first. If more terms are asked than are kept per node, they are
+        collected and ranked.
+        """
+
+        nodes = self.path(prefix.casefold())
+        if not nodes:
+            return []
+        node = nodes[-1]
+        if limit <= self.top_size:
+            return [ranked.term for ranked in (node.top or [])[:limit]]
+        terms = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.term is not None:
+                terms.append(node)
+            if node.children:
+                stack.extend(node.children.values())
+        return [ranked.term for ranked in sorted(terms, key=ranking)[:limit]]
+
+
+term_fields = {"diet_name": DietHeader.diet_name,
+               "food_name": DietLines.food_name,
+               "application_type": DietLines.application_type,
+               "medication": Medication.medication,
+               "frequency_type": Medication.frequency_type,
+               "examination_kind": ExaminationRequest.examination_kind,
+               "examaning_department":
+                   ExaminationRequest.examaning_department,
+               "requester_department":
+                   ExaminationRequest.requester_department,
+               "treatment_name": Treatment.name}
+
+
+class TermIndex():
+    """ The tries for the fields terms are proposed for
+
+    The trie for a field is loaded the first time terms are asked for the
+    field or a term of it is saved. The uses saved in a transaction wait in
+    pending until the commit, the fields loaded while saving in loaded.
+    """
+
+    def __init__(self, fields=None, top_size=10):
+
+        self.fields = term_fields if fields is None else fields
+        self.top_size = top_size
+        self.tries = {}
+        self.pending = Counter()
+        self.loaded = set()
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def load(self, field, load_session=None):
+        """ Load the trie for field with the uses in the summary
+
+        The first time a field is loaded, there is no summary. The uses are
+        then counted from the stored values and saved in the summary. This
+        returns True if the uses were counted.
+        """
+
+        trie, counted = self.build(field, load_session)
+        self.tries[field] = trie
+        return counted
+
+    def build(self, field, load_session=None):
+        """ Return the trie for field and whether its uses were counted
+
+        The trie is not put in the index, so it can be built on another
+        thread with load_session and installed on the GUI thread. Tries
+        are built one at a time, so two threads do not count the uses of
+        a field at the same time.
+        """
+
+        load_session = load_session or session
+        with self.lock:
+            if self.snapshot is not None and field in self.snapshot:
+                return self.build_from_snapshot(field, load_session), False
+            return self.build_from_summary(field, load_session)
+
+    def install(self, tries):
+        """ Put tries built on another thread in the index
+
+        A field loaded on the GUI thread in the meantime keeps its trie,
+        that one has the uses saved since.
+        """
+
+        for field, trie in tries.items():
+            self.tries.setdefault(field, trie)
+
+    def build_from_summary(self, field, load_session):
+        """ Return the trie for field from the summary, counting if new """
+
+        summary_stmt = (select(TermUsage.term, TermUsage.uses)
+                        .where(TermUsage.field == field))
+        usage = load_session.execute(summary_stmt).all()
+        counted = not usage
+        if counted:
+            column = self.fields[field]
+            usage = load_session.execute(
+                select(column, func.count())
+                .where(column.is_not(None), column != "")
+                .group_by(column)).all()
+            if usage and not save_counted(load_session.connection(), field,
+                                          usage):
+                usage = load_session.execute(summary_stmt).all()
+                counted = False
+        trie = PrefixTrie(top_size=self.top_size)
+        for term, uses in usage:
+            trie.add(term, uses)
+        return trie, counted
+
+    def build_from_snapshot(self, field, load_session):
+        """ Return the trie for field from the snapshot and the changes since
+
+        The summary rows changed at or after the watermark of the snapshot
+        replace the uses in the snapshot.
+        """
+
+        usage = dict(self.snapshot.terms(field))
+        usage.update(load_session.execute(
+            select(TermUsage.term, TermUsage.uses)
+            .where(TermUsage.field == field,
+                   TermUsage.updated_at >= self.snapshot.watermark)).all())
+        trie = PrefixTrie(top_size=self.top_size)
+        for term, uses in usage.items():
+            trie.add(term, uses)
+        return trie
+
+    def trie(self, field):
+        """ Return the trie for field, loading it if needed """
+
+        if field not in self.tries:
+            self.load(field)
+        return self.tries[field]
+
+    def suggest(self, field, prefix, limit=10):
+        """ Return at most limit terms for field starting with prefix """
+
+        return self.trie(field).suggest(prefix, limit)
+
+    def add(self, field, term, uses=1):
+        """ Add uses of a term for field, if the field is loaded """
+
+        if field in self.tries:
+            self.tries[field].add(term, uses)
+
+    def record_uses(self, uses):
+        """ Count up the uses of saved terms in the summary
+
+        uses is a Counter of tuples of field and term. A field that is
+        loaded now already has the saved terms counted. The uses are added
+        to the tries when the transaction is committed.
+        """
+
+        loaded = {field for field, _ in uses if field not in self.tries}
+        counted = {field for field in loaded if self.load(field)}
+        self.loaded.update(loaded)
+        connection = session.connection()
+        for (field, term), count in uses.items():
+            if field in counted:
+                continue
+            self.pending[(field, term)] += count
+            count_up(connection, field, term, count)
+
+    def commit_uses(self):
+        """ Add the uses saved in the committed transaction to the tries """
+
+        for (field, term), count in self.pending.items():
+            self.add(field, term, count)
+        self.pending.clear()
+        self.loaded.clear()
+
+    def rollback_uses(self):
+        """ Forget the uses saved in the rolled back transaction
+
+        A trie loaded while saving has the rolled back uses, it is loaded
+        again when needed.
+        """
+
+        for field in self.loaded:
+            self.tries.pop(field, None)
+        self.pending.clear()
+        self.loaded.clear()
+
+    def reset(self):
+        """ Forget the loaded terms, they are read again when needed """
+
+        self.tries.clear()
+        self.pending.clear()
+        self.loaded.clear()
+
+    def suggester(self, field):
+        """ Return a function giving the terms for a prefix for field """
+
+        def suggest(prefix):
+            return self.suggest(field, prefix)
+
+        return suggest
+
+
+term_index = TermIndex()
+
+
+def saved_terms(session):
+    """ Return a Counter of the field and term of values flushed
+
+    For new instances all term fields count, for changed instances only
+    the fields that changed.
+    """
+
+    uses = Counter()
+    new = set(session.new)
+    for instance in new.union(session.dirty):
+        for field, column in term_index.fields.items():
+            if not isinstance(instance, column.class_):
+                continue
+            if instance in new:
+                value = getattr(instance, column.key)
+            else:
+                added = inspect(instance).attrs[column.key].history.added
+                value = added[0] if added else None
+            if value:
+                uses[(field, value)] += 1
+    return uses
+
+
+@event.listens_for(session, "after_flush")
+def count_saved_terms(session, flush_context):
+    """ Count the uses of the terms just saved """
+
+    uses = saved_terms(session)
+    if uses:
+        term_index.record_uses(uses)
+
+
+@event.listens_for(session, "after_commit")
+def commit_saved_terms(session):
+    """ The terms saved are in the database, count them in the tries """
+
+    term_index.commit_uses()
+
+
+@event.listens_for(session, "after_rollback")
+def rollback_saved_terms(session):
+    """ The terms saved are undone, so are their uses """
+
+    term_index.rollback_uses()
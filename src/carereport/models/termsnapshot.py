@@ -0,0 +1,228 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+""" This module keeps a snapshot of the term uses on disk.
+
+Reading the uses of all terms from the database when the application
+starts takes time. The term uses are therefore written to a file when the
+application stops and mapped into memory when it starts. The snapshot
+holds a time before which it has all changes, the watermark. Loading a
+field takes its terms from the snapshot and reads only the summary rows
+changed since the watermark.
+
+The change times come from the clocks of the workstations, and a change
+made just before the snapshot may not be committed yet. The watermark is
+therefore set back a margin of seconds; the rows changed in the margin are
+read again, which does no harm.
+
+The file to use and the margin are set in the configuration file:
+
+    [SUGGESTIONS]
+    SNAPSHOT = /var/lib/carereport/terms.snapshot
+    SNAPSHOT_MARGIN_SECONDS = 300
+
+The file starts with a header (format, version, watermark and number of
+fields), followed by a directory with the name, offset and number of
+terms of each field. The terms of a field are records of the uses, the
+length of the term in bytes and the term in UTF-8.
+"""
+
+import mmap
+import os
+import struct
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from carereport import config, Session
+from .suggestions import TermUsage, term_index
+
+MAGIC = b"CRTS"
+VERSION = 1
+header_format = struct.Struct("<4sHqI")
+directory_format = struct.Struct("<32sII")
+term_format = struct.Struct("<IH")
+epoch = datetime(1, 1, 1)
+microsecond = timedelta(microseconds=1)
+
+
+class SnapshotError(ValueError):
+    """ The file is not a term snapshot this version can read """
+
+    pass
+
+
+def snapshot_path():
+    """ The snapshot file from the configuration, None if not set """
+
+    return config.get("SUGGESTIONS", "SNAPSHOT", fallback=None)
+
+
+def snapshot_margin():
+    """ The seconds the watermark is set back """
+
+    return config.getint("SUGGESTIONS", "SNAPSHOT_MARGIN_SECONDS",
+                         fallback=300)
+
+
+def read_usage(snapshot_session, margin):
+    """ Return the watermark and the term uses in the summary
+
+    The watermark is the time of the database clock or of the last
+    change, whichever is earlier, less margin seconds. It is taken before
+    the uses are read.
+    """
+
+    now, last_change = snapshot_session.execute(
+        select(func.now(), func.max(TermUsage.updated_at))).one()
+    watermark = (min(now, last_change) - timedelta(seconds=margin)
+                 if last_change else epoch)
+    usage = snapshot_session.execute(
+        select(TermUsage.field, TermUsage.term, TermUsage.uses)
+        .order_by(TermUsage.field, TermUsage.term)).all()
+    return max(watermark, epoch), usage
+
+
+def write_snapshot(path, snapshot_session=None, margin=None):
+    """ Write the term uses in the summary to a snapshot file at path
+
+    The uses are read in a session of their own, unless one is passed, so
+    only committed uses are in the snapshot. The file is written next to
+    path and then replaces it, so a snapshot being read is never half
+    written. Returns the watermark.
+    """
+
+    margin = snapshot_margin() if margin is None else margin
+    if snapshot_session is None:
+        with Session() as own_session:
+            watermark, usage = read_usage(own_session, margin)
+    else:
+        watermark, usage = read_usage(snapshot_session, margin)
+    sections = {}
+    for field, term, uses in usage:
+        encoded = term.encode("utf-8")
+        sections.setdefault(field, []).append(
+            term_format.pack(uses, len(encoded)) + encoded)
+    offset = header_format.size + directory_format.size * len(sections)
+    directory = []
+    for field, records in sections.items():
+        directory.append(directory_format.pack(field.encode("utf-8"),
+                                               offset, len(records)))
+        offset += sum(len(record) for record in records)
+    temporary = path + ".new"
+    with open(temporary, "wb") as snapshot_file:
+        snapshot_file.write(header_format.pack(
+            MAGIC, VERSION, (watermark - epoch) // microsecond,
+            len(sections)))
+        snapshot_file.writelines(directory)
+        for records in sections.values():
+            snapshot_file.writelines(records)
+    os.replace(temporary, path)
+    return watermark
+
+
+class TermSnapshot():
+    """ A snapshot file mapped into memory
+
+    Only the header and directory are read on opening. The terms of a
+    field are read from the mapped file when the field is loaded.
+    """
+
+    def __init__(self, path):
+
+        with open(path, "rb") as snapshot_file:
+            if os.fstat(snapshot_file.fileno()).st_size < header_format.size:
+                raise SnapshotError(f"{path} is not a term snapshot")
+            self.map = mmap.mmap(snapshot_file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        magic, version, watermark, field_count = \
+            header_format.unpack_from(self.map)
+        if magic != MAGIC:
+            self.close()
+            raise SnapshotError(f"{path} is not a term snapshot")
+        if version != VERSION:
+            self.close()
+            raise SnapshotError(f"{path} is snapshot version {version}")
+        self.watermark = epoch + watermark * microsecond
+        self.fields = {}
+        for number in range(field_count):
+            name, offset, count = directory_format.unpack_from(
+                self.map, header_format.size
+                + number * directory_format.size)
+            self.fields[name.rstrip(b"\0").decode("utf-8")] = (offset,
+                                                               count)
+
+    def __contains__(self, field):
+
+        return field in self.fields
+
+    def terms(self, field):
+        """ Yield the terms of field with their uses """
+
+        offset, count = self.fields[field]
+        for _ in range(count):
+            uses, length = term_format.unpack_from(self.map, offset)
+            offset += term_format.size
+            yield self.map[offset:offset + length].decode("utf-8"), uses
+            offset += length
+
+    def close(self):
+        """ Unmap the file """
+
+        self.map.close()
+
+
+def open_snapshot(index=term_index, path=None):
+    """ Let index load its fields from the snapshot at path
+
+    Without a path the configured snapshot is used. A missing or unreadable
+    snapshot is skipped, the index then reads from the database. Returns
+    whether a snapshot was opened.
+    """
+
+    path = path or snapshot_path()
+    if not path:
+        return False
+    try:
+        snapshot = TermSnapshot(path)
+    except (OSError, SnapshotError):
+        return False
+    if index.snapshot is not None:
+        index.snapshot.close()
+    index.snapshot = snapshot
+    index.reset()
+    return True
+
+
+def save_snapshot(index=term_index, path=None):
+    """ Write the configured snapshot, if one is configured
+
+    The snapshot index loads from is closed first, as a mapped file cannot
+    be replaced on every platform. Uses not committed yet are not
+    written.
+    """
+
+    path = path or snapshot_path()
+    if not path:
+        return
+    if index.snapshot is not None:
+        index.snapshot.close()
+        index.snapshot = None
+    write_snapshot(path)
+
+
+if __name__ == "__main__":
+    print(f"Watermark {write_snapshot(sys.argv[1])}")
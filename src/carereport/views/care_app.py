@@ -21,9 +21,11 @@ with the actions the user can take."""
 
 from PyQt6.QtCore import (QLocale, pyqtSignal)
 from PyQt6.QtWidgets import QMainWindow, QWidget, QApplication
+from sqlalchemy.orm.exc import StaleDataError
 import carereport
 from .mainwindow import Ui_MainWindow
 from .formhandle import Ui_Form
+from .patienttabs import PatientTabs
 
 
 class CareApp(QApplication):
@@ -42,6 +44,7 @@ class CentralForm(QWidget, Ui_Form):
     the window. Any data for this patient can de shown in the multi tabular
     widget below it. Think of medical data as examinations, but also data for
     the day to day care, such as any diets the patient follows.
+    The tabs are filled by their providers when they are shown.
     """
 
     def __init__(self):
@@ -49,6 +52,7 @@ class CentralForm(QWidget, Ui_Form):
         super().__init__()
         self.setupUi(self)
         self.diet_tab = None
+        self.patient_tabs = PatientTabs(self.patientData)
 
 
 class CareAppWindow(QMainWindow, Ui_MainWindow):
@@ -82,7 +86,9 @@ class CareAppWindow(QMainWindow, Ui_MainWindow):
         depending on the patient. In practice it will be (almost) all of
         the tabs in the widget.
 
-        Side effects will be done by emitting the newCurrentPatient signal.
+        The tab shown is loaded for the new patient, the other tabs when
+        the user switches to them. Other side effects will be done by
+        emitting the newCurrentPatient signal.
         """
 
         if hasattr(app, "current_patient_view"):
@@ -91,6 +97,7 @@ class CareAppWindow(QMainWindow, Ui_MainWindow):
             previous_patient_view = None
         app.current_patient_view = new_patient_view
         self.on_current_patient_change()
+        self.main_form.patient_tabs.change_patient(new_patient_view)
         carereport.new_current_patient_emitter.newCurrentPatient.emit(
             new_patient_view)
         # delattr(app, "previous_patient_view")
@@ -126,6 +133,45 @@ class CareAppWindow(QMainWindow, Ui_MainWindow):
 
         self.newSearch.emit()
 
+    def save_changes(self):
+        """ Commit the changes made, unless someone else changed the records
+
+        A record changed by someone else since it was read is not
+        overwritten. The changes are rolled back and the status bar says
+        so. Returns whether the changes were saved.
+        """
+
+        try:
+            carereport.session.commit()
+        except StaleDataError:
+            carereport.session.rollback()
+            self.statusbar.showMessage("Gegevens zijn intussen door een"
+                                       " ander gewijzigd, wijziging niet"
+                                       " opgeslagen")
+            return False
+        return True
+
+    def wait_for(self, startup, needs):
+        """ Enable the actions using the database when it can be used
+
+        The stages of the start-up in needs must be ready first. A failed
+        stage is shown on the status bar.
+        """
+
+        database_actions = (self.actionNieuw, self.actionPatientZoeken)
+        for action in database_actions:
+            action.setEnabled(False)
+
+        def enable_actions():
+            for action in database_actions:
+                action.setEnabled(True)
+
+        def show_failure(name, error):
+            self.statusbar.showMessage(f"Opstarten mislukt ({name}): {error}")
+
+        startup.when_ready(needs, enable_actions)
+        startup.stageFailed.connect(show_failure)
+
     def connect_to_new_intake(self, notify_method):
         """ A notification of creating a new intake
 
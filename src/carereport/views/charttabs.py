@@ -0,0 +1,268 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+""" This module shows the medication, examinations and diagnoses tabs.
+
+The chart of a patient may hold thousands of entries. The tabs show them
+in a table view over a model that reads the entries a page at a time,
+when the user scrolls to the end of what is read. The entries still in
+use come first, like the medication used today, the history is read only
+when the user asks for it.
+"""
+
+from datetime import date
+from functools import partial
+from operator import attrgetter
+from PyQt6.QtCore import QAbstractTableModel, QLocale, QModelIndex, Qt
+from PyQt6.QtWidgets import (QAbstractItemView, QCheckBox, QHeaderView,
+                             QTableView, QVBoxLayout)
+from carereport.models.medical import (Medication, ExaminationRequest,
+                                       Diagnose)
+from .care_app import mainwindow
+from .patienttabs import TabProvider
+
+
+class ChartTableModel(QAbstractTableModel):
+    """ A table of chart entries of a patient, read a page at a time
+
+        :columns: Pairs of a header and a function giving the value of the
+                  column for an entry
+        :pages: Functions reading a page of entries, called with the
+                patient, the key of the last entry read and the page size
+        :history_pages: Functions reading the history a page at a time,
+                        only used after show_history
+        :key: The function giving the key of an entry
+
+    The pages are read one after another, the next one when the previous
+    one has no more entries.
+    """
+
+    page_size = 100
+
+    def __init__(self, columns, pages, history_pages=(),
+                 key=attrgetter("id"), parent=None):
+
+        super().__init__(parent)
+        self.columns = columns
+        self.pages = list(pages)
+        self.history_pages = list(history_pages)
+        self.key = key
+        self.history = False
+        self.patient = None
+        self.entries = []
+        self.page = 0
+        self.after = None
+
+    def read_pages(self):
+        """ The page functions in the order they are read """
+
+        return self.pages + (self.history_pages if self.history else [])
+
+    def load(self, patient):
+        """ Show the entries of patient, starting with the first page """
+
+        self.beginResetModel()
+        self.patient = patient
+        self.entries = []
+        self.page = 0
+        self.after = None
+        self.endResetModel()
+        self.fetchMore()
+
+    def clear(self):
+        """ Show no patient """
+
+        self.load(None)
+
+    def show_history(self, history=True):
+        """ Read the history after the entries in use, or stop showing it """
+
+        if history == self.history:
+            return
+        self.history = history
+        if history:
+            self.fetchMore()
+        else:
+            self.load(self.patient)
+
+    def rowCount(self, parent=QModelIndex()):
+
+        return 0 if parent.isValid() else len(self.entries)
+
+    def columnCount(self, parent=QModelIndex()):
+
+        return 0 if parent.isValid() else len(self.columns)
+
+    def canFetchMore(self, parent=QModelIndex()):
+
+        return (not parent.isValid() and self.patient is not None
+                and self.page < len(self.read_pages()))
+
+    def fetchMore(self, parent=QModelIndex()):
+        """ Read the next page of entries
+
+        A page with less entries than the page size is the last one of its
+        function, the entries after it come from the next function.
+        """
+
+        read_pages = self.read_pages()
+        entries = []
+        while self.canFetchMore(parent) and not entries:
+            entries = read_pages[self.page](self.patient, self.after,
+                                            self.page_size)
+            if len(entries) < self.page_size:
+                self.page += 1
+                self.after = None
+            else:
+                self.after = self.key(entries[-1])
+        if entries:
+            self.beginInsertRows(QModelIndex(), len(self.entries),
+                                 len(self.entries) + len(entries) - 1)
+            self.entries.extend(entries)
+            self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        value = self.columns[index.column()][1](self.entries[index.row()])
+        if value is None:
+            return ""
+        if isinstance(value, date):
+            locale = QLocale()
+            return locale.toString(value, locale.FormatType.ShortFormat)
+        return str(value)
+
+    def headerData(self, section, orientation,
+                   role=Qt.ItemDataRole.DisplayRole):
+
+        if (orientation == Qt.Orientation.Horizontal
+                and role == Qt.ItemDataRole.DisplayRole):
+            return self.columns[section][0]
+        return None
+
+
+class ChartTab(TabProvider):
+    """ A tab showing part of the chart in a table
+
+    With a history text, the tab has a check box to show the history.
+    """
+
+    def __init__(self, tab, model, history_text=None):
+
+        self.model = model
+        layout = QVBoxLayout(tab)
+        self.history_box = None
+        if history_text:
+            self.history_box = QCheckBox(history_text, parent=tab)
+            self.history_box.toggled.connect(model.show_history)
+            layout.addWidget(self.history_box)
+        self.table = QTableView(parent=tab)
+        self.table.setModel(model)
+        self.table.setSelectionBehavior(
+            QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(
+            QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().setSectionResizeMode(
+            QHeaderView.ResizeMode.Fixed)
+        self.table.verticalHeader().hide()
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+    def load(self, patient_view):
+        """ Show the chart entries of the patient """
+
+        if patient_view.patient is None:
+            self.model.clear()
+        else:
+            self.model.load(patient_view.patient)
+
+    def release(self):
+        """ Show no entries and the entries in use only """
+
+        if self.history_box is not None:
+            self.history_box.setChecked(False)
+        self.model.clear()
+
+
+def frequency_text(medication):
+    """ The frequency of medication as shown in the table """
+
+    return f"{medication.frequency} {medication.frequency_type}"
+
+
+def results_text(request):
+    """ The results of an examination request, or why it was refused """
+
+    return ("; ".join(result.examination_result or ""
+                      for result in request.result)
+            or request.request_refused)
+
+
+def medication_model():
+    """ The model of the medication tab """
+
+    return ChartTableModel(
+        (("Medicatie", attrgetter("medication")),
+         ("Frequentie", frequency_text),
+         ("Start", attrgetter("start_date")),
+         ("Einde", attrgetter("end_date"))),
+        (Medication.page_for_patient,),
+        (partial(Medication.page_for_patient, history=True),))
+
+
+def examinations_model():
+    """ The model of the examinations tab """
+
+    return ChartTableModel(
+        (("Onderzoek", attrgetter("examination_kind")),
+         ("Afdeling", attrgetter("examaning_department")),
+         ("Aangevraagd", attrgetter("date_request")),
+         ("Aanvrager", attrgetter("requester_name")),
+         ("Uitgevoerd", attrgetter("date_execution")),
+         ("Uitslag", results_text)),
+        (ExaminationRequest.page_for_patient,),
+        (partial(ExaminationRequest.page_for_patient, history=True),))
+
+
+def diagnose_model():
+    """ The model of the diagnose tab, with the number of treatments """
+
+    return ChartTableModel(
+        (("Diagnose", lambda row: row[0].description),
+         ("Gesteld door", lambda row: row[0].executor),
+         ("Behandelingen", lambda row: row[1])),
+        (Diagnose.page_for_patient,), key=lambda row: row[0].id)
+
+
+def chart_tabs(form):
+    """ Make the chart tabs of form and let them be loaded when shown """
+
+    tabs = {form.MedicationTab: ChartTab(form.MedicationTab,
+                                         medication_model(),
+                                         "Ook gestopte medicatie tonen"),
+            form.examinationsTab: ChartTab(form.examinationsTab,
+                                           examinations_model(),
+                                           "Ook afgeronde onderzoeken"
+                                           " tonen"),
+            form.DiagnoseTab: ChartTab(form.DiagnoseTab, diagnose_model())}
+    for tab, provider in tabs.items():
+        form.patient_tabs.register(tab, provider)
+    return tabs
+
+
+chart_tab_providers = chart_tabs(mainwindow.centralWidget())
@@ -125,6 +125,13 @@ class DietView():
         if self.end_date < self.start_date:
             raise DietEndBeforeStart("End date can not be before startdate")
 
+    def is_historical(self, for_date=None):
+        """ Did the diet end before for_date, by default today? """
+
+        for_date = for_date or date.today()
+        return (not self.permanent_diet and self.end_date is not None
+                and self.end_date < for_date)
+
     @staticmethod
     def diets_for_patient(patient_view):
         """ Create a list of diet views for a patient  """
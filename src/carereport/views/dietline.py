@@ -53,14 +53,12 @@ class Ui_dietLineDialog(object):
         self.descriptionErrorLabel.setText("")
         self.descriptionErrorLabel.setObjectName("descriptionErrorLabel")
         self.DietLineLayout.addWidget(self.descriptionErrorLabel, 2, 3, 1, 1)
-        self.dietLineTable = DietTableWidget(parent=dietLineDialog)
+        self.dietLineTable = QtWidgets.QTableView(parent=dietLineDialog)
         self.dietLineTable.setGeometry(QtCore.QRect(35, 20, 431, 192))
         self.dietLineTable.setSizeAdjustPolicy(QtWidgets.QAbstractScrollArea.SizeAdjustPolicy.AdjustToContents)
-        self.dietLineTable.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.dietLineTable.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.DoubleClicked|QtWidgets.QAbstractItemView.EditTrigger.EditKeyPressed)
         self.dietLineTable.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
         self.dietLineTable.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
-        self.dietLineTable.setRowCount(0)
-        self.dietLineTable.setColumnCount(2)
         self.dietLineTable.setObjectName("dietLineTable")
         self.dietLineTable.horizontalHeader().setDefaultSectionSize(200)
         self.dietLineTable.horizontalHeader().setStretchLastSection(True)
@@ -112,4 +110,4 @@ class Ui_dietLineDialog(object):
         self.statusMessageLabel.setText(_translate("dietLineDialog", "Klaar"))
         self.newLineButton.setText(_translate("dietLineDialog", "&Nieuwe dieetregel"))
         self.pushButton.setText(_translate("dietLineDialog", "Op&slaan"))
-from .widgetext import DescriptionWidget, DietTableWidget
+from .widgetext import DescriptionWidget
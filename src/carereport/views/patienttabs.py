@@ -0,0 +1,121 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+""" This module fills the tabs with patient data when they are shown.
+
+Each tab of the patient data, like the medication or the diets, has a
+provider. A provider loads the data of the current patient into its tab
+when the tab is shown for the first time for that patient. What it loaded
+is kept until another patient becomes current or the data is invalidated,
+so switching back to the tab costs nothing. Switching patients only loads
+the tab on screen.
+"""
+
+from PyQt6.QtCore import QObject
+
+
+class TabProvider():
+    """ The data of a patient in a tab
+
+    A provider loads the data of a patient into its tab and lets go of it
+    again. Releasing is the moment to save changes made in the tab. Both
+    do nothing by default, a provider overrides what its tab needs.
+    """
+
+    def load(self, patient_view):
+        """ Show the data of patient_view in the tab """
+
+        pass
+
+    def release(self):
+        """ Stop showing the data of the patient loaded """
+
+        pass
+
+
+class PatientTabs(QObject):
+    """ Load the tabs of a tab widget for the current patient on demand
+
+    Tabs are registered with their provider. Only the tab shown is loaded,
+    the other tabs are loaded when the user switches to them.
+    """
+
+    def __init__(self, tab_widget):
+
+        super().__init__()
+        self.tab_widget = tab_widget
+        self.providers = {}
+        self.loaded = set()
+        self.patient_view = None
+        tab_widget.currentChanged.connect(self.load_current)
+
+    def register(self, tab, provider):
+        """ Let provider fill tab, now if it is shown
+
+        A provider registered before for tab releases its data first.
+        """
+
+        self.release(tab)
+        self.providers[tab] = provider
+        self.load_current()
+
+    def unregister(self, tab):
+        """ Release the data in tab and stop filling it """
+
+        self.release(tab)
+        del self.providers[tab]
+
+    def change_patient(self, patient_view):
+        """ Release the tabs loaded and load the tab shown for patient_view """
+
+        for tab in list(self.loaded):
+            self.release(tab)
+        self.patient_view = patient_view
+        self.load_current()
+
+    def load_current(self, index=None):
+        """ Load the tab shown, unless it is already loaded """
+
+        tab = self.tab_widget.currentWidget()
+        if (self.patient_view is None or tab not in self.providers
+                or tab in self.loaded):
+            return
+        self.providers[tab].load(self.patient_view)
+        self.loaded.add(tab)
+
+    def release(self, tab):
+        """ Let the provider of tab release its data, if loaded """
+
+        if tab in self.loaded:
+            self.loaded.discard(tab)
+            self.providers[tab].release()
+
+    def invalidate(self, tab=None):
+        """ Load tab again the next time it is shown
+
+        Without a tab all tabs are invalidated. The tab shown is loaded
+        again right away.
+        """
+
+        for invalid in [tab] if tab is not None else list(self.loaded):
+            self.release(invalid)
+        self.load_current()
+
+    def is_loaded(self, tab):
+        """ Is the data of the current patient in tab? """
+
+        return tab in self.loaded
@@ -19,17 +19,28 @@
 The diets are input through two input widgets that ar switching between each
 other. One holds a list of diets (the headers that is) and the other one
 enables creation and maintenance of diets and rules within a diet.
+
+A patient may have followed many diets. The list only has widgets for the
+diet headers in view; scrolling hands the widgets of headers scrolled out
+of view to the headers scrolled into view.
 """
 import sys
 from datetime import date
-from PyQt6.QtWidgets import (QWidget, QDialog, QTableWidgetItem,
-                             QTableWidgetSelectionRange, QSizePolicy)
+from functools import partial
+from PyQt6.QtCore import QAbstractTableModel, QEvent, QModelIndex, Qt
+from PyQt6.QtWidgets import (QWidget, QDialog, QSizePolicy, QComboBox,
+                             QLayout, QDataWidgetMapper, QLineEdit,
+                             QStyledItemDelegate)
 from carereport import (app, new_current_patient_emitter)
+from carereport.models.patient import Patient
+from carereport.models.suggestions import term_index
 # from .patient_views import PatientView
 from .diet_views import DietView, DietLineView
 from .dietline import Ui_dietLineDialog
 from .dietheader import Ui_DietHeaderWidget
 from .care_app import (mainwindow)
+from .patienttabs import TabProvider
+from .widgetext import TermCompleter
 """ This module sets up diets. It takes care of creating new diets, updating
 existing diets through diet views.
 """
@@ -51,20 +62,48 @@ class _DietChanges(QWidget, Ui_DietHeaderWidget):
     """ This class contains shared functions for creating and updating  diet
     views from input."""
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, subscribe=True):
 
         super().__init__(parent=parent)
-        new_current_patient_emitter.newCurrentPatient.connect(
-            self.update_diet)
+        self.subscribed = subscribe
+        if subscribe:
+            new_current_patient_emitter.newCurrentPatient.connect(
+                self.update_diet)
+
+    def unsubscribe(self):
+        """ Stop updating the diet when the patient changes """
+
+        if self.subscribed:
+            new_current_patient_emitter.newCurrentPatient.disconnect(
+                self.update_diet)
+            self.subscribed = False
 
     def set_header_widget(self):
-        """ Make sure each of the edits "knows" this widget """
+        """ Make sure each of the edits "knows" this widget
+
+        The diet name edit proposes the names of diets already there.
+        """
 
         self.dietNameEdit.header_widget = self
+        self.dietNameEdit.suggest_terms(term_index.suggester("diet_name"))
         self.startDateEdit.header_widget = self
         self.endDateEdit.header_widget = self
         self.permanentCheckBox.header_widget = self
 
+    def connect_save_button(self):
+        """ Let the save button of the form save this widget
+
+        The button saves one widget at a time. Disconnecting fails if
+        nothing was connected yet.
+        """
+
+        save_button = mainwindow.centralWidget().saveDataButton
+        try:
+            save_button.clicked.disconnect()
+        except TypeError:
+            pass
+        save_button.clicked.connect(self.update_view)
+
     def update_view(self):
         """ Update the values in a diet view """
 
@@ -100,9 +139,7 @@ class CreateDiet(_DietChanges):
         if diet_view.patient:
             self.diet_view.patient = diet_view.patient
         self.setupUi(self)
-        save_button = mainwindow.centralWidget().saveDataButton
-        save_button.disconnect()
-        save_button.clicked.connect(self.update_view)
+        self.connect_save_button()
         self.set_header_widget()
 
     def update_diet(self):
@@ -122,31 +159,51 @@ class UpdateDiet(_DietChanges):
     permanent, when an end date diet is altered, or a typing error is fixed.
     """
 
-    def __init__(self, diet_view, parent=None, stretch=0):
+    def __init__(self, diet_view, parent=None, stretch=0, subscribe=True):
 
-        super().__init__(parent=parent)
+        super().__init__(parent=parent, subscribe=subscribe)
         self.setupUi(self)
-        # Fill the diet header
+        self.show_diet(diet_view)
+        self.sizePolicy = QSizePolicy()
+        self.sizePolicy.setVerticalPolicy(QSizePolicy.Policy.Fixed)
+        self.sizePolicy.setHorizontalPolicy(QSizePolicy.Policy.Expanding)
+        self.changeLinesButton.clicked.connect(self.show_lines_dialog)
+        self.set_header_widget()
+
+    def show_diet(self, diet_view):
+        """ Fill the diet header from diet_view, the save button saves it """
+
         self.dietNameEdit.setText(diet_view.diet_name)
         self.permanentCheckBox.setChecked(diet_view.permanent_diet)
-        self.startDateEdit.setDate(diet_view.start_date)
+        if diet_view.start_date:
+            self.startDateEdit.setDate(diet_view.start_date)
         if diet_view.end_date:
             self.endDateEdit.setDate(diet_view.end_date)
         else:
             self.endDateEdit.setDate(date(9999, 12, 31))
         self.diet_view = diet_view
-        self.sizePolicy = QSizePolicy()
-        self.sizePolicy.setVerticalPolicy(QSizePolicy.Policy.Fixed)
-        self.sizePolicy.setHorizontalPolicy(QSizePolicy.Policy.Expanding)
-        save_button = mainwindow.centralWidget().saveDataButton
-        save_button.disconnect()
-        save_button.clicked.connect(self.update_view)
-        self.changeLinesButton.clicked.connect(self.show_lines_dialog)
-        self.set_header_widget()
+        self.connect_save_button()
+
+    def release(self):
+        """ Keep the changes in the view, the widget can show another diet
+
+        A released widget shows no diet, so the save button no longer
+        saves it. Focus leaving its fields changes nothing.
+        """
+
+        self.update_view()
+        self.diet_view = None
+        try:
+            mainwindow.centralWidget().saveDataButton.clicked.disconnect(
+                self.update_view)
+        except TypeError:
+            pass
 
     def update_diet(self):
         """ The data in the view is released into the diet """
 
+        if self.diet_view is None:
+            return
         self.update_view()
         self.diet_view.update_diet()
 
@@ -154,6 +211,8 @@ class UpdateDiet(_DietChanges):
         """ Update the view with changes from the window """
 
         view = self.diet_view
+        if view is None:
+            return
         if view.diet_name != self.dietNameEdit.text():
             view.diet_name = self.dietNameEdit.text()
         if view.permanent_diet != self.permanentCheckBox.isChecked():
@@ -175,129 +234,363 @@ class UpdateDiet(_DietChanges):
         self.lines_dialog = UpdateDietLines(self.diet_view, parent=self)
 
 
+class DietLinesModel(QAbstractTableModel):
+    """ The lines of a diet view as a table
+
+    The rows are the line views of the diet view, the columns their
+    fields. Editing a cell changes the field of the line view.
+    """
+
+    fields = ("food_name", "application_type", "description")
+    headers = ("Voeding", "Gebruikregel", "Beschrijving")
+    placeholders = ("< Vul de voeding >", "< Geef de regel >", "")
+
+    def __init__(self, diet_view, parent=None):
+
+        super().__init__(parent)
+        self.diet_view = diet_view
+        if not hasattr(diet_view, "lines_views"):
+            diet_view.lines_views = []
+
+    def rowCount(self, parent=QModelIndex()):
+
+        return 0 if parent.isValid() else len(self.diet_view.lines_views)
+
+    def columnCount(self, parent=QModelIndex()):
+
+        return 0 if parent.isValid() else len(self.fields)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+
+        if not index.isValid():
+            return None
+        value = getattr(self.diet_view.lines_views[index.row()],
+                        self.fields[index.column()]) or ""
+        if role == Qt.ItemDataRole.DisplayRole:
+            return value or self.placeholders[index.column()]
+        if role == Qt.ItemDataRole.EditRole:
+            return value
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        """ Set the field of the line view, if it changed """
+
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        line_view = self.diet_view.lines_views[index.row()]
+        field = self.fields[index.column()]
+        if (getattr(line_view, field) or "") != value:
+            setattr(line_view, field, value)
+            self.dataChanged.emit(index, index)
+        return True
+
+    def flags(self, index):
+
+        return super().flags(index) | Qt.ItemFlag.ItemIsEditable
+
+    def headerData(self, section, orientation,
+                   role=Qt.ItemDataRole.DisplayRole):
+
+        if (orientation == Qt.Orientation.Horizontal
+                and role == Qt.ItemDataRole.DisplayRole):
+            return self.headers[section]
+        return None
+
+    def add_line(self):
+        """ Add a line view at the end, return its first index
+
+        The line has no food name yet and the default application type.
+        """
+
+        row = len(self.diet_view.lines_views)
+        self.beginInsertRows(QModelIndex(), row, row)
+        DietLineView(self.diet_view)
+        self.endInsertRows()
+        return self.index(row, 0)
+
+
+class DietLineDelegate(QStyledItemDelegate):
+    """ Edit the food name and application type, proposing known terms """
+
+    def createEditor(self, parent, option, index):
+
+        field = DietLinesModel.fields[index.column()]
+        if field == "description":
+            return super().createEditor(parent, option, index)
+        editor = QLineEdit(parent)
+        editor.term_completer = TermCompleter(editor,
+                                              term_index.suggester(field))
+        return editor
+
+
 class UpdateDietLines(QDialog, Ui_dietLineDialog):
     """ Create and update lines for one diet.
 
     Both new and existing diets can have diet lines added and changed. We
     do not support deletion.
+
+    The table shows the lines model of the diet view, the fields below it
+    are mapped to the selected line. Changes in the table or the fields go
+    to the line view directly.
     """
 
     def __init__(self, diet_view, parent=None):
 
         super().__init__(parent=parent)
         self.setupUi(self)
-        self.dietLineTable.setHorizontalHeaderLabels(["Voeding",
-                                                      "Gebruikregel"])
-        # self.dietLineTable.itemSelectionChanged.connect(self.changed_line_selection)
-        self.dietLineTable.FoodNameEdit = self.FoodNameEdit
-        self.FoodNameEdit.editingFinished.connect(
-            self.on_editing_finished_food_name)
-        self.dietLineTable.ApplicationTypeEdit = self.ApplicationTypeEdit
-        self.ApplicationTypeEdit.editingFinished.connect(
-            self.on_editing_finished_application_type)
-        self.dietLineTable.DescriptionEdit = self.DescriptionEdit
-        self.DescriptionEdit.line_widget = self
-        self.newLineButton.clicked.connect(self.insert_new_line)
         self.diet_view = diet_view
         self.setWindowTitle(diet_view.diet_name + self.windowTitle())
-        self.line_widgets = []
-        self.dietLineTable.lines_views = diet_view.lines_views
-        for line in diet_view.lines_views:
-            self.dietLineTable.insertRow(self.dietLineTable.rowCount())
-            lineno = self.dietLineTable.rowCount() - 1
-            food_name_item = QTableWidgetItem(line.food_name)
-            self.dietLineTable.setItem(lineno, 0,
-                                       food_name_item)
-            application_item = QTableWidgetItem(line.application_type)
-            self.dietLineTable.setItem(lineno, 1, application_item)
-            self.line_widgets.append((food_name_item, application_item))
-        self.FoodNameEdit.setReadOnly(True)
-        self.ApplicationTypeEdit.setReadOnly(True)
-        self.DescriptionEdit.setReadOnly(True)
+        self.lines_model = DietLinesModel(diet_view, parent=self)
+        self.line_delegate = DietLineDelegate(self)
+        self.dietLineTable.setModel(self.lines_model)
+        self.dietLineTable.setItemDelegate(self.line_delegate)
+        self.dietLineTable.setColumnHidden(2, True)
+        self.line_mapper = QDataWidgetMapper(self)
+        self.line_mapper.setModel(self.lines_model)
+        self.line_mapper.setItemDelegate(self.line_delegate)
+        self.line_mapper.setSubmitPolicy(
+            QDataWidgetMapper.SubmitPolicy.ManualSubmit)
+        self.line_mapper.addMapping(self.FoodNameEdit, 0)
+        self.line_mapper.addMapping(self.ApplicationTypeEdit, 1)
+        self.line_mapper.addMapping(self.DescriptionEdit, 2, b"plainText")
+        self.line_view = None
+        self.FoodNameEdit.editingFinished.connect(self.submit_line)
+        self.food_name_completer = TermCompleter(
+            self.FoodNameEdit, term_index.suggester("food_name"))
+        self.ApplicationTypeEdit.editingFinished.connect(self.submit_line)
+        self.application_type_completer = TermCompleter(
+            self.ApplicationTypeEdit,
+            term_index.suggester("application_type"))
+        self.DescriptionEdit.line_widget = self
+        self.newLineButton.clicked.connect(self.insert_new_line)
+        self.dietLineTable.selectionModel().selectionChanged.connect(
+            self.select_line)
+        self.set_line_editable(False)
         self.show()
 
+    def set_line_editable(self, editable):
+        """ Let the fields of the line be edited, or not """
+
+        self.FoodNameEdit.setReadOnly(not editable)
+        self.ApplicationTypeEdit.setReadOnly(not editable)
+        self.DescriptionEdit.setReadOnly(not editable)
+
+    def select_line(self, selected=None, deselected=None):
+        """ Save the fields to the line left and show the line selected
+
+        Without a line selected the fields are emptied.
+        """
+
+        self.submit_line()
+        rows = self.dietLineTable.selectionModel().selectedRows()
+        if rows:
+            self.line_view = self.diet_view.lines_views[rows[0].row()]
+            self.line_mapper.setCurrentModelIndex(rows[0])
+            self.set_line_editable(True)
+        else:
+            self.line_view = None
+            self.FoodNameEdit.setText("")
+            self.ApplicationTypeEdit.setText("")
+            self.DescriptionEdit.setPlainText("")
+            self.set_line_editable(False)
+
+    def submit_line(self):
+        """ Pass the fields to the line view shown in them """
+
+        if self.line_view is not None:
+            self.line_mapper.submit()
+
     def insert_new_line(self, initial_values=None):
-        """ Insert a new line in the collection.
+        """ Insert a new line in the collection and select it
 
-        All values in the edit fields are set to empty, but in the table the
-        values are set to placeholders. Editing replaces the placeholders
-        with actual values.
+        The fields of the new line are empty, in the table it shows
+        placeholders. Editing replaces the placeholders with actual values.
         """
 
-        self.dietLineTable.insertRow(self.dietLineTable.rowCount())
-        current_row = self.dietLineTable.rowCount() - 1
-        food_name_item = QTableWidgetItem("< Vul de voeding >")
-        application_type_item = QTableWidgetItem("< Geef de regel >")
-        self.dietLineTable.setItem(current_row, 0,
-                                   food_name_item)
-        self.dietLineTable.setItem(current_row, 1,
-                                   application_type_item)
-        if self.dietLineTable.selectedRanges():
-            self.dietLineTable.setRangeSelected(
-                self.dietLineTable.selectedRanges()[0],
-                False)
-        new_line_range = QTableWidgetSelectionRange(current_row, 0,
-                                                    current_row, 1)
-        self.dietLineTable.setRangeSelected(new_line_range, True)
-        self.line_view = DietLineView(self.diet_view)
-        self.ApplicationTypeEdit.setText("")
-        self.DescriptionEdit.setPlainText("")
-        self.FoodNameEdit.setText("")
+        index = self.lines_model.add_line()
+        self.dietLineTable.selectRow(index.row())
 
     def save_description_to_view(self):
         """ Save the inputted text in description to view """
 
-        if self.DescriptionEdit.toPlainText() != self.line_view.description:
-            self.line_view.description = self.DescriptionEdit.toPlainText()
+        self.submit_line()
 
-    def on_editing_finished_application_type(self):
-        """ This is the handler for the focus out of ApplicationTypeEdit
 
-        It synchronizes the view to the latest input in the text line.
-        """
+class DietListMaintainer(TabProvider):
+    """ Maintain a diet list for the current patient
 
-        range_selected = self.dietLineTable.selectedRanges()[0]
-        if not range_selected:
-            return
-        row = range_selected.topRow()
-        if self.diet_view.lines_views[row].application_type !=\
-                self.ApplicationTypeEdit.text():
-            self.diet_view.lines_views[row].application_type =\
-                self.ApplicationTypeEdit.text()
-        self.dietLineTable.selectedItems()[1].setText(
-            self.ApplicationTypeEdit.text())
-
-    def on_editing_finished_food_name(self):
-        """ This is the handler for the focus out of FoodNameEdit
-
-        It synchronizes the view to the latest input in the text line.
-        """
+    The maintainer provides the diet tab. The diets of a patient are
+    loaded when the tab is shown for that patient.
+    """
 
-        range_selected = self.dietLineTable.selectedRanges()[0]
-        if not range_selected:
-            return
-        row = range_selected.topRow()
-        if (self.diet_view.lines_views[row].food_name !=
-                self.FoodNameEdit.text()):
-            self.diet_view.lines_views[row].food_name =\
-                self.FoodNameEdit.text()
-        self.dietLineTable.selectedItems()[0].setText(
-            self.FoodNameEdit.text())
+    def __init__(self):
 
+        self.diet_list = None
 
-class DietListMaintainer():
-    """ Maintain a diet list for the current patient """
+    def load(self, patient_view):
+        """ Load the diets of the patient and show them in the list """
 
-    def __init__(self):
+        if patient_view.patient is not None:
+            Patient.load_chart(patient_view.patient, "diets")
+        self.change_patient_view(patient_view)
+
+    def release(self):
+        """ Save the changes of the patient and detach the list """
 
-        new_current_patient_emitter.newCurrentPatient.connect(
-            self.change_patient_view)
+        if self.diet_list is not None:
+            self.diet_list.detach()
 
     def change_patient_view(self, new_patient_view):
-        """ Create the view list for the new patient """
+        """ Move the diet list to the new patient
 
-        diet_list = DietListWidget(new_patient_view)
-        new_patient_view.diet_list = diet_list
+        The list is made for the first patient, after that it is detached
+        from the previous patient and attached to the new one.
+        """
+
+        if self.diet_list is None:
+            self.diet_list = DietListWidget(new_patient_view)
+        else:
+            self.diet_list.detach()
+            self.diet_list.attach(new_patient_view)
+        new_patient_view.diet_list = self.diet_list
+
+
+class DietRows(QWidget):
+    """ The place of the diet headers in the diet tab
+
+    This widget takes the height of all diet headers, but only the headers
+    in view are shown. They are shown in UpdateDiet widgets placed over
+    this widget. A widget for a header scrolled out of view is kept, to
+    show a header that scrolls into view. The filter above the list selects
+    the current or the historical diets. The widgets do not follow patient
+    changes themselves, the diet list saves their changes.
+    """
+
+    row_height = 310
+    filters = ("Huidige diëten", "Oude diëten", "Alle diëten")
+
+    def __init__(self, form):
+
+        super().__init__(parent=form.scrollAreaWidgetContents)
+        self.scroll_area = form.scrollArea
+        self.contents = form.scrollAreaWidgetContents
+        self.all_views = []
+        self.diet_views = []
+        self.pool = []
+        self.free = []
+        self.shown = {}
+        self.filter_box = QComboBox(parent=self.contents)
+        self.filter_box.addItems(self.filters)
+        self.filter_box.currentIndexChanged.connect(self.filter_diets)
+        form.verticalLayout_2.insertWidget(1, self.filter_box)
+        form.verticalLayout_2.insertWidget(2, self)
+        form.verticalLayout_2.setSizeConstraint(
+            QLayout.SizeConstraint.SetMinimumSize)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding,
+                           QSizePolicy.Policy.Fixed)
+        self.setFixedHeight(0)
+        self.scroll_area.verticalScrollBar().valueChanged.connect(
+            self.show_rows)
+        self.scroll_area.viewport().installEventFilter(self)
+
+    def set_diets(self, diet_views):
+        """ Show the diets of a patient, through the filter, from the top """
+
+        self.all_views = diet_views
+        self.scroll_area.verticalScrollBar().setValue(0)
+        self.filter_diets()
+
+    def filter_diets(self):
+        """ Select the diets to show with the filter """
+
+        self.release_rows()
+        choice = self.filter_box.currentIndex()
+        self.diet_views = [diet_view for diet_view in self.all_views
+                           if choice == 2
+                           or diet_view.is_historical() == (choice == 1)]
+        self.setFixedHeight(len(self.diet_views) * self.row_height)
+        self.show_rows()
+
+    def visible_rows(self):
+        """ The rows of the diet headers in view """
+
+        top = self.scroll_area.verticalScrollBar().value() - self.y()
+        height = self.scroll_area.viewport().height()
+        first = max(0, top // self.row_height)
+        last = min(len(self.diet_views),
+                   (top + height) // self.row_height + 1)
+        return range(first, max(first, last))
+
+    def show_rows(self):
+        """ Put a widget on each row in view, and only there """
+
+        rows = self.visible_rows()
+        for row in list(self.shown):
+            if row not in rows:
+                self.release_row(row)
+        for row in rows:
+            widget = self.shown.get(row)
+            if widget is None:
+                widget = self.shown[row] = self.take_widget(
+                    self.diet_views[row])
+            widget.setGeometry(self.x(), self.y() + row * self.row_height,
+                               self.width(), self.row_height)
+            widget.show()
+            widget.raise_()
+
+    def take_widget(self, diet_view):
+        """ Return a widget showing diet_view, from the pool if possible """
+
+        if self.free:
+            widget = self.free.pop()
+            widget.show_diet(diet_view)
+            return widget
+        widget = UpdateDiet(diet_view, parent=self.contents,
+                            subscribe=False)
+        widget.destroyed.connect(partial(self.forget_widget, widget))
+        self.pool.append(widget)
+        return widget
+
+    def release_rows(self):
+        """ Return the widgets of all rows to the pool """
+
+        for row in list(self.shown):
+            self.release_row(row)
+
+    def release_row(self, row):
+        """ Take the widget off row and return it to the pool """
+
+        widget = self.shown.pop(row)
+        widget.release()
+        widget.hide()
+        self.free.append(widget)
+
+    def forget_widget(self, widget):
+        """ A widget deleted elsewhere is no longer used """
+
+        for widgets in (self.pool, self.free):
+            if widget in widgets:
+                widgets.remove(widget)
+        for row, shown in list(self.shown.items()):
+            if shown is widget:
+                del self.shown[row]
+
+    def eventFilter(self, watched, event):
+        """ Show other rows when the view changes size """
+
+        if event.type() == QEvent.Type.Resize:
+            self.show_rows()
+        return False
+
+    def moveEvent(self, event):
+
+        super().moveEvent(event)
+        self.show_rows()
+
+    def resizeEvent(self, event):
+
+        super().resizeEvent(event)
+        self.show_rows()
 
 
 class DietListWidget():
@@ -306,27 +599,79 @@ class DietListWidget():
     The widget is at the patient level, it will show all diets a patient
     follows. The details (like what it means for different types of food)
     are not shown, you can switch to a details screen to be shown those.
+    The headers are shown by the diet rows of the tab, which are made once
+    and reused for each patient.
+
+    The list is attached to one patient at a time. Detaching saves the
+    changes and disconnects the list, so it can be attached to the next
+    patient without leaving widgets or connections behind.
     """
 
     def __init__(self, patient_view):
 
         super().__init__()
-        diet_tab = mainwindow.centralWidget()
+        self.form = mainwindow.centralWidget()
+        if self.form.diet_tab is None:
+            self.form.diet_tab = DietRows(self.form)
+        self.diet_rows = self.form.diet_tab
+        self.patient_view = None
+        self.created = []
+        self.attached = False
+        self.attach(patient_view)
+
+    def attach(self, patient_view):
+        """ Show the diets of patient_view and connect the diet actions """
+
+        self.patient_view = patient_view
+        diet_views = []
         if patient_view.patient:
-            for diet in patient_view.patient.diets:
-                diet_view = DietView.create_from_diet(diet)
-                update_diet = UpdateDiet(diet_view)
-                contents = mainwindow.centralWidget().scrollAreaWidgetContents
-                for child in contents.children():
-                    if child.objectName() == "noDietLabel":
-                        child.hide()
-                    if child.objectName() == "addDietButton":
-                        child.hide()
-                diet_tab.verticalLayout_2.addWidget(update_diet)
-        diet_tab.newItemButton_2.clicked.connect(self.add_diet)
-        # new_current_patient_emitter.newCurrentPatient.connect(
-        #     self.change_patient_view)
-        mainwindow.actionNieuw_Dieet.triggered.connect(self.add_diet)
+            diet_views = [DietView.create_from_diet(diet)
+                          for diet in patient_view.patient.diets]
+        self.show_no_diet(not diet_views)
+        self.diet_rows.set_diets(diet_views)
+        if not self.attached:
+            self.form.newItemButton_2.clicked.connect(self.add_diet)
+            mainwindow.actionNieuw_Dieet.triggered.connect(self.add_diet)
+            self.attached = True
+
+    def detach(self):
+        """ Save the changes for the patient and disconnect the list
+
+        New diets with a name are saved and their widgets removed. The
+        widgets of the diet rows stay for the next patient.
+        """
+
+        if not self.attached:
+            return
+        self.diet_rows.release_rows()
+        for diet_view in self.diet_rows.all_views:
+            diet_view.update_diet()
+        for create_diet in self.created:
+            if (create_diet.diet_view.patient
+                    and create_diet.dietNameEdit.text()):
+                create_diet.update_diet()
+            create_diet.unsubscribe()
+            self.form.verticalLayout_2.removeWidget(create_diet)
+            create_diet.hide()
+            create_diet.deleteLater()
+        self.created = []
+        self.form.newItemButton_2.clicked.disconnect(self.add_diet)
+        mainwindow.actionNieuw_Dieet.triggered.disconnect(self.add_diet)
+        self.attached = False
+
+    def reset(self):
+        """ Detach and show the tab without a patient """
+
+        self.detach()
+        self.patient_view = None
+        self.diet_rows.set_diets([])
+        self.show_no_diet(True)
+
+    def show_no_diet(self, no_diet):
+        """ Show the no diet message and button, or hide them """
+
+        self.form.noDietLabel.setVisible(no_diet)
+        self.form.addDietButton.setVisible(no_diet)
 
     def add_diet(self, diet_view=None):
         """ Create a new diet for the list """
@@ -334,31 +679,33 @@ class DietListWidget():
         if diet_view:
             self.diet_view = diet_view
         else:
-            self.diet_view = DietView()
+            self.diet_view = DietView(patient=self.patient_view)
         create_diet = CreateDiet(self.diet_view)
-        contents = mainwindow.centralWidget().scrollAreaWidgetContents
-        for child in contents.children():
-            if child.objectName() == "noDietLabel":
-                child.hide()
-            if child.objectName() == "addDietButton":
-                child.hide()
-        diet_tab = mainwindow.centralWidget()
-        diet_tab.verticalLayout_2.addWidget(create_diet)
+        self.created.append(create_diet)
+        self.show_no_diet(False)
+        self.form.verticalLayout_2.addWidget(create_diet)
         create_diet.show()
 
     def get_diet(self, diet_name):
-        """ Return the diet with name diet_name """
+        """ Return the diet with name diet_name
+
+        New diets come first, then the diets in the list, the last first.
+        """
 
         contents = mainwindow.centralWidget().scrollAreaWidgetContents
         for child in reversed([child for child in contents.children()
-                              if (isinstance(child, CreateDiet)
-                              or isinstance(child, UpdateDiet))]):
+                              if isinstance(child, CreateDiet)]):
             if child.diet_view.diet_name == diet_name:
                 return child.diet_view
+        for diet_view in reversed(self.diet_rows.all_views):
+            if diet_view.diet_name == diet_name:
+                return diet_view
         raise NoSuchDietError(f"The diet {diet_name} not found")
 
 
 diet_list_maint = DietListMaintainer()
+mainwindow.centralWidget().patient_tabs.register(
+    mainwindow.centralWidget().dieetTab, diet_list_maint)
 
 
 if __name__ == "__main__":
@@ -28,6 +28,7 @@ from PyQt6.QtCore import QDate
 from PyQt6.QtCore import (QLocale as Loc, pyqtSignal, QObject)
 from PyQt6.QtWidgets import (QDialog, QTableWidgetItem)
 from carereport import (session)
+from carereport.models.patient import Patient
 from .care_app import (app, mainwindow)
 from .patientdialog import Ui_inputPatient
 from .patientsearch import Ui_PatientSearchDialog
@@ -271,6 +272,9 @@ class FindCreatePatient(QDialog, Ui_PatientSearchDialog):
             if self.patientTable.item(row, 0).isSelected():
                 for patient_view in self.patient_views:
                     if patient_view.id == self.patientTable.item(row, 0).id:
+                        if patient_view.patient is not None:
+                            patient_view = PatientView.from_patient(
+                                Patient.from_primary(patient_view.patient))
                         mainwindow.set_new_current_patient(patient_view)
                         break
                 break
@@ -389,7 +393,8 @@ class FindCreateChangePatient(object):
             session.add(app.current_patient_view.patient)
         intake = self.modify_patient.current_intake.create_intake_from_view()
         session.add(intake)
-        session.commit()
+        if not mainwindow.save_changes():
+            return
         mainwindow.find_or_create_patient = None
 
 
@@ -0,0 +1,265 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+""" This module starts the parts of the application side by side.
+
+Connecting to the database, the first queries and loading the terms for
+the suggestions take time. They are done in stages on worker threads,
+while the main window is built and shown on the GUI thread behind a splash
+screen. A stage starts as soon as the stages it needs are ready and
+reports when it is ready itself. The actions in the main window that need
+the database are enabled when the stages they need are ready, the rest of
+the window can already be used.
+
+The work of a stage does not change what the GUI thread uses. What it
+makes, like the tries of the term index, is returned and installed on the
+GUI thread when the stage is ready.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Optional
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+from PyQt6.QtGui import QColor, QPixmap
+from PyQt6.QtWidgets import QSplashScreen
+from sqlalchemy import select
+from sqlalchemy.orm import configure_mappers
+import carereport
+from carereport.models.patient import Patient
+from carereport.models.medical import (DietHeader, Medication,
+                                       ExaminationRequest)
+from carereport.models.suggestions import term_index
+
+
+@dataclass
+class Stage():
+    """ A part of the start-up
+
+        :name: The name other stages refer to it by
+        :work: The function doing the work, run on a worker thread
+        :needs: The names of the stages that must be ready first
+        :message: The text on the splash screen while it runs
+        :install: Function called on the GUI thread with what the work
+                      returned, before the stage is ready
+
+    """
+
+    name: str
+    work: Callable
+    needs: tuple = ()
+    message: str = ""
+    install: Optional[Callable] = None
+
+
+class Startup(QObject):
+    """ Run the stages of the start-up, each when its needs are ready
+
+    The work of a stage runs on a worker thread, the signals are emitted
+    on the GUI thread. The end of the work is always queued, also when it
+    ends before the next stage is started.
+    """
+
+    stageStarted = pyqtSignal(str)
+    stageReady = pyqtSignal(str)
+    stageFailed = pyqtSignal(str, str)
+    done = pyqtSignal()
+    workDone = pyqtSignal(str, object, object)
+
+    def __init__(self, stages, workers=4):
+
+        super().__init__()
+        self.stages = {stage.name: stage for stage in stages}
+        self.workers = workers
+        self.executor = None
+        self.started = set()
+        self.ready = set()
+        self.failed = {}
+        self.waiting = []
+        self.workDone.connect(self.on_work_done,
+                              Qt.ConnectionType.QueuedConnection)
+
+    def start(self):
+        """ Start the stages that need nothing """
+
+        self.executor = ThreadPoolExecutor(max_workers=self.workers,
+                                           thread_name_prefix="startup")
+        self.start_stages()
+
+    def start_stages(self):
+        """ Start the stages of which all needs are ready """
+
+        for stage in self.stages.values():
+            if (stage.name not in self.started
+                    and all(need in self.ready for need in stage.needs)):
+                self.started.add(stage.name)
+                self.stageStarted.emit(stage.name)
+                future = self.executor.submit(stage.work)
+                future.add_done_callback(partial(self.work_finished,
+                                                 stage.name))
+
+    def work_finished(self, name, future):
+        """ Pass the end of the work and its result to the GUI thread """
+
+        error = future.exception()
+        self.workDone.emit(name, None if error else future.result(), error)
+
+    def on_work_done(self, name, result, error):
+        """ Mark a stage ready or failed and start what now can start
+
+        The result of the work is installed first, if the stage does so.
+        """
+
+        install = self.stages[name].install
+        if error is None and install is not None:
+            try:
+                install(result)
+            except Exception as install_error:
+                error = install_error
+        if error is None:
+            self.ready.add(name)
+            self.stageReady.emit(name)
+            self.start_stages()
+            for waiting in list(self.waiting):
+                needs, ready_function = waiting
+                if self.is_ready(needs):
+                    self.waiting.remove(waiting)
+                    ready_function()
+        else:
+            self.failed[name] = str(error)
+            self.stageFailed.emit(name, str(error))
+        if self.is_done():
+            self.executor.shutdown(wait=False)
+            self.done.emit()
+
+    def is_ready(self, needs):
+        """ Are all stages in needs ready? """
+
+        return all(need in self.ready for need in needs)
+
+    def is_blocked(self, needs):
+        """ Has a stage in needs, or a stage they need, failed? """
+
+        return any(need in self.failed
+                   or self.is_blocked(self.stages[need].needs)
+                   for need in needs)
+
+    def is_done(self):
+        """ Is no stage running anymore? """
+
+        return len(self.started) == len(self.ready) + len(self.failed)
+
+    def when_ready(self, needs, ready_function):
+        """ Call ready_function once all stages in needs are ready """
+
+        if self.is_ready(needs):
+            ready_function()
+        else:
+            self.waiting.append((needs, ready_function))
+
+
+def connect_database():
+    """ Open a first connection to the database and its replicas """
+
+    for engine in (carereport.engine, *carereport.replicas):
+        engine.connect().close()
+
+
+def warm_up():
+    """ Configure the mappers and do the first queries
+
+    The compiled queries are kept by the engine, so the first search of
+    the user does not need to compile them.
+    """
+
+    configure_mappers()
+    with carereport.Session() as warm_up_session:
+        for model in (Patient, DietHeader, Medication, ExaminationRequest):
+            warm_up_session.execute(select(model).limit(1)).all()
+
+
+def load_terms():
+    """ Build the tries for the suggestions of the fields not loaded yet
+
+    The tries are returned, to be installed in the term index on the GUI
+    thread. The uses counted for a field are committed with its trie.
+    """
+
+    tries = {}
+    with carereport.Session() as load_session:
+        for field in term_index.fields:
+            if field not in term_index.tries:
+                tries[field], _ = term_index.build(field, load_session)
+                load_session.commit()
+    return tries
+
+
+def care_stages():
+    """ The stages of starting the application """
+
+    return [Stage("database", connect_database,
+                  message="Verbinding maken met de database"),
+            Stage("warmup", warm_up, ("database",),
+                  message="Gegevens voorbereiden"),
+            Stage("terms", load_terms, ("database",),
+                  message="Termen voor suggesties laden",
+                  install=term_index.install)]
+
+
+window_needs = ("database", "warmup")
+
+
+class StartupSplash(QSplashScreen):
+    """ A splash screen showing the stage of the start-up
+
+    It closes when the stages the main window needs are ready, or when
+    one of them failed, the failure is then shown in the main window.
+    """
+
+    def __init__(self, startup, window, needs=window_needs):
+
+        pixmap = QPixmap(400, 150)
+        pixmap.fill(QColor("white"))
+        super().__init__(pixmap)
+        self.startup = startup
+        self.main_window = window
+        self.needs = needs
+        startup.stageStarted.connect(self.show_stage)
+        startup.stageFailed.connect(self.show_failure)
+        startup.when_ready(needs, self.close_splash)
+
+    def show_stage(self, name):
+        """ Show the message for the stage started """
+
+        self.showMessage(self.startup.stages[name].message,
+                         Qt.AlignmentFlag.AlignBottom
+                         | Qt.AlignmentFlag.AlignHCenter)
+
+    def show_failure(self, name, error):
+        """ Show why the stage failed """
+
+        self.showMessage(f"{self.startup.stages[name].message} mislukt:"
+                         f" {error}",
+                         Qt.AlignmentFlag.AlignBottom
+                         | Qt.AlignmentFlag.AlignHCenter)
+        if self.startup.is_blocked(self.needs):
+            self.close_splash()
+
+    def close_splash(self):
+        """ The window can be used, remove the splash screen """
+
+        self.finish(self.main_window)
@@ -1,6 +1,7 @@
 from datetime import date
-from PyQt6.QtWidgets import (QPlainTextEdit, QTableWidget,
-                             QDateEdit, QLineEdit, QCheckBox)
+from PyQt6.QtCore import Qt, QStringListModel
+from PyQt6.QtWidgets import (QPlainTextEdit, QDateEdit, QLineEdit,
+                             QCheckBox, QCompleter)
 """ This module holds widget extensions used to make small
 additions to widgets, creating classes that can be used in the designer
 promoting certain widgets.
@@ -18,45 +19,6 @@ class DescriptionWidget(QPlainTextEdit):
         super().focusOutEvent(event)
 
 
-class DietTableWidget(QTableWidget):
-    """ This widget expands the working of the table widget
-
-    The values in the input fields for the deselected row  are saved and the
-    values of the newly selected row are put in the input fields.
-    """
-
-    def selectionChanged(self, selected, deselected):
-        """ Take actions to be added to changing selection """
-
-        if deselected:
-            row = deselected.first().top()
-            if self.item(row, 0):
-                self.item(row, 0).setText(self.FoodNameEdit.text())
-                self.FoodNameEdit.setText("")
-            if self.item(row, 1):
-                self.item(row, 1).setText(self.ApplicationTypeEdit.text())
-                self.ApplicationTypeEdit.setText("")
-            if self.item(row, 0):
-                self.lines_views[row].description =\
-                    self.DescriptionEdit.toPlainText()
-                self.DescriptionEdit.setPlainText("")
-
-        if selected:
-            row = selected.first().top()
-            if self.item(row, 0):
-                self.FoodNameEdit.setText(self.item(row, 0).text())
-            if self.item(row, 1):
-                self.ApplicationTypeEdit.setText(self.item(row, 1).text())
-            if row < len(self.lines_views):
-                self.DescriptionEdit.setPlainText(
-                    self.lines_views[row].description)
-            self.FoodNameEdit.setReadOnly(False)
-            self.ApplicationTypeEdit.setReadOnly(False)
-            self.DescriptionEdit.setReadOnly(False)
-
-        super().selectionChanged(selected, deselected)
-
-
 class PyDateEdit(QDateEdit):
     """ Return a datetime.date from the edit
 
@@ -78,6 +40,33 @@ class PyDateEdit(QDateEdit):
         super().focusOutEvent(event)
 
 
+class TermCompleter(QCompleter):
+    """ Propose terms for a line edit while the user types
+
+    Each time the text is edited, suggest is called with the text and the
+    terms it returns are shown in the popup of the completer.
+    """
+
+    def __init__(self, line_edit, suggest):
+
+        super().__init__(line_edit)
+        self.suggest = suggest
+        self.setModel(QStringListModel(self))
+        self.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.setCompletionMode(
+            QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        line_edit.setCompleter(self)
+        line_edit.textEdited.connect(self.update_terms)
+
+    def update_terms(self, text):
+        """ Show the terms for the text typed """
+
+        terms = self.suggest(text) if text else []
+        self.model().setStringList(terms)
+        if terms:
+            self.complete()
+
+
 class PyLineEdit(QLineEdit):
     """ Instrument a text field for updating """
 
@@ -88,6 +77,11 @@ class PyLineEdit(QLineEdit):
             self.header_widget.update_view()
         super().focusOutEvent(event)
 
+    def suggest_terms(self, suggest):
+        """ Propose the terms suggest returns for the text typed """
+
+        self.term_completer = TermCompleter(self, suggest)
+
 
 class PyCheckBox(QCheckBox):
     """ Instrument a text field for updating """
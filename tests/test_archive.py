@@ -0,0 +1,190 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from datetime import date, timedelta
+from sqlalchemy import select, func
+import carereport as cr
+from carereport import session
+from carereport.models.patient import Patient, Intake, IntakeResult
+from carereport.models.medical import (Medication, ExaminationRequest,
+                                       ExaminationResult, DietHeader,
+                                       DietLines, Diagnose)
+from carereport.models.archive import Archiver, archive_tables, with_archive
+from carereport.models.reports import kitchen_counts
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+
+        long_ago = date.today() - timedelta(days=400)
+        self.patient = Patient(surname="Scanda", initials="K.U.",
+                               birthdate=date(1982, 10, 8), sex="F")
+        self.old_medication = Medication(medication="Asphacron 70mg",
+                                         frequency=2,
+                                         start_date=long_ago,
+                                         end_date=long_ago
+                                         + timedelta(days=10),
+                                         patient=self.patient)
+        self.current_medication = Medication(medication="Visirant 10mg",
+                                             frequency=1,
+                                             start_date=long_ago,
+                                             patient=self.patient)
+        self.old_request = ExaminationRequest(date_request=long_ago,
+                                              examination_kind="Bloodsample",
+                                              examaning_department="Lab",
+                                              requester_name="Dr. Pill",
+                                              date_execution=long_ago,
+                                              patient=self.patient)
+        self.old_result = ExaminationResult(examination_executor="Lab",
+                                            examination_result="Normal",
+                                            request=self.old_request)
+        self.diagnosed_request = ExaminationRequest(
+            date_request=long_ago, examination_kind="X-ray",
+            examaning_department="Radiology", requester_name="Dr. Pill",
+            date_execution=long_ago, patient=self.patient)
+        self.diagnosed_result = ExaminationResult(
+            examination_executor="Radiology", examination_result="Fracture",
+            request=self.diagnosed_request)
+        self.diagnose = Diagnose(description="Broken leg",
+                                 executor="Dr. Pill", patient=self.patient,
+                                 examinations=[self.diagnosed_request])
+        self.old_diet = DietHeader(diet_name="Lean", start_date=long_ago,
+                                   end_date=long_ago + timedelta(days=30),
+                                   patient=self.patient)
+        self.old_line = DietLines(food_name="Cookies",
+                                  application_type="Don't eat",
+                                  diet=self.old_diet)
+        self.diet = DietHeader(diet_name="Vega", permanent_diet=True,
+                               patient=self.patient)
+        self.line = DietLines(food_name="Meat", application_type="Don't eat",
+                              diet=self.diet)
+        session.add_all([self.patient, self.old_medication,
+                         self.current_medication, self.old_request,
+                         self.old_result, self.diagnosed_request,
+                         self.diagnosed_result, self.diagnose,
+                         self.old_diet, self.old_line, self.diet, self.line])
+        session.commit()
+        self.long_ago = long_ago
+
+    def tearDown(self):
+
+        session.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def count_rows(self, table):
+        """ The number of rows in table """
+
+        return session.scalar(select(func.count()).select_from(table))
+
+    def test_closed_records_moved(self):
+        """ Closed records are moved, the rest stays """
+
+        moved = Archiver(age_days=100, chunk_size=1).run()
+        self.assertEqual(moved, {"medication": 1, "examresult": 1,
+                                 "examrequest": 1, "dietline": 1,
+                                 "dietheader": 1},
+                         "Wrong number of records moved")
+        self.assertEqual(session.scalars(select(Medication.medication)).all(),
+                         ["Visirant 10mg"], "Wrong medication kept")
+        self.assertEqual(self.count_rows(archive_tables["examresult"]), 1,
+                         "Result not moved with request")
+        self.assertEqual(session.scalars(select(ExaminationRequest.id)).all(),
+                         [self.diagnosed_request.id],
+                         "Request of diagnose archived")
+
+    def test_young_records_stay(self):
+        """ Records closed less than the age ago stay """
+
+        self.assertEqual(Archiver(age_days=1000).run(), {},
+                         "Young records archived")
+
+    def test_archive_again(self):
+        """ Archiving again moves nothing new """
+
+        Archiver(age_days=100).run()
+        self.assertEqual(Archiver(age_days=100).run(), {},
+                         "Records moved twice")
+        self.assertEqual(self.count_rows(archive_tables["medication"]), 1,
+                         "Archive not kept")
+
+    def test_query_with_archive(self):
+        """ A query can include the archived records """
+
+        patient_id = self.patient.id
+        Archiver(age_days=100).run()
+        session.expunge_all()
+        all_medication = with_archive(Medication)
+        medication = session.scalars(
+            select(all_medication)
+            .where(all_medication.patient_id == patient_id)
+            .order_by(all_medication.id)).all()
+        self.assertEqual([item.medication for item in medication],
+                         ["Asphacron 70mg", "Visirant 10mg"],
+                         "Archived medication not included")
+
+    def test_id_used_again(self):
+        """ A row with the id of an archived row can be archived too """
+
+        reused_id = self.old_medication.id
+        Archiver(age_days=100).run()
+        session.expunge_all()
+        session.add(Medication(id=reused_id, medication="Sandarati 200mg",
+                               start_date=self.long_ago,
+                               end_date=self.long_ago + timedelta(days=5),
+                               patient=self.patient))
+        session.commit()
+        Archiver(age_days=100).run()
+        archive = archive_tables["medication"]
+        self.assertEqual(session.scalars(select(archive.c.medication)
+                                         .where(archive.c.id == reused_id)
+                                         .order_by(archive.c.archive_id))
+                         .all(), ["Asphacron 70mg", "Sandarati 200mg"],
+                         "Row with the same id not archived")
+
+    def test_links_with_archive(self):
+        """ Intake links to archived items resolve with the archive """
+
+        intake = Intake(date_intake=self.long_ago, result="Pijn")
+        session.add(intake)
+        intake.add_result_for("medi0001", self.old_medication.id)
+        self.patient.intakes.append(intake)
+        session.commit()
+        intake_id = intake.id
+        Archiver(age_days=100).run()
+        session.expunge_all()
+        intake = session.get(Intake, intake_id)
+        self.assertEqual(IntakeResult.resolve_links([intake]), {intake: []},
+                         "Archived medication resolved from hot table")
+        linked = IntakeResult.resolve_links([intake], include_archive=True)
+        self.assertEqual([item.medication for item in linked[intake]],
+                         ["Asphacron 70mg"], "Archived medication not linked")
+
+    def test_report_with_archive(self):
+        """ A report on the past can include the archived diets """
+
+        Archiver(age_days=100).run()
+        for_date = self.long_ago + timedelta(days=1)
+        self.assertEqual(kitchen_counts(for_date),
+                         [("Meat", "Don't eat", 1)],
+                         "Archived diet reported")
+        self.assertEqual(kitchen_counts(for_date, include_archive=True),
+                         [("Cookies", "Don't eat", 1),
+                          ("Meat", "Don't eat", 1)],
+                         "Archived diet not reported")
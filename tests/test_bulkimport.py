@@ -0,0 +1,236 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from sqlalchemy import select, func
+import carereport as cr
+from carereport import session
+from carereport.models.patient import Patient
+from carereport.models.medical import Medication, DietHeader, DietLines
+from carereport.models.bulkimport import (BulkImport, ImportKey,
+                                          ImportProgress,
+                                          UnknownRecordTypeError)
+
+duplicates_csv = """key,surname,initials,birthdate,sex
+P1,Scanda,K.U.,1982-10-08,F
+P1,Scandala,K.,1982-10-09,F
+P2,Bandala,W.,1953-01-28,M
+"""
+
+split_diets_csv = """key,patient_key,diet_name,permanent_diet,start_date,end_date,food_name,application_type,description
+D1,P1,Vega,1,,,Meat,Never,No meat
+D2,P2,Drink much,0,2024-08-07,,Water,One liter a day,
+D1,P1,Vega,1,,,Fish,Never,No fish either
+"""
+
+patients_csv = """key,surname,initials,birthdate,sex
+P1,Scanda,K.U.,1982-10-08,F
+P2,Bandala,W.,1953-01-28,M
+P3,,A.,1960-02-02,F
+P4,Toekomst,T.,2999-01-01,M
+P5,Kilbar,S.,1953-02-18,Q
+"""
+
+medication_jsonl = """{"key": "M1", "patient_key": "P1", "medication": "Asphacron 70mg", "frequency": 2}
+{"key": "M2", "patient_key": "P2", "medication": "Sandarati 200mg", "start_date": "2024-03-01", "end_date": "2024-02-01"}
+{"key": "M3", "patient_key": "P9", "medication": "Visirant 10mg"}
+{"key": "M4", "patient_key": "P2", "medication": "Rikketik pil 50mg", "frequency": 4}
+"""
+
+diets_csv = """key,patient_key,diet_name,permanent_diet,start_date,end_date,food_name,application_type,description
+D1,P1,Vega,1,,,Meat,Never,No meat
+D1,P1,Vega,1,,,Fish,Never,No fish either
+D2,P2,Drink much,0,2024-08-07,,Water,One liter a day,
+D3,P2,Lean,0,2024-07-12,,Cookies,,Not now
+"""
+
+
+class TestBulkImport(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.bulk_import = BulkImport("legacy", chunk_size=2)
+
+    def tearDown(self):
+
+        self.directory.cleanup()
+        session.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def transfer_file(self, name, contents):
+        """ Write a transfer file and return its path """
+
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as transfer_file:
+            transfer_file.write(contents)
+        return path
+
+    def test_import_patients(self):
+        """ Valid patients are imported, invalid ones rejected """
+
+        report = self.bulk_import.import_file(
+            "patient", self.transfer_file("patients.csv", patients_csv))
+        self.assertEqual(report.imported, 2, "Wrong number imported")
+        self.assertEqual([reject.key for reject in report.rejects],
+                         ["P3", "P4", "P5"], "Wrong rows rejected")
+        surnames = session.scalars(select(Patient.surname)
+                                   .order_by(Patient.surname)).all()
+        self.assertEqual(surnames, ["Bandala", "Scanda"],
+                         "Patients not in database")
+
+    def test_import_medication_for_patients(self):
+        """ Medication is coupled to the imported patient """
+
+        self.bulk_import.import_file(
+            "patient", self.transfer_file("patients.csv", patients_csv))
+        report = self.bulk_import.import_file(
+            "medication", self.transfer_file("medication.jsonl",
+                                             medication_jsonl))
+        self.assertEqual(report.imported, 2, "Wrong number imported")
+        self.assertEqual([reject.key for reject in report.rejects],
+                         ["M2", "M3"], "Wrong rows rejected")
+        medication = session.scalars(
+            select(Medication).where(Medication.medication ==
+                                     "Asphacron 70mg")).one()
+        self.assertEqual(medication.patient.surname, "Scanda",
+                         "Medication for wrong patient")
+        self.assertEqual(medication.frequency, 2, "Frequency not imported")
+
+    def test_import_diets_with_lines(self):
+        """ Diets are imported with their lines, whole or not at all """
+
+        self.bulk_import.import_file(
+            "patient", self.transfer_file("patients.csv", patients_csv))
+        report = self.bulk_import.import_file(
+            "diet", self.transfer_file("diets.csv", diets_csv))
+        self.assertEqual(report.imported, 2, "Wrong number imported")
+        vega = session.scalars(select(DietHeader).where(
+            DietHeader.diet_name == "Vega")).one()
+        self.assertEqual(len(vega.diet_lines), 2, "Lines not imported")
+        self.assertTrue(vega.permanent_diet, "Diet not permanent")
+        self.assertEqual(session.scalar(select(func.count(DietLines.id))), 3,
+                         "Wrong number of lines")
+
+    def test_import_can_be_resumed(self):
+        """ Importing a file again skips the rows done """
+
+        path = self.transfer_file("patients.csv", patients_csv)
+        self.bulk_import.import_file("patient", path)
+        report = self.bulk_import.import_file("patient", path)
+        self.assertEqual(report.skipped, 5, "Rows done not skipped")
+        self.assertEqual(report.imported, 0, "Rows imported twice")
+        self.assertEqual(session.scalar(select(func.count(ImportKey.id))), 2,
+                         "Keys stored twice")
+
+    def test_key_imported_once(self):
+        """ A key imported in another file is rejected """
+
+        self.bulk_import.import_file(
+            "patient", self.transfer_file("patients.csv", patients_csv))
+        report = self.bulk_import.import_file(
+            "patient", self.transfer_file("again.jsonl",
+                                          '{"key": "P1", "surname": "Scanda",'
+                                          ' "initials": "K.U.",'
+                                          ' "birthdate": "1982-10-08"}\n'))
+        self.assertEqual(len(report.rejects), 1, "Duplicate key imported")
+
+    def test_duplicate_key_in_file(self):
+        """ A key used again in the same file is rejected """
+
+        report = self.bulk_import.import_file(
+            "patient", self.transfer_file("duplicates.csv", duplicates_csv))
+        self.assertEqual([(reject.line, reject.key)
+                          for reject in report.rejects], [(2, "P1")],
+                         "Duplicate key not rejected")
+        self.assertIn("more than once", report.rejects[0].reason,
+                      "Wrong reason")
+        self.assertEqual(session.scalars(select(Patient.surname)
+                                         .order_by(Patient.surname)).all(),
+                         ["Bandala", "Scanda"], "Duplicate imported")
+
+    def test_split_diet_rejected(self):
+        """ A diet of which the rows do not follow each other is rejected """
+
+        bulk_import = BulkImport("legacy", chunk_size=5)
+        bulk_import.import_file(
+            "patient", self.transfer_file("patients.csv", patients_csv))
+        report = bulk_import.import_file(
+            "diet", self.transfer_file("split.csv", split_diets_csv))
+        self.assertEqual(sorted(reject.line for reject in report.rejects),
+                         [1, 3], "Diet rows not rejected")
+        self.assertEqual(session.scalars(select(DietHeader.diet_name)).all(),
+                         ["Drink much"], "Split diet imported")
+
+    def test_insert_without_returning(self):
+        """ Without multi row RETURNING, rows are inserted one by one """
+
+        with mock.patch.object(
+                cr.engine.dialect,
+                "insert_executemany_returning_sort_by_parameter_order",
+                False):
+            self.bulk_import.import_file(
+                "patient", self.transfer_file("patients.csv", patients_csv))
+            self.bulk_import.import_file(
+                "medication", self.transfer_file("medication.jsonl",
+                                                 medication_jsonl))
+        medication = session.scalars(
+            select(Medication).where(Medication.medication ==
+                                     "Rikketik pil 50mg")).one()
+        self.assertEqual(medication.patient.surname, "Bandala",
+                         "Medication for wrong patient")
+
+    def test_refused_chunk_rejected(self):
+        """ A chunk the database refuses is rolled back and rejected """
+
+        session.add(ImportKey(source="legacy", record_type="patient",
+                              source_key="P2", target_id=99))
+        session.commit()
+        with mock.patch.object(self.bulk_import, "known_keys",
+                               return_value={}):
+            report = self.bulk_import.import_file(
+                "patient", self.transfer_file("patients.csv", patients_csv))
+        self.assertEqual(report.imported, 0, "Refused rows counted")
+        self.assertEqual([reject.key for reject in report.rejects[:2]],
+                         ["P1", "P2"], "Refused rows not rejected")
+        self.assertEqual(session.scalar(select(func.count(Patient.id))), 0,
+                         "Refused chunk not rolled back")
+        self.assertEqual(report.rows_read, 5, "Import stopped")
+
+    def test_empty_file_progress_committed(self):
+        """ The progress of a file without rows is not left pending """
+
+        report = self.bulk_import.import_file(
+            "patient", self.transfer_file("empty.csv",
+                                          "key,surname,initials\n"))
+        self.assertEqual(report.rows_read, 0, "Rows read from empty file")
+        self.assertFalse(session.new, "Progress left pending")
+        with cr.Session() as other_session:
+            self.assertEqual(other_session.scalars(
+                select(ImportProgress.file_name)).all(), ["empty.csv"],
+                "Progress not committed")
+
+    def test_unknown_record_type(self):
+        """ Only known record types can be imported """
+
+        with self.assertRaises(UnknownRecordTypeError):
+            self.bulk_import.import_file(
+                "ward", self.transfer_file("wards.csv", "key\nW1\n"))
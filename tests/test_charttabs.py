@@ -0,0 +1,179 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from datetime import date, timedelta
+from sqlalchemy import event
+import carereport as cr
+from carereport import session, Patient
+from carereport.models.medical import Medication, Diagnose, Treatment
+from carereport.views.care_app import mainwindow
+from carereport.views.patient_views import PatientView
+from carereport.views.charttabs import (medication_model, diagnose_model,
+                                        chart_tab_providers)
+
+
+class TestChartTableModel(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patient = Patient(surname="Langdurig", initials="L.",
+                               birthdate=date(1939, 9, 9), sex="F")
+        today = date.today()
+        self.active = [Medication(medication=f"Actief {number}",
+                                  start_date=today - timedelta(days=10),
+                                  patient=self.patient)
+                       for number in range(25)]
+        self.stopped = [Medication(medication=f"Gestopt {number}",
+                                   start_date=today - timedelta(days=20),
+                                   end_date=today - timedelta(days=1),
+                                   patient=self.patient)
+                        for number in range(15)]
+        session.add_all([self.patient, *self.active, *self.stopped])
+        session.commit()
+        session.refresh(self.patient)
+        self.model = medication_model()
+        self.model.page_size = 10
+        self.statements = []
+        event.listen(cr.engine, "before_cursor_execute", self.count)
+
+    def tearDown(self):
+
+        event.remove(cr.engine, "before_cursor_execute", self.count)
+        session.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def count(self, conn, cursor, statement, *args):
+        """ Keep the statements executed """
+
+        self.statements.append(statement)
+
+    def names(self):
+        """ The medication shown, top to bottom """
+
+        return [self.model.index(row, 0).data()
+                for row in range(self.model.rowCount())]
+
+    def test_first_page(self):
+        """ Loading reads the first page only """
+
+        self.model.load(self.patient)
+        self.assertEqual(self.names(),
+                         [f"Actief {number}" for number in range(24, 14, -1)],
+                         "Wrong first page")
+        self.assertEqual(len(self.statements), 1, "More than one page read")
+        self.assertTrue(self.model.canFetchMore(), "No more pages")
+
+    def test_fetch_until_end(self):
+        """ Fetching reads the active medication and stops """
+
+        self.model.load(self.patient)
+        while self.model.canFetchMore():
+            self.model.fetchMore()
+        self.assertEqual(self.model.rowCount(), 25, "Not all medication")
+        self.assertNotIn("Gestopt 0", self.names(), "History read")
+
+    def test_history_on_demand(self):
+        """ The history follows the active medication when asked for """
+
+        self.model.load(self.patient)
+        self.model.show_history()
+        while self.model.canFetchMore():
+            self.model.fetchMore()
+        self.assertEqual(self.names()[25:],
+                         [f"Gestopt {number}" for number in range(14, -1, -1)],
+                         "History not after active medication")
+        self.model.show_history(False)
+        self.assertEqual(self.model.rowCount(), 10, "History still shown")
+
+    def test_date_and_clear(self):
+        """ Dates are shown in the locale, clearing shows nothing """
+
+        self.model.load(self.patient)
+        self.assertTrue(self.model.index(0, 2).data(), "No start date shown")
+        self.assertEqual(self.model.index(0, 3).data(), "",
+                         "Empty end date shown")
+        self.model.clear()
+        self.assertEqual(self.model.rowCount(), 0, "Entries after clear")
+        self.assertFalse(self.model.canFetchMore(), "More without patient")
+
+
+class TestChartTabs(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patient = Patient(surname="Wisseling", initials="W.",
+                               birthdate=date(1955, 5, 5), sex="M")
+        self.diagnose = Diagnose(description="Gebroken arm",
+                                 executor="Dulber", patient=self.patient)
+        treatment = Treatment(manager="Dulber", name="Gips",
+                              description="Zes weken in het gips houden",
+                              diagnoses=self.diagnose)
+        medication = Medication(medication="Paracetamol",
+                                start_date=date.today(),
+                                patient=self.patient)
+        session.add_all([self.patient, self.diagnose, treatment, medication])
+        session.commit()
+        self.form = mainwindow.centralWidget()
+        self.tabs = self.form.patientData
+        self.shown = self.tabs.currentIndex()
+
+    def tearDown(self):
+
+        self.tabs.setCurrentIndex(self.shown)
+        self.form.patient_tabs.change_patient(None)
+        session.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def test_tab_loaded_when_shown(self):
+        """ The diagnoses are read when the diagnose tab is shown """
+
+        diagnose_tab = chart_tab_providers[self.form.DiagnoseTab]
+        self.tabs.setCurrentWidget(self.form.MedicationTab)
+        mainwindow.set_new_current_patient(
+            PatientView.from_patient(self.patient))
+        self.assertEqual(diagnose_tab.model.rowCount(), 0,
+                         "Diagnoses read while not shown")
+        self.tabs.setCurrentWidget(self.form.DiagnoseTab)
+        self.assertEqual(diagnose_tab.model.index(0, 2).data(), "1",
+                         "Treatments not counted")
+
+    def test_patient_change_clears(self):
+        """ A tab not shown keeps no entries of the previous patient """
+
+        medication_tab = chart_tab_providers[self.form.MedicationTab]
+        self.tabs.setCurrentWidget(self.form.MedicationTab)
+        mainwindow.set_new_current_patient(
+            PatientView.from_patient(self.patient))
+        self.assertEqual(medication_tab.model.index(0, 0).data(),
+                         "Paracetamol", "Medication not shown")
+        self.tabs.setCurrentWidget(self.form.DiagnoseTab)
+        mainwindow.set_new_current_patient(PatientView.from_patient(
+            Patient(surname="Nieuw", initials="N.",
+                    birthdate=date(1990, 1, 1), sex="F")))
+        self.assertEqual(medication_tab.model.rowCount(), 0,
+                         "Medication of previous patient kept")
+
+    def test_diagnose_model(self):
+        """ The diagnose model shows the diagnose of each row """
+
+        model = diagnose_model()
+        model.load(self.patient)
+        self.assertEqual(model.index(0, 0).data(), "Gebroken arm",
+                         "Diagnose not shown")
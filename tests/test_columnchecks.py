@@ -0,0 +1,168 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from datetime import date
+import carereport as cr
+from carereport import session
+from carereport.models.patient import (Patient, BirthdateMustBeInPastError,
+                                       SexInvalidError, EmptyNameError)
+from carereport.models.medical import (Medication, ExaminationRequest,
+                                       FrequencyMustBeANumber,
+                                       EndDateBeforeStartError,
+                                       ExecutionBeforeRequestError,
+                                       ExecutedCannotBeRefusedError,
+                                       DescriptionIsMandatoryError,
+                                       DescriptionIsTooShortError)
+from carereport.models.columnchecks import (check_birthdates, check_sexes,
+                                            check_frequencies, check_periods,
+                                            check_executions,
+                                            check_descriptions,
+                                            check_columns, scan)
+
+
+class TestColumnChecks(unittest.TestCase):
+
+    def test_birthdates_in_future(self):
+        """ Only the birth dates in the future are marked """
+
+        errors = check_birthdates([date(1982, 10, 8), None,
+                                   date(2999, 1, 1)])
+        self.assertEqual(list(errors.mask), [0, 0, 1], "Wrong mask")
+        self.assertIs(errors.error, BirthdateMustBeInPastError,
+                      "Not the error of the model")
+
+    def test_invalid_sexes(self):
+        """ A sex not valid for a patient is marked """
+
+        errors = check_sexes(["F", "Q", " ", "X"])
+        self.assertEqual(errors.rows(), [1], "Wrong rows marked")
+        self.assertIsInstance(errors.exception(1), SexInvalidError,
+                              "Wrong exception")
+
+    def test_frequencies(self):
+        """ Frequencies must be positive whole numbers """
+
+        errors = check_frequencies([1, 0, "2", 3, -4])
+        self.assertEqual(errors.rows(), [1, 2, 4], "Wrong rows marked")
+        self.assertIs(errors.error, FrequencyMustBeANumber,
+                      "Not the error of the model")
+
+    def test_periods(self):
+        """ An end date must be after the start date """
+
+        errors = check_periods([date(2024, 3, 1), date(2024, 3, 1),
+                                date(2024, 3, 1)],
+                               [date(2024, 2, 1), None, date(2024, 3, 1)])
+        self.assertEqual(errors.rows(), [0, 2], "Wrong rows marked")
+        self.assertIs(errors.error, EndDateBeforeStartError,
+                      "Not the error of the model")
+
+    def test_executions(self):
+        """ Execution cannot be before the request """
+
+        errors = check_executions([date(2024, 5, 2), date(2024, 5, 2)],
+                                  [date(2024, 5, 1), date(2024, 5, 3)])
+        self.assertEqual(errors.rows(), [0], "Wrong rows marked")
+        self.assertIs(errors.error, ExecutionBeforeRequestError,
+                      "Not the error of the model")
+
+    def test_descriptions(self):
+        """ A description must be filled and long enough """
+
+        empty, short = check_descriptions(
+            ["", "Too short", "Long enough to explain the treatment"])
+        self.assertEqual(empty.rows(), [0], "Empty not marked")
+        self.assertEqual(short.rows(), [1], "Short not marked")
+        self.assertIs(empty.error, DescriptionIsMandatoryError,
+                      "Not the error of the model")
+        self.assertIs(short.error, DescriptionIsTooShortError,
+                      "Not the error of the model")
+
+    def test_first_error_per_row(self):
+        """ A row gets the error of the first check that fails """
+
+        failing = check_columns(Patient,
+                                {"surname": ["", "Scanda", "Bandala"],
+                                 "initials": ["A.", "K.U.", "W."],
+                                 "birthdate": [date(2999, 1, 1),
+                                               date(1982, 10, 8),
+                                               date(1953, 1, 28)],
+                                 "sex": ["F", "F", "Q"]})
+        self.assertEqual(sorted(failing), [0, 2], "Wrong rows fail")
+        self.assertIsInstance(failing[0], EmptyNameError,
+                              "Not the first error of the row")
+        self.assertIsInstance(failing[2], SexInvalidError,
+                              "Wrong error for row")
+
+    def test_same_as_model(self):
+        """ The column checks fail where the model fails """
+
+        frequencies = [1, 0, 2, -1]
+        model_fails = []
+        for frequency in frequencies:
+            try:
+                Medication(medication="Asphacron 70mg", frequency=frequency)
+            except FrequencyMustBeANumber:
+                model_fails.append(frequency)
+        errors = check_frequencies(frequencies)
+        self.assertEqual([frequencies[row] for row in errors.rows()],
+                         model_fails, "Column check differs from model")
+
+
+class TestScan(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patient = Patient(surname="Franka", initials="K.G.",
+                               birthdate=date(1982, 5, 17), sex="F")
+        self.request1 = ExaminationRequest(date_request=date(2024, 5, 2),
+                                           examination_kind="Bloodsample",
+                                           examaning_department="Lab",
+                                           requester_name="Dr. Pill",
+                                           patient=self.patient)
+        self.request2 = ExaminationRequest(date_request=date(2024, 5, 2),
+                                           examination_kind="X-ray",
+                                           examaning_department="Radiology",
+                                           requester_name="Dr. Pill",
+                                           patient=self.patient)
+        session.add_all([self.patient, self.request1, self.request2])
+        session.flush()
+
+    def tearDown(self):
+
+        session.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def test_scan_finds_stored_errors(self):
+        """ Rows changed around the model are found by a scan """
+
+        session.execute(ExaminationRequest.__table__.update()
+                        .where(ExaminationRequest.id == self.request2.id)
+                        .values(date_execution=date(2024, 5, 3),
+                                request_refused="Not needed"))
+        found = list(scan(ExaminationRequest, chunk_size=1))
+        self.assertEqual([request_id for request_id, _ in found],
+                         [self.request2.id], "Wrong request found")
+        self.assertIsInstance(found[0][1], ExecutedCannotBeRefusedError,
+                              "Wrong error")
+
+    def test_scan_valid_rows(self):
+        """ Valid rows are not reported """
+
+        self.assertEqual(list(scan(Patient)), [], "Valid patient reported")
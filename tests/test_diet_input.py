@@ -16,15 +16,19 @@
 #    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
 from datetime import date, timedelta
 import unittest
+from unittest import mock
 import pytest
-from PyQt6.QtCore import (Qt)
-from PyQt6.QtWidgets import QTableWidgetSelectionRange
+from PyQt6.QtCore import (Qt, QEvent)
+from PyQt6.QtGui import QFocusEvent
 from carereport import (Patient, DietHeader, DietLines)
 from carereport.views.care_app import (mainwindow, app)
 from carereport.views.patient_views import (PatientView)
 # from carereport.views.dietheader import Ui_DietHeaderWidget
+from carereport import new_current_patient_emitter
 from carereport.views.scripts_diet import (CreateDiet, UpdateDiet,
-                                           UpdateDietLines, DietListWidget)
+                                           UpdateDietLines, DietListWidget,
+                                           DietRows, DietListMaintainer,
+                                           DietLinesModel)
 from carereport.views.diet_views import (DietView, DietLineView)
 
 
@@ -289,8 +293,8 @@ class TestDietLineView(unittest.TestCase):
                             application_type="irregularly",
                             diet_view=self.diet_view)
         self.diet_form = UpdateDietLines(self.diet_view)
-        self.assertEqual(line.food_name,
-                         self.diet_form.dietLineTable.item(0, 0).text(),
+        lines_model = self.diet_form.dietLineTable.model()
+        self.assertEqual(line.food_name, lines_model.index(0, 0).data(),
                          "Food name not correctly filled for line")
 
     def test_more_diet_lines(self):
@@ -307,13 +311,14 @@ class TestDietLineView(unittest.TestCase):
                              diet_view=self.diet_view)
         self.diet_form = UpdateDietLines(self.diet_view)
         self.diet_form.show()
-        self.assertEqual(self.diet_form.dietLineTable.rowCount(), 2,
+        lines_model = self.diet_form.dietLineTable.model()
+        self.assertEqual(lines_model.rowCount(), 2,
                          "Incorrect number of lines:"
-                         + str(self.diet_form.dietLineTable.rowCount()))
-        self.assertEqual(self.diet_form.dietLineTable.item(1, 0).text(),
+                         + str(lines_model.rowCount()))
+        self.assertEqual(lines_model.index(1, 0).data(),
                          line2.food_name,
                          "Text not correct in table")
-        self.assertEqual(self.diet_form.dietLineTable.item(0, 0).text(),
+        self.assertEqual(lines_model.index(0, 0).data(),
                          line1.food_name,
                          "Text not correct in table")
 
@@ -328,27 +333,22 @@ class TestDietLineView(unittest.TestCase):
         """ If you create a line while one is selected, unselect previous """
 
         self.diet_changes = UpdateDietLines(self.diet_view)
-        row_count = self.diet_changes.dietLineTable.rowCount()
+        row_count = self.diet_changes.dietLineTable.model().rowCount()
         self.assertEqual(row_count, 0,
                          f"Row count incorrect: {row_count}")
         self.diet_changes.insert_new_line()
         self.assertEqual(row_count, 0,
                          f"Row count incorrect: {row_count}")
-        current_selections = self.diet_changes.dietLineTable.selectedRanges()
+        selection_model = self.diet_changes.dietLineTable.selectionModel()
+        current_selections = selection_model.selectedRows()
         self.assertEqual(len(current_selections), 1,
                          f"Wrong no of selections: {len(current_selections)}")
-        self.assertEqual(current_selections[0].topRow(),
-                         current_selections[0].bottomRow(),
-                         "More than one row in selection")
-        self.diet_changes.dietLineTable.insertRow(
-            self.diet_changes.dietLineTable.rowCount())
-        current_selections = self.diet_changes.dietLineTable.selectedRanges()
+        self.diet_changes.insert_new_line()
+        current_selections = selection_model.selectedRows()
         self.assertEqual(len(current_selections), 1,
                          f"Wrong no of selections: {len(current_selections)}")
-        first_range = self.diet_changes.dietLineTable.selectedRanges()[0]
-        self.assertEqual(first_range.bottomRow(),
-                         first_range.topRow(),
-                         "More than one row in selection")
+        self.assertEqual(current_selections[0].row(), 1,
+                         "Previous line still selected")
 
 
 class TestDietChangeLines(unittest.TestCase):
@@ -391,10 +391,9 @@ class TestDietChangeLines(unittest.TestCase):
         """ Selecting a line in the table fills the fields with data """
 
         the_dialog = self.update_dialog
-        range_line_2 = QTableWidgetSelectionRange(1, 0, 1, 1)
-        the_dialog.dietLineTable.setRangeSelected(range_line_2, True)
+        the_dialog.dietLineTable.selectRow(1)
         self.assertEqual(the_dialog.FoodNameEdit.text(),
-                         the_dialog.dietLineTable.item(1, 0).text(),
+                         the_dialog.dietLineTable.model().index(1, 0).data(),
                          "Food name not filled correctly")
         self.assertEqual(self.diet_line2.description,
                          the_dialog.DescriptionEdit.toPlainText(),
@@ -404,12 +403,11 @@ class TestDietChangeLines(unittest.TestCase):
         """ Unselecting a line in the table clears the fields """
 
         the_dialog = self.update_dialog
-        range_line_2 = QTableWidgetSelectionRange(0, 0, 0, 1)
-        the_dialog.dietLineTable.setRangeSelected(range_line_2, True)
+        the_dialog.dietLineTable.selectRow(0)
         self.assertEqual(the_dialog.FoodNameEdit.text(),
-                         the_dialog.dietLineTable.item(0, 0).text(),
+                         the_dialog.dietLineTable.model().index(0, 0).data(),
                          "Food name not filled correctly")
-        the_dialog.dietLineTable.setRangeSelected(range_line_2, False)
+        the_dialog.dietLineTable.clearSelection()
         self.assertEqual(the_dialog.FoodNameEdit.text(), "",
                          "Food name not cleared")
         self.assertEqual(the_dialog.DescriptionEdit.toPlainText(), "",
@@ -419,11 +417,10 @@ class TestDietChangeLines(unittest.TestCase):
         """ Updates to field application type are passed to view """
 
         the_dialog = self.update_dialog
-        range_line_2 = QTableWidgetSelectionRange(1, 0, 1, 1)
-        the_dialog.dietLineTable.setRangeSelected(range_line_2, True)
+        the_dialog.dietLineTable.selectRow(1)
         the_dialog.ApplicationTypeEdit.setText("dagelijks 250 gram")
         the_dialog.ApplicationTypeEdit.editingFinished.emit()
-        the_dialog.dietLineTable.setRangeSelected(range_line_2, False)
+        the_dialog.dietLineTable.clearSelection()
         self.assertEqual(self.diet_line2.application_type,
                          "dagelijks 250 gram",
                          "Application type not filled correctly")
@@ -432,11 +429,10 @@ class TestDietChangeLines(unittest.TestCase):
         """ Updates to field food name are passed to view """
 
         the_dialog = self.update_dialog
-        range_line_2 = QTableWidgetSelectionRange(1, 0, 1, 1)
-        the_dialog.dietLineTable.setRangeSelected(range_line_2, True)
+        the_dialog.dietLineTable.selectRow(1)
         the_dialog.FoodNameEdit.setText("Zaden en knollen")
         the_dialog.FoodNameEdit.editingFinished.emit()
-        the_dialog.dietLineTable.setRangeSelected(range_line_2, False)
+        the_dialog.dietLineTable.clearSelection()
         self.assertEqual(self.diet_line2.food_name,
                          "Zaden en knollen",
                          "Food name not filled correctly")
@@ -447,13 +443,12 @@ class TestDietChangeLines(unittest.TestCase):
 
         the_dialog = self.update_dialog
         # print("DescriptionEdit heeft type", type(the_dialog.DescriptionEdit))
-        range_line_2 = QTableWidgetSelectionRange(1, 0, 1, 1)
-        the_dialog.dietLineTable.setRangeSelected(range_line_2, True)
+        the_dialog.dietLineTable.selectRow(1)
         the_dialog.show()
         the_dialog.DescriptionEdit.setFocus()
         the_dialog.DescriptionEdit.setPlainText("Dit is de nieuwe tekst")
         the_dialog.ApplicationTypeEdit.setFocus()
-        the_dialog.dietLineTable.setRangeSelected(range_line_2, False)
+        the_dialog.dietLineTable.clearSelection()
         the_dialog.close()
         self.assertEqual(self.diet_line2.description,
                          "Dit is de nieuwe tekst",
@@ -463,9 +458,9 @@ class TestDietChangeLines(unittest.TestCase):
         """ Inserting a new row makes it appear in the table """
 
         the_dialog = self.update_dialog
-        old_row_count = the_dialog.dietLineTable.rowCount()
+        old_row_count = the_dialog.dietLineTable.model().rowCount()
         the_dialog.insert_new_line()
-        self.assertEqual(the_dialog.dietLineTable.rowCount(),
+        self.assertEqual(the_dialog.dietLineTable.model().rowCount(),
                          old_row_count + 1,
                          "No row added to table")
 
@@ -473,8 +468,7 @@ class TestDietChangeLines(unittest.TestCase):
         """ Inserting a new diet line empties the input fields """
 
         the_dialog = self.update_dialog
-        range_line_2 = QTableWidgetSelectionRange(1, 0, 1, 1)
-        the_dialog.dietLineTable.setRangeSelected(range_line_2, True)
+        the_dialog.dietLineTable.selectRow(1)
         # Make false positives less likely
         self.assertNotEqual(the_dialog.FoodNameEdit.text(),
                             "",
@@ -488,8 +482,9 @@ class TestDietChangeLines(unittest.TestCase):
         """ Each line in the test table must have a different food name """
 
         the_dialog = self.update_dialog
-        self.assertNotEqual(the_dialog.dietLineTable.item(0, 0).text(),
-                            the_dialog.dietLineTable.item(1, 0).text(),
+        lines_model = the_dialog.dietLineTable.model()
+        self.assertNotEqual(lines_model.index(0, 0).data(),
+                            lines_model.index(1, 0).data(),
                             "Row names equal!")
 
     def test_new_line_selected(self):
@@ -497,12 +492,78 @@ class TestDietChangeLines(unittest.TestCase):
 
         the_dialog = self.update_dialog
         the_dialog.insert_new_line()
-        self.assertIn(the_dialog.dietLineTable.item(
-                          the_dialog.dietLineTable.rowCount() - 1, 0),
-                      the_dialog.dietLineTable.selectedItems(),
+        table = the_dialog.dietLineTable
+        self.assertIn(table.model().index(table.model().rowCount() - 1, 0),
+                      table.selectionModel().selectedIndexes(),
                       "Food name edit not selected")
 
 
+class TestDietLinesModel(unittest.TestCase):
+
+    def setUp(self):
+
+        self.diet_view = DietView(diet_name="Zoutarm", permanent_diet=True)
+        self.lines = [DietLineView(food_name=f"Voeding {number}",
+                                   application_type="Niet",
+                                   diet_view=self.diet_view)
+                      for number in range(500)]
+        self.model = DietLinesModel(self.diet_view)
+
+    def test_edit_updates_line_view(self):
+        """ Setting a cell changes the line view, only that cell changes """
+
+        changed = []
+        self.model.dataChanged.connect(
+            lambda first, last: changed.append((first.row(), first.column(),
+                                                last.row(), last.column())))
+        index = self.model.index(321, 1)
+        self.assertTrue(self.model.setData(index, "Weinig"), "Not set")
+        self.assertEqual(self.lines[321].application_type, "Weinig",
+                         "Line view not changed")
+        self.assertEqual(changed, [(321, 1, 321, 1)],
+                         "Other cells reported changed")
+        self.model.setData(index, "Weinig")
+        self.assertEqual(len(changed), 1, "Unchanged value reported")
+
+    def test_new_line_placeholders(self):
+        """ A new line shows placeholders, but edits empty values """
+
+        index = self.model.add_line()
+        self.assertEqual(self.model.rowCount(), 501, "No line added")
+        self.assertIs(self.diet_view.lines_views[-1].diet_view,
+                      self.diet_view, "Line not for the diet")
+        self.assertEqual(index.data(), "< Vul de voeding >",
+                         "No placeholder shown")
+        self.assertEqual(index.data(Qt.ItemDataRole.EditRole), "",
+                         "Placeholder edited")
+
+    def test_new_line_can_be_saved(self):
+        """ A new line has the default application type and can be saved """
+
+        index = self.model.add_line()
+        self.model.setData(index, "Zout")
+        self.assertEqual(index.siblingAtColumn(1).data(), "Daily",
+                         "No default application type")
+        diet_line = self.diet_view.lines_views[-1].to_diet_line(
+            DietHeader(diet_name="Zoutarm", permanent_diet=True))
+        self.assertEqual(diet_line.application_type, "Daily",
+                         "Line not saved with default")
+
+    def test_table_editor_proposes_terms(self):
+        """ The editor of the table proposes terms and sets the line """
+
+        dialog = UpdateDietLines(self.diet_view)
+        index = dialog.lines_model.index(0, 0)
+        editor = dialog.line_delegate.createEditor(
+            dialog.dietLineTable.viewport(), None, index)
+        self.assertIsNotNone(editor.completer(), "No terms proposed")
+        editor.setText("Zout")
+        dialog.line_delegate.setModelData(editor, dialog.lines_model, index)
+        self.assertEqual(self.lines[0].food_name, "Zout",
+                         "Line view not changed")
+        dialog.close()
+
+
 class TestDietHeaderWidgetList(unittest.TestCase):
 
     def setUp(self):
@@ -614,8 +675,7 @@ class TestDietHeaderWidgetList(unittest.TestCase):
                 diet_widgets_from_interface.append(child)
         view0 = diet_widgets_from_interface[0]
         view0.changeLinesButton.click()
-        range_line = QTableWidgetSelectionRange(1, 0, 1, 1)
-        view0.lines_dialog.dietLineTable.setRangeSelected(range_line, True)
+        view0.lines_dialog.dietLineTable.selectRow(1)
         self.assertIn(view0.lines_dialog.DescriptionEdit.toPlainText(),
                       [self.dietline1_1.description,
                        self.dietline1_2.description,
@@ -806,3 +866,228 @@ class TestDietHeaderWidgetList(unittest.TestCase):
                         "Diet not retrieved")
         with self.assertRaises(ValueError):
             diet_list.get_diet("Invalid")
+
+
+class TestDietRows(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patient = Patient(surname="Ouderling",
+                               initials="B.",
+                               birthdate=date(1931, 2, 3),
+                               sex="F")
+        self.diets = [DietHeader(diet_name=f"Dieet {number}",
+                                 permanent_diet=False,
+                                 start_date=date.today()
+                                 - timedelta(days=400 - number),
+                                 end_date=date.today()
+                                 - timedelta(days=300 - number),
+                                 patient=self.patient)
+                      for number in range(40)]
+        self.current = DietHeader(diet_name="Zoutarm",
+                                  permanent_diet=True,
+                                  patient=self.patient)
+        self.patient_view = PatientView.from_patient(self.patient)
+        self.diet_list = DietListWidget(self.patient_view)
+        self.diet_rows = self.diet_list.diet_rows
+        self.diet_rows.filter_box.setCurrentIndex(2)
+        mainwindow.show()
+        app.processEvents()
+
+    def tearDown(self):
+
+        self.diet_rows.filter_box.setCurrentIndex(0)
+        self.diet_rows.set_diets([])
+        mainwindow.hide()
+
+    def shown_names(self):
+        """ The names of the diets shown in a widget, in row order """
+
+        return [self.diet_rows.shown[row].dietNameEdit.text()
+                for row in sorted(self.diet_rows.shown)]
+
+    def test_only_rows_in_view(self):
+        """ Only the diets in view get a widget """
+
+        self.assertEqual(len(self.diet_rows.diet_views), 41,
+                         "Not all diets in list")
+        self.assertLess(len(self.diet_rows.pool), 10,
+                        "Widget made for each diet")
+        self.assertEqual(self.shown_names()[0], "Dieet 0",
+                         "First diet not shown")
+
+    def test_widgets_reused(self):
+        """ Scrolling shows other diets in the same widgets """
+
+        pool = list(self.diet_rows.pool)
+        scroll_bar = self.diet_rows.scroll_area.verticalScrollBar()
+        scroll_bar.setValue(self.diet_rows.y()
+                            + 30 * DietRows.row_height)
+        self.assertEqual(self.shown_names()[0], "Dieet 30",
+                         "Scrolled diet not shown")
+        self.assertEqual(self.diet_rows.pool, pool, "Widgets not reused")
+
+    def test_changes_kept_on_scrolling(self):
+        """ A change in a widget is kept when it scrolls out of view """
+
+        widget = self.diet_rows.shown[0]
+        widget.dietNameEdit.setText("Dieet nul")
+        scroll_bar = self.diet_rows.scroll_area.verticalScrollBar()
+        scroll_bar.setValue(self.diet_rows.y()
+                            + 30 * DietRows.row_height)
+        self.assertEqual(self.diet_rows.diet_views[0].diet_name,
+                         "Dieet nul", "Change lost")
+
+    def test_filter_current_historical(self):
+        """ The filter shows the current or the historical diets """
+
+        self.diet_rows.filter_box.setCurrentIndex(0)
+        self.assertEqual([diet_view.diet_name for diet_view
+                          in self.diet_rows.diet_views], ["Zoutarm"],
+                         "Wrong current diets")
+        self.diet_rows.filter_box.setCurrentIndex(1)
+        self.assertEqual(len(self.diet_rows.diet_views), 40,
+                         "Wrong historical diets")
+        self.assertNotIn("Zoutarm", self.shown_names(),
+                         "Current diet shown as historical")
+
+    def test_save_without_rows(self):
+        """ Saving with no diet shown changes nothing """
+
+        self.current.permanent_diet = False
+        self.current.start_date = date.today() - timedelta(days=500)
+        self.current.end_date = date.today() - timedelta(days=450)
+        self.diet_list.attach(self.patient_view)
+        self.diet_rows.filter_box.setCurrentIndex(0)
+        self.assertEqual(self.diet_rows.shown, {}, "Diets shown")
+        with mock.patch("sys.excepthook") as excepthook:
+            mainwindow.centralWidget().saveDataButton.click()
+        excepthook.assert_not_called()
+        self.assertTrue(all(widget.diet_view is None
+                            for widget in self.diet_rows.pool),
+                        "Released widget shows a diet")
+
+    def test_focus_out_after_release(self):
+        """ Focus leaving a released widget changes nothing """
+
+        widget = self.diet_rows.shown[0]
+        mainwindow.activateWindow()
+        widget.dietNameEdit.setFocus()
+        app.processEvents()
+        self.diet_rows.release_rows()
+        widget.dietNameEdit.focusOutEvent(QFocusEvent(QEvent.Type.FocusOut))
+        widget.startDateEdit.focusOutEvent(QFocusEvent(QEvent.Type.FocusOut))
+        self.assertIsNone(widget.diet_view, "Widget shows a diet")
+
+
+class TestDietListLifecycle(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patients = []
+        for number in range(3):
+            patient = Patient(surname=f"Nachtdienst {number}",
+                              initials="N.",
+                              birthdate=date(1950, 1, 1 + number),
+                              sex="M")
+            DietHeader(diet_name=f"Dieet {number}", permanent_diet=True,
+                       patient=patient)
+            self.patients.append(PatientView.from_patient(patient))
+        mainwindow.show()
+        app.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+        app.processEvents()
+        self.maintainer = DietListMaintainer()
+        self.maintainer.change_patient_view(self.patients[0])
+        self.diet_list = self.maintainer.diet_list
+
+    def tearDown(self):
+
+        self.diet_list.reset()
+        mainwindow.hide()
+
+    def receivers(self):
+        """ The number of slots connected to the diet signals """
+
+        action = mainwindow.actionNieuw_Dieet
+        button = mainwindow.centralWidget().newItemButton_2
+        return (action.receivers(action.triggered),
+                button.receivers(button.clicked),
+                new_current_patient_emitter.receivers(
+                    new_current_patient_emitter.newCurrentPatient))
+
+    def test_list_reused(self):
+        """ The same list is attached to the next patient """
+
+        self.maintainer.change_patient_view(self.patients[1])
+        self.assertIs(self.maintainer.diet_list, self.diet_list,
+                      "List not reused")
+        self.assertIs(self.patients[1].diet_list, self.diet_list,
+                      "List not on patient")
+        self.assertEqual([diet_view.diet_name for diet_view
+                          in self.diet_list.diet_rows.all_views],
+                         ["Dieet 1"], "Diets of other patient shown")
+
+    def test_flat_over_many_patients(self):
+        """ Changing patients leaves no widgets or connections behind """
+
+        contents = mainwindow.centralWidget().scrollAreaWidgetContents
+        for patient_view in self.patients:
+            self.diet_list.add_diet()
+            self.maintainer.change_patient_view(patient_view)
+        app.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+        children = len(contents.children())
+        receivers = self.receivers()
+        for number in range(60):
+            self.diet_list.add_diet()
+            self.maintainer.change_patient_view(self.patients[number % 3])
+            app.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+        self.assertEqual(len(contents.children()), children,
+                         "Widgets left behind")
+        self.assertEqual(self.receivers(), receivers,
+                         "Connections left behind")
+
+    def test_changes_saved_on_detach(self):
+        """ Changes to the diets are saved when the patient changes """
+
+        widget = self.diet_list.diet_rows.shown[0]
+        widget.dietNameEdit.setText("Zoutloos")
+        self.diet_list.add_diet()
+        self.diet_list.created[0].dietNameEdit.setText("Vetarm")
+        self.maintainer.change_patient_view(self.patients[1])
+        patient = self.patients[0].patient
+        self.assertEqual(sorted(diet.diet_name for diet in patient.diets),
+                         ["Vetarm", "Zoutloos"], "Changes not saved")
+
+    def test_detach_with_focused_header(self):
+        """ Detaching with focus in a header field saves and goes on """
+
+        widget = self.diet_list.diet_rows.shown[0]
+        mainwindow.activateWindow()
+        widget.dietNameEdit.setFocus()
+        widget.dietNameEdit.setText("Zoutloos")
+        with mock.patch("sys.excepthook") as excepthook:
+            self.maintainer.change_patient_view(self.patients[1])
+            widget.dietNameEdit.focusOutEvent(
+                QFocusEvent(QEvent.Type.FocusOut))
+            mainwindow.centralWidget().saveDataButton.click()
+        excepthook.assert_not_called()
+        self.assertEqual(self.patients[0].patient.diets[0].diet_name,
+                         "Zoutloos", "Change not saved")
+        self.assertEqual([diet_view.diet_name for diet_view
+                          in self.diet_list.diet_rows.all_views],
+                         ["Dieet 1"], "Other patient not shown")
+
+    def test_reset(self):
+        """ A reset list shows no diets and adds none """
+
+        action = mainwindow.actionNieuw_Dieet
+        receivers = action.receivers(action.triggered)
+        self.diet_list.reset()
+        form = mainwindow.centralWidget()
+        self.assertEqual(self.diet_list.diet_rows.all_views, [],
+                         "Diets still shown")
+        self.assertFalse(form.noDietLabel.isHidden(),
+                         "No diet message hidden")
+        self.assertEqual(action.receivers(action.triggered), receivers - 1,
+                         "Reset list still adds diets")
+
@@ -121,6 +121,18 @@ class TestDietViewFromToDiet(unittest.TestCase):
         self.assertIn(12, ids, "At least one id not in lines")
 
 
+    def test_historical_diet(self):
+        """ A diet that ended before the date is historical """
+
+        self.assertFalse(self.diet_view.is_historical(date(2025, 5, 1)),
+                         "Open diet historical")
+        self.diet_view.end_date = date(2025, 4, 30)
+        self.assertTrue(self.diet_view.is_historical(date(2025, 5, 1)),
+                        "Ended diet not historical")
+        self.assertFalse(self.diet_view.is_historical(date(2025, 4, 30)),
+                         "Diet historical on end date")
+
+
 class TestDietLineViewFromToLine(unittest.TestCase):
 
     def setUp(self):
@@ -0,0 +1,148 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+import os
+import tempfile
+import unittest
+from datetime import date
+from io import StringIO
+import ujson
+from sqlalchemy import event
+import carereport as cr
+from carereport import session
+from carereport.models.patient import Patient, Intake
+from carereport.models.medical import (Medication, ExaminationRequest,
+                                       ExaminationResult, DietHeader,
+                                       DietLines, Diagnose, Treatment)
+from carereport.models.export import export_patients, export_file
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patient1 = Patient(surname="Scanda", initials="K.U.",
+                                birthdate=date(1982, 10, 8), sex="F")
+        self.patient2 = Patient(surname="Bandala", initials="W.",
+                                birthdate=date(1953, 1, 28), sex="M")
+        self.intake = Intake(date_intake=date(2024, 5, 1),
+                             result="Admitted", patient=self.patient1)
+        self.medication = Medication(medication="Asphacron 70mg",
+                                     frequency=2,
+                                     start_date=date(2024, 5, 1),
+                                     patient=self.patient1)
+        self.request = ExaminationRequest(date_request=date(2024, 5, 2),
+                                          examination_kind="Bloodsample",
+                                          examaning_department="Lab",
+                                          requester_name="Dr. Pill",
+                                          patient=self.patient1)
+        self.exam_result = ExaminationResult(examination_executor="Lab",
+                                             examination_result="Normal",
+                                             request=self.request)
+        self.diet = DietHeader(diet_name="Vega", permanent_diet=True,
+                               patient=self.patient1)
+        self.dietline = DietLines(food_name="Meat",
+                                  application_type="Don't eat",
+                                  diet=self.diet)
+        self.diagnose = Diagnose(description="Healthy", executor="Dr. Pill",
+                                 patient=self.patient1,
+                                 examinations=[self.request])
+        self.treatment = Treatment(manager="Dr. Pill", name="Rest",
+                                   description="Stay in bed for a week"
+                                               " and drink much water",
+                                   diagnoses=self.diagnose)
+        session.add_all([self.patient1, self.patient2, self.intake,
+                         self.medication, self.request, self.exam_result,
+                         self.diet, self.dietline, self.diagnose,
+                         self.treatment])
+        session.commit()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+
+        self.directory.cleanup()
+        session.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def test_document_per_patient(self):
+        """ Each patient is one line with the complete record """
+
+        out = StringIO()
+        written = export_patients(out, batch_size=1)
+        self.assertEqual(written, 2, "Not all patients written")
+        documents = [ujson.loads(line) for line
+                     in out.getvalue().splitlines()]
+        self.assertEqual([document["surname"] for document in documents],
+                         ["Scanda", "Bandala"], "Wrong patients written")
+        record = documents[0]
+        self.assertEqual(record["birthdate"], "1982-10-08",
+                         "Date not in ISO format")
+        self.assertEqual(record["exam_requests"][0]["results"][0]
+                         ["examination_result"], "Normal",
+                         "Result not in record")
+        self.assertEqual(record["diets"][0]["diet_lines"][0]["food_name"],
+                         "Meat", "Diet line not in record")
+        self.assertEqual(record["diagnoses"][0]["examinations"],
+                         [self.request.id], "Examination not linked")
+        self.assertEqual(record["diagnoses"][0]["treatments"][0]["name"],
+                         "Rest", "Treatment not in record")
+        self.assertEqual(documents[1]["medication"], [],
+                         "Medication for wrong patient")
+
+    def count_export_selects(self):
+        """ Export and return the number of selects done """
+
+        statements = []
+
+        def count_selects(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append(statement)
+
+        event.listen(cr.engine, "before_cursor_execute", count_selects)
+        try:
+            export_patients(StringIO(), batch_size=10)
+        finally:
+            event.remove(cr.engine, "before_cursor_execute", count_selects)
+        return len(statements)
+
+    def test_queries_do_not_grow_with_patients(self):
+        """ The number of queries depends on the pages only """
+
+        selects_before = self.count_export_selects()
+        for seqno in range(5):
+            patient = Patient(surname=f"Extra{seqno}", initials="E.",
+                              birthdate=date(1990, 1, seqno + 1), sex="X")
+            medication = Medication(medication="Visirant 10mg",
+                                    frequency=1,
+                                    start_date=date(2024, 5, 1),
+                                    patient=patient)
+            session.add_all([patient, medication])
+        session.commit()
+        self.assertEqual(self.count_export_selects(), selects_before,
+                         "Lazy loads in export")
+
+    def test_compressed_file(self):
+        """ The export can be written compressed """
+
+        path = os.path.join(self.directory.name, "patients.jsonl.gz")
+        self.assertEqual(export_file(path, compress=True), 2,
+                         "Not all patients written")
+        with gzip.open(path, "rt", encoding="utf-8") as export_in:
+            self.assertEqual(len(export_in.readlines()), 2,
+                             "Wrong number of lines")
@@ -18,14 +18,16 @@
 import unittest
 from datetime import date, timedelta
 from itertools import pairwise
-from sqlalchemy import select
+from sqlalchemy import select, event, update, inspect
+from sqlalchemy.exc import IntegrityError
 import carereport as cr
 from carereport import session
 from carereport.models.patient import Patient
 from carereport.models.medical import (Medication, ExaminationRequest,
                                        ExaminationResult, DietHeader,
                                        DietLines, Diagnose, Treatment,
-                                       TreatmentResult)
+                                       TreatmentResult, flush_validation,
+                                       diets_have_lines)
 
 
 class TestSetMedication(unittest.TestCase):
@@ -212,6 +214,85 @@ class TestMedicationLists(unittest.TestCase):
             medication.start_date = date(2022, 8, 5)
 
 
+class TestChartPages(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patient = Patient(surname="Pagina", initials="P.",
+                               birthdate=date(1944, 4, 4), sex="M")
+        today = date.today()
+        self.active = [Medication(medication=f"Actief {number}",
+                                  start_date=today - timedelta(days=10),
+                                  patient=self.patient)
+                       for number in range(5)]
+        self.stopped = [Medication(medication=f"Gestopt {number}",
+                                   start_date=today - timedelta(days=20),
+                                   end_date=today - timedelta(days=1),
+                                   patient=self.patient)
+                        for number in range(3)]
+        self.open_request = ExaminationRequest(examination_kind="Bloed",
+                                               examaning_department="Lab",
+                                               requester_name="Kooij",
+                                               patient=self.patient)
+        self.done_request = ExaminationRequest(
+            examination_kind="Röntgen", examaning_department="Radio",
+            requester_name="Kooij", date_request=today - timedelta(days=5),
+            date_execution=today - timedelta(days=2), patient=self.patient)
+        self.result = ExaminationResult(examination_executor="Radio",
+                                        examination_result="Gebroken",
+                                        request=self.done_request)
+        self.diagnose = Diagnose(description="Gebroken arm",
+                                 executor="Dulber", patient=self.patient)
+        self.treatments = [Treatment(manager="Dulber", name=name,
+                                     description="Zes weken in het gips houden",
+                                     diagnoses=self.diagnose)
+                           for name in ("Gips", "Rust")]
+        session.add_all([self.patient, *self.active, *self.stopped,
+                         self.open_request, self.done_request, self.result,
+                         self.diagnose, *self.treatments])
+        session.commit()
+
+    def tearDown(self):
+
+        session.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def test_medication_pages(self):
+        """ The active medication is paged, the newest first """
+
+        first = Medication.page_for_patient(self.patient, limit=3)
+        self.assertEqual(first, self.active[:-4:-1], "Wrong first page")
+        rest = Medication.page_for_patient(self.patient, first[-1].id,
+                                           limit=3)
+        self.assertEqual(rest, self.active[1::-1], "Wrong second page")
+
+    def test_medication_history(self):
+        """ The stopped medication is the history """
+
+        self.assertEqual(Medication.page_for_patient(self.patient,
+                                                     history=True),
+                         self.stopped[::-1], "Wrong history")
+
+    def test_examination_pages(self):
+        """ Open requests first, executed ones with their results """
+
+        self.assertEqual(ExaminationRequest.page_for_patient(self.patient),
+                         [self.open_request], "Wrong open requests")
+        history = ExaminationRequest.page_for_patient(self.patient,
+                                                      history=True)
+        self.assertEqual(history, [self.done_request], "Wrong history")
+        self.assertNotIn("result", inspect(history[0]).unloaded,
+                         "Results not loaded with the page")
+
+    def test_diagnose_pages(self):
+        """ Diagnoses come with the number of treatments """
+
+        self.assertEqual([tuple(row) for row
+                          in Diagnose.page_for_patient(self.patient)],
+                         [(self.diagnose, 2)], "Wrong diagnoses")
+
+
 class TestExaminationRequest(unittest.TestCase):
 
     def setUp(self):
@@ -525,6 +606,15 @@ class TestDietHeader(unittest.TestCase):
         self.assertNotIn(self.dietline3, diet_list,
                          f"Not current diet line in list")
 
+    def test_diets_of_pending_patient(self):
+        """ The diets of a patient added, but not flushed, are found """
+
+        self.diethead2.patient = self.patient1
+        session.add(self.patient1)
+        diet_list = self.patient1.get_diets(date(2025, 1, 12))
+        self.assertEqual(diet_list, [self.dietline1],
+                         "Diets of pending patient not found")
+
     def test_empty_diet_list(self):
         """ A patient may have an empty diet list """
 
@@ -552,6 +642,87 @@ class TestDietHeader(unittest.TestCase):
         self.assertIn(self.dietline2, diet_list,
                       f"{self.dietline2} not in list")
 
+    def test_current_diets_from_database(self):
+        """ For a stored patient the current diets are selected in SQL """
+
+        self.diethead1.patient = self.patient1
+        self.diethead3.patient = self.patient1
+        self.diethead2.patient = self.patient2
+        session.add_all([self.patient1, self.patient2])
+        session.flush()
+        session.expire_all()
+        diet_list = self.patient1.get_diets(date(2025, 1, 12))
+        self.assertEqual(diet_list, [self.dietline2],
+                         "Wrong diet lines for patient")
+        diet_list = self.patient1.get_diets(date(2024, 10, 1))
+        self.assertIn(self.dietline3, diet_list,
+                      f"{self.dietline3} not in list")
+
+    def stored_diets(self):
+        """ Store a number of diets and forget their contents """
+
+        diets = [DietHeader(diet_name=f"Diet {seqno}", permanent_diet=True,
+                            patient=self.patient1) for seqno in range(20)]
+        lines = [DietLines(food_name="Water", application_type="Drink",
+                           diet=diet) for diet in diets]
+        session.add_all(diets + lines)
+        session.flush()
+        for diet in diets:
+            session.expire(diet, ["diet_lines"])
+        return diets
+
+    def count_selects(self, action, *args):
+        """ Do action and return the number of SELECT statements executed """
+
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            if statement.startswith("SELECT"):
+                statements.append(statement)
+
+        event.listen(cr.engine, "before_cursor_execute", count)
+        try:
+            action(*args)
+        finally:
+            event.remove(cr.engine, "before_cursor_execute", count)
+        return len(statements)
+
+    def test_lines_checked_in_one_query(self):
+        """ The lines of stored diets are checked with one query """
+
+        diets = self.stored_diets()
+        selects = self.count_selects(diets_have_lines, session, diets)
+        self.assertEqual(selects, 1, f"{selects} queries to check lines")
+
+    def test_flush_skips_unchanged_lines(self):
+        """ Diets with only a changed name do not have lines checked """
+
+        diets = self.stored_diets()
+        for diet in diets:
+            diet.diet_name = diet.diet_name + " changed"
+        rule = [flush_rule for flush_rule
+                in flush_validation.rules[DietHeader]][0]
+        skipped = rule.skipped
+        selects = self.count_selects(session.flush)
+        self.assertEqual(selects, 0, f"{selects} queries to check lines")
+        self.assertEqual(rule.skipped, skipped + len(diets),
+                         "Skipped diets not counted")
+        self.assertIn("diets_have_lines", flush_validation.statistics(),
+                      "No statistics for rule")
+
+    def test_current_diet_lines_is_generator(self):
+        """ Current diet lines are generated with their header """
+
+        self.diethead2.patient = self.patient1
+        session.add(self.patient1)
+        session.flush()
+        lines = DietHeader.current_diet_lines(self.patient1,
+                                              date(2024, 9, 1))
+        self.assertFalse(isinstance(lines, list), "Lines is a list")
+        line = next(lines)
+        self.assertIs(line.diet, self.diethead2, "Header not with line")
+        lines.close()
+
 
 
 class TestDietLine(unittest.TestCase):
@@ -756,6 +927,95 @@ class TestDiagnoseExamination(unittest.TestCase):
             session.flush()
 
 
+    def results_for_requests(self):
+        """ Store the requests with a result for each """
+
+        results = [ExaminationResult(examination_executor="J. Dulber",
+                                     examination_result="Fine",
+                                     request=request)
+                   for request in (self.request1, self.request2)]
+        session.add_all([self.patient1, self.patient2, self.request1,
+                         self.request2, self.diagnose1, *results])
+        session.flush()
+
+    def test_link_many_examinations(self):
+        """ Link more requests with one query and one insert """
+
+        self.results_for_requests()
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement.split()[0].upper())
+
+        event.listen(cr.engine, "before_cursor_execute", record)
+        try:
+            linked = self.diagnose1.link_examinations([self.request1,
+                                                      self.request2])
+        finally:
+            event.remove(cr.engine, "before_cursor_execute", record)
+        self.assertEqual(linked, 2, "Not all requests linked")
+        self.assertEqual(statements, ["SELECT", "INSERT"],
+                         "Requests not checked and linked in bulk")
+        self.assertEqual(set(self.diagnose1.examinations),
+                         {self.request1, self.request2},
+                         "Requests not in diagnose")
+
+    def test_link_twice(self):
+        """ Requests already linked are not linked again """
+
+        self.results_for_requests()
+        self.diagnose1.link_examinations([self.request1])
+        self.assertEqual(self.diagnose1.link_examinations([self.request1,
+                                                           self.request2]),
+                         1, "Request linked twice")
+
+    def test_link_needs_results(self):
+        """ If a request has no result, nothing is linked """
+
+        self.results_for_requests()
+        request3 = ExaminationRequest(date_request=date.today(),
+                                      examination_kind="X-ray",
+                                      examaning_department="Radiology",
+                                      requester_name="A.J. Jansen",
+                                      patient=self.patient1)
+        session.add(request3)
+        with self.assertRaises(ValueError):
+            self.diagnose1.link_examinations([self.request1, request3])
+        self.assertEqual(self.diagnose1.examinations, [],
+                         "Requests linked after error")
+
+    def test_link_unsaved(self):
+        """ A diagnose and requests not saved yet can be linked """
+
+        self.results_for_requests()
+        request3 = ExaminationRequest(date_request=date.today(),
+                                      examination_kind="X-ray",
+                                      examaning_department="Radiology",
+                                      requester_name="A.J. Jansen",
+                                      patient=self.patient1)
+        ExaminationResult(examination_executor="J. Dulber",
+                          examination_result="Fine", request=request3)
+        diagnose3 = Diagnose(description="A disease",
+                             executor="F. Thedoctor",
+                             patient=self.patient1)
+        self.assertEqual(diagnose3.link_examinations([self.request1,
+                                                      request3]),
+                         2, "Unsaved requests not linked")
+        self.assertEqual(set(diagnose3.examinations),
+                         {self.request1, request3},
+                         "Requests not in diagnose")
+
+    def test_link_same_patient(self):
+        """ Requests for another patient cannot be linked """
+
+        self.results_for_requests()
+        diagnose2 = Diagnose(description="A disease",
+                             executor="F. Thedoctor",
+                             patient=self.patient2)
+        session.add(diagnose2)
+        with self.assertRaises(ValueError):
+            diagnose2.link_examinations([self.request1])
+
 class TestTreatment(unittest.TestCase):
 
     def setUp(self):
@@ -920,3 +1180,73 @@ class TestTreatmentResult(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.result1.description = ""
             session.flush()
+
+
+class TestCheckConstraints(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patient = Patient(surname="Checkers", initials="C.",
+                               birthdate=date(1979, 4, 1), sex="M")
+        self.medication = Medication(medication="Asphacron 70mg",
+                                     frequency=2,
+                                     start_date=date(2024, 3, 1),
+                                     patient=self.patient)
+        self.request = ExaminationRequest(date_request=date(2024, 5, 2),
+                                          examination_kind="Bloodsample",
+                                          examaning_department="Lab",
+                                          requester_name="Dr. Pill",
+                                          patient=self.patient)
+        self.diet = DietHeader(diet_name="Vega", permanent_diet=True,
+                               patient=self.patient)
+        self.dietline = DietLines(food_name="Meat",
+                                  application_type="Don't eat",
+                                  diet=self.diet)
+        session.add_all([self.patient, self.medication, self.request,
+                         self.diet, self.dietline])
+        session.flush()
+
+    def tearDown(self):
+
+        session.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def test_frequency_checked_in_database(self):
+        """ A set based update cannot make the frequency zero """
+
+        with self.assertRaises(IntegrityError):
+            session.execute(update(Medication).values(frequency=0))
+
+    def test_end_before_start_checked_in_database(self):
+        """ A set based update cannot end medication before its start """
+
+        with self.assertRaises(IntegrityError):
+            session.execute(update(Medication)
+                            .values(end_date=date(2024, 2, 1)))
+
+    def test_execution_checked_in_database(self):
+        """ A set based update cannot execute before the request """
+
+        with self.assertRaises(IntegrityError):
+            session.execute(update(ExaminationRequest)
+                            .values(date_execution=date(2024, 5, 1)))
+
+    def test_permanent_diet_checked_in_database(self):
+        """ A set based update cannot date a permanent diet """
+
+        with self.assertRaises(IntegrityError):
+            session.execute(update(DietHeader)
+                            .values(start_date=date(2024, 5, 1)))
+
+    def test_names_checked_in_database(self):
+        """ A set based update cannot empty a name """
+
+        with self.assertRaises(IntegrityError):
+            session.execute(update(Patient).values(surname=""))
+
+    def test_sex_checked_in_database(self):
+        """ A set based update cannot set an invalid sex """
+
+        with self.assertRaises(IntegrityError):
+            session.execute(update(Patient).values(sex="Q"))
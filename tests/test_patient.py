@@ -17,12 +17,14 @@
 
 import unittest
 from datetime import date, timedelta
-from sqlalchemy import select
+from sqlalchemy import select, event
+from sqlalchemy.orm.exc import StaleDataError
 import carereport as cr
 from carereport import session
 from carereport.models.patient import (Patient, Intake, IntakeResult)
 from carereport.models.medical import (DietHeader, DietLines, Medication,
-                                       ExaminationRequest)
+                                       ExaminationRequest, ExaminationResult,
+                                       Diagnose, Treatment)
 
 
 class TestCreatePatient(unittest.TestCase):
@@ -175,6 +177,100 @@ class TestGetPatients(unittest.TestCase):
                          "Patient name incorrect")
 
 
+class TestLoadChart(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patient1 = Patient(surname="Scanda", initials="K.U.",
+                                birthdate=date(1982, 10, 8), sex="F")
+        self.diethead1 = DietHeader(diet_name="Vega",
+                                    permanent_diet=True,
+                                    patient=self.patient1)
+        self.dietline1 = DietLines(food_name="Protein",
+                                   application_type="50 grams a day",
+                                   diet=self.diethead1)
+        self.medication1 = Medication(medication="Asphacron 70mg",
+                                      patient=self.patient1)
+        self.exam_request = ExaminationRequest(examination_kind="Röntgen"
+                                               " scan",
+                                               examaning_department="Radio",
+                                               requester_name="Guillaume",
+                                               patient=self.patient1)
+        self.exam_result = ExaminationResult(examination_executor="Radio",
+                                             examination_result="Broken",
+                                             request=self.exam_request)
+        self.diagnose1 = Diagnose(description="Broken underarm",
+                                  executor="J. Dulber",
+                                  patient=self.patient1)
+        self.treatment1 = Treatment(manager="J. Dulber", name="Plaster",
+                                    description="Put the arm in plaster for"
+                                    " six weeks",
+                                    diagnoses=self.diagnose1)
+        self.intake1 = Intake(date_intake=date(2024, 8, 22),
+                              result="Patient admitted",
+                              patient=self.patient1)
+        session.add_all([self.patient1, self.diethead1, self.dietline1,
+                         self.medication1, self.exam_request,
+                         self.exam_result, self.diagnose1, self.treatment1,
+                         self.intake1])
+        session.commit()
+        session.expire_all()
+        self.statements = []
+        event.listen(cr.engine, "before_cursor_execute", self.count)
+
+    def tearDown(self):
+
+        event.remove(cr.engine, "before_cursor_execute", self.count)
+        session.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def count(self, conn, cursor, statement, *args):
+        """ Keep the statements executed """
+
+        self.statements.append(statement)
+
+    def test_chart_loaded_in_fixed_queries(self):
+        """ Loading the chart takes one query per relationship """
+
+        patient = Patient.load_chart(self.patient1)
+        self.assertIs(patient, self.patient1, "Other patient returned")
+        self.assertLessEqual(len(self.statements), 12,
+                             "Too many queries to load the chart")
+
+    def test_no_lazy_loads_after_chart(self):
+        """ After loading the chart, the relationships are there """
+
+        Patient.load_chart(self.patient1)
+        loaded = len(self.statements)
+        self.assertEqual(self.patient1.diets[0].diet_lines,
+                         [self.dietline1], "Diet lines not loaded")
+        self.assertEqual(self.patient1.exam_requests[0].result,
+                         [self.exam_result], "Result not loaded")
+        self.assertEqual(self.patient1.diagnoses[0].treatments[0].results,
+                         [], "Treatment results not loaded")
+        self.assertEqual(len(self.patient1.medication), 1,
+                         "Medication not loaded")
+        self.assertEqual(len(self.patient1.intakes[0].results), 0,
+                         "Intake results not loaded")
+        self.assertEqual(len(self.statements), loaded,
+                         "Lazy loads after loading chart")
+
+    def test_part_of_chart(self):
+        """ Only the parts of the chart asked for are loaded """
+
+        Patient.load_chart(self.patient1, "diets")
+        loaded = len(self.statements)
+        self.assertEqual(self.patient1.diets[0].diet_lines,
+                         [self.dietline1], "Diet lines not loaded")
+        self.assertEqual(len(self.statements), loaded,
+                         "Lazy loads after loading diets")
+        self.assertEqual(len(self.patient1.medication), 1,
+                         "Medication not there")
+        self.assertGreater(len(self.statements), loaded,
+                           "Medication loaded with the diets")
+
+
 class TestIntake(unittest.TestCase):
 
     def setUp(self):
@@ -332,3 +428,71 @@ class TestIntakeResults(unittest.TestCase):
                and intakeresult.link_key == self.diethead1.id):
                 found += 1
         self.assertTrue(found > 0, "No link found")
+
+    def test_resolve_links(self):
+        """ The linked items of intakes are resolved per type """
+
+        session.add_all([self.intake1, self.medication1, self.exam_request,
+                         self.diethead1])
+        dietline = DietLines(food_name="Water", application_type="Only",
+                             diet=self.diethead1)
+        intake2 = Intake(date_intake=date(2024, 9, 2),
+                         result="Patient back",
+                         patient=self.patient1)
+        session.add_all([dietline, intake2])
+        session.flush()
+        self.intake1.add_result_for(*self.medication1.add_to_intake())
+        self.intake1.add_result_for(*self.diethead1.add_to_intake())
+        intake2.add_result_for(*self.exam_request.add_to_intake())
+        session.flush()
+        linked = IntakeResult.resolve_links([self.intake1, intake2])
+        self.assertEqual(linked[self.intake1],
+                         [self.medication1, self.diethead1],
+                         "Wrong items for first intake")
+        self.assertEqual(linked[intake2], [self.exam_request],
+                         "Wrong items for second intake")
+
+    def test_resolve_links_without_intakes(self):
+        """ Resolving no intakes returns an empty dictionary """
+
+        self.assertEqual(IntakeResult.resolve_links([]), {},
+                         "Links found without intakes")
+
+
+class TestConcurrentChanges(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patient = Patient(surname="Scanda", initials="K.U.",
+                               birthdate=date(1982, 10, 8), sex="F")
+        session.add(self.patient)
+        session.commit()
+
+    def tearDown(self):
+
+        session.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def test_version_counted_up(self):
+        """ Each update of a patient counts up the version """
+
+        self.assertEqual(self.patient.version_id, 1, "Wrong first version")
+        self.patient.initials = "K.V."
+        session.commit()
+        self.assertEqual(self.patient.version_id, 2, "Version not counted")
+
+    def test_change_by_other_not_overwritten(self):
+        """ A change on an outdated patient fails """
+
+        self.assertEqual(self.patient.surname, "Scanda", "Patient not read")
+        with cr.Session() as other_session:
+            other_patient = other_session.get(Patient, self.patient.id)
+            other_patient.surname = "Scandal"
+            other_session.commit()
+        self.patient.surname = "Skanda"
+        with self.assertRaises(StaleDataError):
+            session.commit()
+        session.rollback()
+        self.assertEqual(self.patient.surname, "Scandal",
+                         "Change by other not kept")
@@ -18,6 +18,7 @@ import unittest
 from datetime import date
 from PyQt6.QtWidgets import (QTableWidgetSelectionRange)
 from PyQt6.QtCore import QDate
+import carereport as cr
 from carereport import session
 from carereport.models.patient import Patient
 from carereport.views.patient_views import PatientView
@@ -553,3 +554,41 @@ class TestCreateChangeSideEffects(unittest.TestCase):
                          "View surname not updated")
         self.assertEqual(patient.surname, "Chasselaste",
                          "Surname not replaced by new value")
+
+
+class TestSaveChanges(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patient = Patient(surname="Scanda", initials="K.U.",
+                               birthdate=date(1982, 10, 8), sex="F")
+        session.add(self.patient)
+        session.commit()
+
+    def tearDown(self):
+
+        session.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def test_changes_saved(self):
+        """ Changes are committed """
+
+        self.patient.initials = "K.V."
+        self.assertTrue(mainwindow.save_changes(), "Changes not saved")
+        self.assertEqual(self.patient.version_id, 2, "Change not committed")
+
+    def test_change_by_other_reported(self):
+        """ A change on a record changed by someone else is not saved """
+
+        with cr.Session() as other_session:
+            other_patient = other_session.get(Patient, self.patient.id)
+            other_patient.surname = "Scandal"
+            other_session.commit()
+        self.patient.surname = "Skanda"
+        self.assertFalse(mainwindow.save_changes(), "Stale change saved")
+        self.assertIn("door een ander gewijzigd",
+                      mainwindow.statusbar.currentMessage(),
+                      "Change by other not reported")
+        self.assertEqual(self.patient.surname, "Scandal",
+                         "Change by other not kept")
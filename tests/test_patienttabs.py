@@ -0,0 +1,156 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from datetime import date
+from PyQt6.QtWidgets import QTabWidget, QWidget
+import carereport as cr
+from carereport import session, Patient, DietHeader, DietLines
+from carereport.views.care_app import mainwindow
+from carereport.views.patient_views import PatientView
+from carereport.views.patienttabs import PatientTabs, TabProvider
+from carereport.views.scripts_diet import diet_list_maint
+
+
+class RecordingProvider(TabProvider):
+    """ A provider keeping what it loaded and released """
+
+    def __init__(self, name, log):
+
+        self.name = name
+        self.log = log
+
+    def load(self, patient_view):
+
+        self.log.append(("load", self.name, patient_view))
+
+    def release(self):
+
+        self.log.append(("release", self.name))
+
+
+class TestPatientTabs(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tab_widget = QTabWidget()
+        self.tabs = [QWidget() for _ in range(3)]
+        for number, tab in enumerate(self.tabs):
+            self.tab_widget.addTab(tab, f"Tab {number}")
+        self.log = []
+        self.patient_tabs = PatientTabs(self.tab_widget)
+        for number, tab in enumerate(self.tabs):
+            self.patient_tabs.register(tab, RecordingProvider(number,
+                                                              self.log))
+
+    def test_only_tab_shown_loaded(self):
+        """ Changing the patient loads the tab shown only """
+
+        self.patient_tabs.change_patient("Jansen")
+        self.assertEqual(self.log, [("load", 0, "Jansen")],
+                         "Other tabs loaded")
+
+    def test_loaded_when_shown(self):
+        """ A tab is loaded when first shown and kept after that """
+
+        self.patient_tabs.change_patient("Jansen")
+        self.tab_widget.setCurrentIndex(2)
+        self.tab_widget.setCurrentIndex(0)
+        self.tab_widget.setCurrentIndex(2)
+        self.assertEqual(self.log, [("load", 0, "Jansen"),
+                                    ("load", 2, "Jansen")],
+                         "Tabs not loaded once")
+
+    def test_patient_change_releases(self):
+        """ The tabs loaded are released when the patient changes """
+
+        self.patient_tabs.change_patient("Jansen")
+        self.tab_widget.setCurrentIndex(1)
+        self.log.clear()
+        self.patient_tabs.change_patient("Pietersen")
+        self.assertEqual(sorted(self.log[:2]), [("release", 0),
+                                                ("release", 1)],
+                         "Tabs not released")
+        self.assertEqual(self.log[2:], [("load", 1, "Pietersen")],
+                         "Tab shown not loaded")
+        self.assertFalse(self.patient_tabs.is_loaded(self.tabs[0]),
+                         "Tab not shown still loaded")
+
+    def test_default_provider(self):
+        """ A provider without load or release can be used """
+
+        self.patient_tabs.register(self.tabs[0], TabProvider())
+        self.patient_tabs.change_patient("Jansen")
+        self.patient_tabs.change_patient("Pietersen")
+        self.assertTrue(self.patient_tabs.is_loaded(self.tabs[0]),
+                        "Default provider not loaded")
+
+    def test_invalidate(self):
+        """ An invalidated tab is loaded again """
+
+        self.patient_tabs.change_patient("Jansen")
+        self.tab_widget.setCurrentIndex(1)
+        self.log.clear()
+        self.patient_tabs.invalidate(self.tabs[0])
+        self.assertEqual(self.log, [("release", 0)],
+                         "Tab not shown loaded again")
+        self.patient_tabs.invalidate()
+        self.assertEqual(self.log[1:], [("release", 1),
+                                        ("load", 1, "Jansen")],
+                         "Tab shown not loaded again")
+
+
+class TestDietTabProvider(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patient = Patient(surname="Dagdienst", initials="D.",
+                               birthdate=date(1960, 3, 4), sex="F")
+        diet = DietHeader(diet_name="Zoutarm", permanent_diet=True,
+                          patient=self.patient)
+        session.add_all([self.patient, diet,
+                         DietLines(food_name="Zout",
+                                   application_type="Niet toevoegen",
+                                   diet=diet)])
+        session.commit()
+        self.form = mainwindow.centralWidget()
+        self.diet_index = self.form.patientData.indexOf(self.form.dieetTab)
+
+    def tearDown(self):
+
+        self.form.patientData.setCurrentIndex(self.diet_index)
+        if diet_list_maint.diet_list is not None:
+            diet_list_maint.diet_list.reset()
+        self.form.patient_tabs.change_patient(None)
+        session.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def test_diets_loaded_when_shown(self):
+        """ The diets are shown when the diet tab is shown """
+
+        self.form.patientData.setCurrentIndex(0)
+        patient_view = PatientView.from_patient(self.patient)
+        mainwindow.set_new_current_patient(patient_view)
+        self.assertFalse(self.form.patient_tabs.is_loaded(self.form.dieetTab),
+                         "Diet tab loaded while not shown")
+        self.form.patientData.setCurrentIndex(self.diet_index)
+        self.assertIs(patient_view.diet_list, diet_list_maint.diet_list,
+                      "Diet list not attached")
+        self.assertEqual([diet_view.diet_name for diet_view
+                          in patient_view.diet_list.diet_rows.all_views],
+                         ["Zoutarm"], "Diets not shown")
@@ -0,0 +1,220 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from datetime import date, timedelta
+from io import StringIO
+import ujson
+from sqlalchemy import update
+import carereport as cr
+from carereport import session
+from carereport.models.patient import Patient
+from carereport.models.medical import DietHeader, DietLines
+from carereport.models.reports import (kitchen_report, kitchen_counts,
+                                       kitchen_report_csv,
+                                       kitchen_report_json, diet_calendar)
+
+
+class TestKitchenReport(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patient1 = Patient(surname="Scanda", initials="K.U.",
+                                birthdate=date(1982, 10, 8), sex="F")
+        self.patient2 = Patient(surname="Bandala", initials="W.",
+                                birthdate=date(1953, 1, 28), sex="M")
+        self.diethead1 = DietHeader(diet_name="Vega",
+                                    permanent_diet=True,
+                                    patient=self.patient1)
+        self.diethead2 = DietHeader(diet_name="Drink much",
+                                    start_date=date(2024, 8, 7),
+                                    end_date=None,
+                                    patient=self.patient2)
+        self.diethead3 = DietHeader(diet_name="Carbo hydrate",
+                                    start_date=date(2024, 7, 12),
+                                    end_date=date(2025, 2, 17),
+                                    patient=self.patient2)
+        self.dietline1 = DietLines(food_name="Water",
+                                   application_type="One liter a day",
+                                   description="Drink at least 1 liter"
+                                               " of water a day",
+                                   diet=self.diethead2)
+        self.dietline2 = DietLines(food_name="Meat",
+                                   application_type="Don't eat",
+                                   description="No meat for a vegetarian",
+                                   diet=self.diethead1)
+        self.dietline3 = DietLines(food_name="Meat",
+                                   application_type="Don't eat",
+                                   description="Meat is full of fat",
+                                   diet=self.diethead3)
+        session.add_all([self.patient1, self.patient2])
+        session.flush()
+
+    def tearDown(self):
+
+        session.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def test_rules_grouped_over_patients(self):
+        """ A rule for more patients is reported once with all patients """
+
+        rules = list(kitchen_report(date(2025, 1, 12)))
+        self.assertEqual(len(rules), 2, "Wrong number of rules")
+        meat = rules[0]
+        self.assertEqual((meat.food_name, meat.count), ("Meat", 2),
+                         "Meat rule not for both patients")
+        self.assertEqual([patient[1] for patient in meat.patients],
+                         ["Bandala", "Scanda"],
+                         "Patients not in order")
+
+    def test_only_current_diets_reported(self):
+        """ Rules from diets that ended are not reported """
+
+        rules = list(kitchen_report(date(2025, 3, 1)))
+        meat = [rule for rule in rules if rule.food_name == "Meat"][0]
+        self.assertEqual(meat.count, 1, "Ended diet in report")
+
+    def test_counts(self):
+        """ The counts per rule are computed by the database """
+
+        counts = kitchen_counts(date(2025, 1, 12))
+        self.assertEqual(counts, [("Meat", "Don't eat", 2),
+                                  ("Water", "One liter a day", 1)],
+                         "Counts incorrect")
+
+    def test_export_csv(self):
+        """ The CSV export has a row per rule and patient """
+
+        out = StringIO()
+        kitchen_report_csv(out, date(2025, 1, 12))
+        rows = out.getvalue().splitlines()
+        self.assertEqual(len(rows), 4, "Wrong number of rows")
+
+    def test_export_json(self):
+        """ The JSON export is a list of rules """
+
+        out = StringIO()
+        kitchen_report_json(out, date(2025, 1, 12))
+        rules = ujson.loads(out.getvalue())
+        self.assertEqual(rules[1]["food_name"], "Water",
+                         "Rule not in export")
+        self.assertEqual(rules[0]["count"], 2, "Count not in export")
+
+
+class TestDietCalendar(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patient1 = Patient(surname="Franka", initials="K.G.",
+                                birthdate=date(1982, 5, 17), sex="F")
+        self.patient2 = Patient(surname="Kilbar", initials="S.",
+                                birthdate=date(1953, 2, 18), sex="M")
+        self.diethead1 = DietHeader(diet_name="sugarless",
+                                    permanent_diet=True,
+                                    patient=self.patient1)
+        self.diethead2 = DietHeader(diet_name="Easy on salt",
+                                    start_date=date(2025, 3, 3),
+                                    end_date=None,
+                                    patient=self.patient2)
+        self.diethead3 = DietHeader(diet_name="Lean (less fat)",
+                                    start_date=date(2025, 2, 20),
+                                    end_date=date(2025, 3, 4),
+                                    patient=self.patient2)
+        self.dietline1 = DietLines(food_name="Sugar",
+                                   application_type="Never",
+                                   diet=self.diethead1)
+        self.dietline2 = DietLines(food_name="Salt",
+                                   application_type="A pinch",
+                                   diet=self.diethead2)
+        self.dietline3 = DietLines(food_name="Cookies",
+                                   application_type="Don't eat",
+                                   diet=self.diethead3)
+        session.add_all([self.patient1, self.patient2])
+        session.flush()
+
+    def tearDown(self):
+
+        session.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def test_calendar_has_all_days(self):
+        """ The calendar has an entry for each day asked """
+
+        calendar = diet_calendar(date(2025, 3, 1), 14)
+        self.assertEqual(len(calendar.days), 14, "Wrong number of days")
+
+    def test_calendar_without_days(self):
+        """ A range of no days gives an empty calendar """
+
+        for number_of_days in (0, -3):
+            calendar = diet_calendar(date(2025, 3, 1), number_of_days)
+            self.assertEqual(calendar.days, [], "Days in empty calendar")
+
+    def test_calendar_matches_get_diets(self):
+        """ Each day the calendar agrees with the diets per patient """
+
+        start = date(2025, 3, 1)
+        calendar = diet_calendar(start, 7)
+        for day in range(7):
+            for_date = start + timedelta(days=day)
+            for patient in (self.patient1, self.patient2):
+                expected = tuple(sorted(line.id for line
+                                        in patient.get_diets(for_date)))
+                self.assertEqual(calendar.lines_for(for_date, patient.id),
+                                 expected,
+                                 f"Lines differ on {for_date}")
+
+    def test_calendar_empty_intervals(self):
+        """ Diets ending on or before their start are never current """
+
+        patient = Patient(surname="Leeg", initials="L.",
+                          birthdate=date(1970, 1, 1), sex="F")
+        one_day = DietHeader(diet_name="Zero days",
+                             start_date=date(2025, 3, 4),
+                             end_date=date(2025, 3, 4), patient=patient)
+        backwards = DietHeader(diet_name="Backwards",
+                               start_date=date(2025, 3, 3),
+                               end_date=date(2025, 3, 5), patient=patient)
+        session.add_all([patient, one_day, backwards,
+                         DietLines(food_name="Bread", application_type="No",
+                                   diet=one_day),
+                         DietLines(food_name="Milk", application_type="No",
+                                   diet=backwards)])
+        session.flush()
+        session.execute(update(DietHeader)
+                        .where(DietHeader.id == backwards.id)
+                        .values(start_date=date(2025, 3, 5),
+                                end_date=date(2025, 3, 2)))
+        session.expire(backwards)
+        start = date(2025, 3, 1)
+        calendar = diet_calendar(start, 7)
+        for day in range(7):
+            for_date = start + timedelta(days=day)
+            expected = tuple(sorted(line.id for diet in (one_day, backwards)
+                                    if diet.is_current(for_date)
+                                    for line in diet.diet_lines))
+            self.assertEqual(calendar.lines_for(for_date, patient.id),
+                             expected, f"Lines differ on {for_date}")
+
+    def test_date_outside_calendar(self):
+        """ Asking a date outside the calendar is an error """
+
+        calendar = diet_calendar(date(2025, 3, 1), 7)
+        with self.assertRaises(IndexError):
+            calendar.for_date(date(2025, 3, 8))
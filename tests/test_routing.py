@@ -0,0 +1,160 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from configparser import ConfigParser
+from datetime import date
+from sqlalchemy import create_engine, select, insert
+import carereport as cr
+from carereport.models.patient import Patient
+from carereport.models.medical import ExaminationRequest
+from carereport.routing import RoutingSession, replica_uris
+
+
+class TestRoutingSession(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.primary = create_engine("sqlite:///" + os.path.join(
+            self.directory.name, "primary.db"))
+        self.replica = create_engine("sqlite:///" + os.path.join(
+            self.directory.name, "replica.db"))
+        for engine, surname in ((self.primary, "Primary"),
+                                (self.replica, "Replica")):
+            cr.Base.metadata.create_all(engine)
+            with engine.begin() as connection:
+                connection.execute(insert(Patient),
+                                   [{"surname": surname, "initials": "P.",
+                                     "birthdate": date(1980, 1, 1),
+                                     "sex": "F"}])
+                connection.execute(insert(ExaminationRequest),
+                                   [{"date_request": date(2025, 1, 1),
+                                     "examination_kind": "Bloed",
+                                     "examaning_department": "Lab",
+                                     "requester_name": surname,
+                                     "patient_id": 1}])
+        self.session = RoutingSession(bind=self.primary,
+                                      replicas=[self.replica],
+                                      read_your_writes=60)
+
+    def tearDown(self):
+
+        self.session.close()
+        self.primary.dispose()
+        self.replica.dispose()
+        self.directory.cleanup()
+
+    def surnames(self):
+        """ The surnames of the patients read by the session """
+
+        return self.session.scalars(select(Patient.surname)
+                                    .order_by(Patient.surname)).all()
+
+    def test_reads_from_replica(self):
+        """ A session that did not write reads from the replica """
+
+        self.assertEqual(self.surnames(), ["Replica"], "Not read on replica")
+
+    def test_versioned_objects_from_primary(self):
+        """ Objects with a version check are read from the primary """
+
+        patient = self.session.scalars(select(Patient)).one()
+        self.assertEqual(patient.surname, "Primary",
+                         "Versioned object read on replica")
+        patient.initials = "Q."
+        self.session.commit()
+        self.assertEqual(patient.version_id, 2, "Version not counted")
+
+    def test_searches_from_replica(self):
+        """ Searches and work lists opt in to the replica """
+
+        with (mock.patch("carereport.models.patient.session", self.session),
+              mock.patch("carereport.models.medical.session", self.session)):
+            patients = Patient.patient_search((None, "", ""))
+            self.assertEqual([patient.surname for patient in patients],
+                             ["Replica"], "Search not read on replica")
+            requests = ExaminationRequest.requests_for_department("Lab")
+            self.assertEqual([row[0].requester_name for row in requests],
+                             ["Replica"], "Work list not read on replica")
+
+    def test_searches_with_writes_from_primary(self):
+        """ With writes pending a search reads from the primary """
+
+        self.session.add(Patient(surname="Added", initials="A.",
+                                 birthdate=date(1990, 2, 2), sex="M"))
+        with mock.patch("carereport.models.patient.session", self.session):
+            patients = Patient.patient_search((None, "", ""))
+        self.assertEqual(sorted(patient.surname for patient in patients),
+                         ["Added", "Primary"], "Search read on replica")
+
+    def test_found_patient_from_primary(self):
+        """ A patient found on a replica is read again before a change """
+
+        with mock.patch("carereport.models.patient.session", self.session):
+            patient = Patient.patient_search((None, "", ""))[0]
+            Patient.from_primary(patient)
+        self.assertEqual(patient.surname, "Primary", "Not read again")
+        patient.initials = "Q."
+        self.session.commit()
+        self.assertEqual(patient.version_id, 2, "Version not counted")
+
+    def test_writes_to_primary(self):
+        """ Added patients are written to the primary """
+
+        self.session.add(Patient(surname="Added", initials="A.",
+                                 birthdate=date(1990, 2, 2), sex="M"))
+        self.session.commit()
+        with self.primary.connect() as connection:
+            self.assertEqual(connection.scalars(
+                select(Patient.surname).order_by(Patient.surname)).all(),
+                ["Added", "Primary"], "Not written to primary")
+
+    def test_read_own_writes(self):
+        """ After a write the session reads from the primary """
+
+        self.session.add(Patient(surname="Added", initials="A.",
+                                 birthdate=date(1990, 2, 2), sex="M"))
+        self.session.flush()
+        self.assertEqual(self.surnames(), ["Added", "Primary"],
+                         "Own write not read in transaction")
+        self.session.commit()
+        self.assertEqual(self.surnames(), ["Added", "Primary"],
+                         "Own write not read after commit")
+
+    def test_replica_after_window(self):
+        """ After the read your writes time reads go to the replica again """
+
+        self.session.read_your_writes = 0
+        self.session.add(Patient(surname="Added", initials="A.",
+                                 birthdate=date(1990, 2, 2), sex="M"))
+        self.session.commit()
+        self.assertEqual(self.surnames(), ["Replica"], "Not read on replica")
+
+    def test_replicas_from_config(self):
+        """ Replicas are a comma separated list in the configuration """
+
+        config = ConfigParser()
+        config.read_string("[DATABASE]\n"
+                           "REPLICA_URIS = sqlite:///one.db,\n"
+                           "    sqlite:///two.db\n")
+        self.assertEqual(replica_uris(config["DATABASE"]),
+                         ["sqlite:///one.db", "sqlite:///two.db"],
+                         "Replicas not read")
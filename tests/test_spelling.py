@@ -0,0 +1,157 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from datetime import date
+import carereport as cr
+from carereport import session
+from carereport.models.patient import Patient
+from carereport.models.medical import Medication
+from carereport.models.suggestions import term_index
+from carereport.models.spelling import (DeletionIndex, SpellingIndex,
+                                        edit_distance, spelling_index)
+
+
+class TestEditDistance(unittest.TestCase):
+
+    def test_edits_counted(self):
+        """ Inserts, deletes, replacements and swaps count as one """
+
+        self.assertEqual(edit_distance("paracetamoll", "paracetamol", 2), 1,
+                         "Insert not counted")
+        self.assertEqual(edit_distance("paracetmol", "paracetamol", 2), 1,
+                         "Delete not counted")
+        self.assertEqual(edit_distance("parecetamol", "paracetamol", 2), 1,
+                         "Replace not counted")
+        self.assertEqual(edit_distance("paractemol", "paracetamol", 2), 2,
+                         "Swap not counted")
+
+    def test_counting_stops(self):
+        """ Beyond the maximum distance the counting stops """
+
+        self.assertEqual(edit_distance("aspirin", "paracetamol", 2), 3,
+                         "Counted beyond maximum")
+
+
+class TestDeletionIndex(unittest.TestCase):
+
+    def setUp(self):
+
+        self.index = DeletionIndex(["Paracetamol 500mg", "Paracetamol",
+                                    "Ibuprofen", "Bloodsample", "X-ray"])
+
+    def test_close_terms_found(self):
+        """ Terms close to the word are found, closest first """
+
+        self.assertEqual(self.index.lookup("Paracetamoll"),
+                         [("Paracetamol", 1)], "Term not found")
+        self.assertEqual(self.index.lookup("ibuprofne"),
+                         [("Ibuprofen", 1)], "Swapped term not found")
+
+    def test_far_terms_not_found(self):
+        """ Terms more than the maximum distance away are not found """
+
+        self.assertEqual(self.index.lookup("Paracetamoll", max_distance=0),
+                         [], "Too far term found")
+        self.assertEqual(self.index.lookup("Blood"), [],
+                         "Too far term found")
+
+    def test_deletions_bounded(self):
+        """ Only the deletions of the start of a term are kept """
+
+        index = DeletionIndex(["a" * 50 + str(number)
+                               for number in range(100)])
+        self.assertEqual(len(index), 100, "Terms not added")
+        self.assertEqual(len(index.deletions), 3,
+                         "Deletions beyond the prefix kept")
+
+
+class TestSpellingIndex(unittest.TestCase):
+
+    def setUp(self):
+
+        self.patient = Patient(surname="Scanda", initials="K.U.",
+                               birthdate=date(1982, 10, 8), sex="F")
+        session.add_all([self.patient,
+                         *[Medication(medication=medication, frequency=1,
+                                      start_date=date(2025, 1, 1),
+                                      patient=self.patient)
+                           for medication in ("Paracetamol",
+                                              "Paracetamol",
+                                              "Paracetamal",
+                                              "Ibuprofen")]])
+        session.commit()
+
+    def tearDown(self):
+
+        session.reset()
+        term_index.reset()
+        spelling_index.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def test_stored_term_proposed(self):
+        """ For a misspelled word the stored terms are proposed, closest
+            first
+        """
+
+        self.assertEqual(SpellingIndex().corrections("medication",
+                                                     "Paracetamoll"),
+                         ["Paracetamol", "Paracetamal"],
+                         "Stored terms not proposed")
+
+    def test_most_used_first(self):
+        """ Of equally close terms the most used is first """
+
+        self.assertEqual(SpellingIndex().corrections("medication",
+                                                     "Paracetemol"),
+                         ["Paracetamol", "Paracetamal"],
+                         "Most used not first")
+
+    def test_saved_term_proposed(self):
+        """ A term saved after building the index is proposed """
+
+        spelling_index.corrections("medication", "Ibuprofen")
+        session.add(Medication(medication="Omeprazol", frequency=1,
+                               start_date=date(2025, 1, 1),
+                               patient=self.patient))
+        session.commit()
+        self.assertEqual(spelling_index.corrections("medication",
+                                                    "Omeprazoll"),
+                         ["Omeprazol"], "Saved term not proposed")
+
+    def test_rolled_back_term_not_proposed(self):
+        """ A term of a rolled back save is not proposed """
+
+        spelling_index.corrections("medication", "Ibuprofen")
+        session.add(Medication(medication="Omeprazol", frequency=1,
+                               start_date=date(2025, 1, 1),
+                               patient=self.patient))
+        session.flush()
+        session.rollback()
+        self.assertEqual(spelling_index.corrections("medication",
+                                                    "Omeprazoll"),
+                         [], "Rolled back term proposed")
+
+    def test_prefix_before_corrections(self):
+        """ The suggester proposes corrections if no term starts so """
+
+        suggest = SpellingIndex().suggester("medication")
+        self.assertEqual(suggest("Ibu"), ["Ibuprofen"],
+                         "Prefix terms not proposed")
+        self.assertEqual(suggest("Ibuprofn"), ["Ibuprofen"],
+                         "Corrections not proposed")
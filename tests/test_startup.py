@@ -0,0 +1,190 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import unittest
+from PyQt6.QtCore import QEventLoop, QTimer
+import carereport as cr
+from carereport import session, mainwindow
+from carereport.models.medical import DietHeader, DietLines
+from carereport.models.suggestions import term_index
+from carereport.views.startup import (Stage, Startup, StartupSplash,
+                                      care_stages, window_needs)
+
+
+def run(startup):
+    """ Start and wait until no stage runs anymore """
+
+    loop = QEventLoop()
+    startup.done.connect(loop.quit)
+    QTimer.singleShot(5000, loop.quit)
+    startup.start()
+    loop.exec()
+
+
+class TestStartup(unittest.TestCase):
+
+    def setUp(self):
+
+        self.order = []
+        self.threads = set()
+
+    def work(self, name):
+        """ Return the work for a stage recording it ran """
+
+        def record():
+            self.threads.add(threading.current_thread())
+            self.order.append(name)
+
+        return record
+
+    def test_stages_after_needs(self):
+        """ A stage runs after the stages it needs, on a worker thread """
+
+        startup = Startup([Stage("window", self.work("window"),
+                                 ("database", "terms")),
+                           Stage("terms", self.work("terms"), ("database",)),
+                           Stage("database", self.work("database"))])
+        ready = []
+        startup.stageReady.connect(ready.append)
+        run(startup)
+        self.assertEqual(self.order, ["database", "terms", "window"],
+                         "Stages not run after needs")
+        self.assertEqual(ready, ["database", "terms", "window"],
+                         "Readiness not reported")
+        self.assertNotIn(threading.main_thread(), self.threads,
+                         "Work run on GUI thread")
+
+    def test_failed_stage(self):
+        """ A failed stage is reported and what needs it does not run """
+
+        def fail():
+            raise ConnectionError("No database")
+
+        startup = Startup([Stage("database", fail),
+                           Stage("terms", self.work("terms"), ("database",)),
+                           Stage("clock", self.work("clock"))])
+        failed = []
+        startup.stageFailed.connect(lambda name, error:
+                                    failed.append((name, error)))
+        run(startup)
+        self.assertEqual(failed, [("database", "No database")],
+                         "Failure not reported")
+        self.assertEqual(self.order, ["clock"], "Wrong stages run")
+
+    def test_result_installed_on_gui_thread(self):
+        """ What the work returns is installed on the GUI thread """
+
+        installed = []
+        startup = Startup([Stage("terms", threading.current_thread,
+                                 install=lambda worker: installed.append(
+                                     (worker, threading.current_thread())))])
+        run(startup)
+        self.assertEqual(len(installed), 1, "Result not installed")
+        worker, installer = installed[0]
+        self.assertIsNot(worker, threading.main_thread(),
+                         "Work run on GUI thread")
+        self.assertIs(installer, threading.main_thread(),
+                      "Result not installed on GUI thread")
+
+    def test_failed_install(self):
+        """ A stage of which the result cannot be installed fails """
+
+        def refuse(result):
+            raise ValueError("Cannot install")
+
+        startup = Startup([Stage("terms", self.work("terms"),
+                                 install=refuse)])
+        run(startup)
+        self.assertEqual(startup.failed, {"terms": "Cannot install"},
+                         "Failed install not reported")
+        self.assertNotIn("terms", startup.ready, "Stage ready")
+
+    def test_splash_closed_on_failure(self):
+        """ The splash closes when a stage the window needs fails """
+
+        def fail():
+            raise ConnectionError("No database")
+
+        startup = Startup([Stage("database", fail),
+                           Stage("warmup", self.work("warmup"),
+                                 ("database",))])
+        splash = StartupSplash(startup, mainwindow,
+                               needs=("database", "warmup"))
+        splash.show()
+        run(startup)
+        self.assertFalse(splash.isVisible(), "Splash still shown")
+
+    def test_when_ready(self):
+        """ A function waiting for stages is called when they are ready """
+
+        startup = Startup([Stage("database", self.work("database")),
+                           Stage("terms", self.work("terms"), ("database",))])
+        called = []
+        startup.when_ready(("terms",), lambda: called.append("terms"))
+        run(startup)
+        startup.when_ready(("database",), lambda: called.append("database"))
+        self.assertEqual(called, ["terms", "database"], "Not called")
+
+
+class TestCareStages(unittest.TestCase):
+
+    def setUp(self):
+
+        diet = DietHeader(diet_name="Vega", permanent_diet=True)
+        session.add_all([diet, DietLines(food_name="Meat",
+                                         application_type="Don't eat",
+                                         diet=diet)])
+        session.commit()
+        term_index.reset()
+
+    def tearDown(self):
+
+        mainwindow.actionNieuw.setEnabled(True)
+        mainwindow.actionPatientZoeken.setEnabled(True)
+        session.reset()
+        term_index.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def test_application_started(self):
+        """ The care stages make the window usable and load the terms """
+
+        startup = Startup(care_stages())
+        splash = StartupSplash(startup, mainwindow)
+        mainwindow.wait_for(startup, window_needs)
+        self.assertFalse(mainwindow.actionPatientZoeken.isEnabled(),
+                         "Search enabled before database ready")
+        run(startup)
+        self.assertEqual(startup.failed, {}, "Stages failed")
+        self.assertTrue(mainwindow.actionPatientZoeken.isEnabled(),
+                        "Search not enabled")
+        self.assertIn("food_name", term_index.tries, "Terms not loaded")
+        self.assertEqual(term_index.suggest("food_name", "M"), ["Meat"],
+                         "Wrong terms loaded")
+        splash.close()
+
+    def test_loaded_trie_kept(self):
+        """ A trie loaded on the GUI thread is not replaced by a built one """
+
+        loaded = term_index.trie("food_name")
+        term_index.install({"food_name": term_index.build("food_name")[0],
+                            "diet_name": term_index.build("diet_name")[0]})
+        self.assertIs(term_index.tries["food_name"], loaded,
+                      "Loaded trie replaced")
+        self.assertEqual(term_index.suggest("diet_name", ""), ["Vega"],
+                         "Built trie not installed")
@@ -0,0 +1,271 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from collections import Counter
+from datetime import date
+from unittest import mock
+from PyQt6.QtWidgets import QLineEdit
+from sqlalchemy import select
+import carereport as cr
+from carereport import session
+from carereport.models.medical import DietHeader, DietLines, Medication
+from carereport.models.suggestions import (PrefixTrie, TermIndex, TermUsage,
+                                           term_index, save_counted,
+                                           count_up, saved_terms)
+from carereport.views.widgetext import TermCompleter
+
+
+class TestPrefixTrie(unittest.TestCase):
+
+    def setUp(self):
+
+        self.trie = PrefixTrie(["Meat", "Melon", "milk", "Water",
+                                "Meatballs", "Meat"])
+
+    def test_terms_for_prefix(self):
+        """ Terms starting with the prefix, most used first """
+
+        self.assertEqual(self.trie.suggest("me"),
+                         ["Meat", "Meatballs", "Melon"],
+                         "Wrong terms for prefix")
+        self.assertEqual(self.trie.uses("meat"), 2, "Wrong number of uses")
+
+    def test_ranked_by_use(self):
+        """ A term used more often moves up """
+
+        self.trie.add("Melon", 3)
+        self.assertEqual(self.trie.suggest("me"),
+                         ["Melon", "Meat", "Meatballs"],
+                         "Terms not ranked by use")
+        self.assertEqual(self.trie.suggest(""),
+                         ["Melon", "Meat", "Meatballs", "milk", "Water"],
+                         "Terms not ranked by use at root")
+
+    def test_top_kept_per_node(self):
+        """ Only the most used terms are kept, more are collected """
+
+        trie = PrefixTrie(top_size=2)
+        for term, uses in (("Meat", 1), ("Melon", 5), ("Milk", 3)):
+            trie.add(term, uses)
+        self.assertEqual(trie.suggest("m", limit=2), ["Melon", "Milk"],
+                         "Wrong top terms")
+        self.assertEqual(trie.suggest("m", limit=3),
+                         ["Melon", "Milk", "Meat"], "Terms not collected")
+
+    def test_prefix_any_case(self):
+        """ The prefix matches regardless of case """
+
+        self.assertEqual(self.trie.suggest("MI"), ["milk"],
+                         "Prefix not matched on case")
+
+    def test_limit(self):
+        """ No more terms are returned than asked for """
+
+        self.assertEqual(self.trie.suggest("m", limit=2),
+                         ["Meat", "Meatballs"], "Limit not applied")
+
+    def test_no_terms(self):
+        """ An unknown prefix has no terms """
+
+        self.assertEqual(self.trie.suggest("Z"), [], "Terms for unknown")
+
+    def test_terms_counted_once(self):
+        """ A term added twice is in the trie once """
+
+        self.assertEqual(len(self.trie), 5, "Wrong number of terms")
+        self.assertIn("WATER", self.trie, "Term not found")
+        self.assertNotIn("Wat", self.trie, "Prefix taken as term")
+
+
+class TestTermIndex(unittest.TestCase):
+
+    def setUp(self):
+
+        self.diet = DietHeader(diet_name="Vega", permanent_diet=True)
+        self.lines = [DietLines(food_name=food_name,
+                                application_type="Don't eat",
+                                diet=self.diet)
+                      for food_name in ("Meat", "Fish", "Meat")]
+        session.add_all([self.diet, *self.lines])
+        session.flush()
+        self.index = TermIndex()
+
+    def tearDown(self):
+
+        session.reset()
+        term_index.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def test_terms_from_database(self):
+        """ The values of a field are proposed, most used first """
+
+        self.assertEqual(self.index.suggest("food_name", ""),
+                         ["Meat", "Fish"], "Wrong terms from database")
+        self.assertEqual(self.index.suggest("application_type", "d"),
+                         ["Don't eat"], "Wrong terms from database")
+
+    def test_new_term_added(self):
+        """ A term added after loading is proposed """
+
+        self.index.suggest("food_name", "M")
+        self.index.add("food_name", "Melon")
+        self.assertEqual(self.index.suggest("food_name", "M"),
+                         ["Meat", "Melon"], "New term not proposed")
+
+    def test_uses_counted_on_flush(self):
+        """ Saving a term counts up its uses in the summary, the trie on
+        commit """
+
+        term_index.suggest("food_name", "")
+        session.add_all([DietLines(food_name=food_name,
+                                   application_type="Eat",
+                                   diet=self.diet)
+                         for food_name in ("Fish", "Fish", "Rice")])
+        session.flush()
+        self.assertEqual(session.scalar(
+            select(TermUsage.uses).where(TermUsage.field == "food_name",
+                                         TermUsage.term == "Fish")), 3,
+            "Uses not counted in summary")
+        self.assertEqual(term_index.suggest("food_name", ""),
+                         ["Meat", "Fish"], "Uses counted before commit")
+        session.commit()
+        self.assertEqual(term_index.suggest("food_name", ""),
+                         ["Fish", "Meat", "Rice"], "Uses not counted")
+
+    def test_rolled_back_uses_not_counted(self):
+        """ Uses of a rolled back save are not in the tries """
+
+        session.commit()
+        term_index.suggest("food_name", "")
+        session.add_all([DietLines(food_name=food_name,
+                                   application_type="Eat",
+                                   diet=self.diet)
+                         for food_name in ("Fish", "Fish", "Rice")])
+        session.flush()
+        session.rollback()
+        self.assertEqual(term_index.suggest("food_name", ""),
+                         ["Meat", "Fish"], "Rolled back uses counted")
+        self.assertEqual(term_index.trie("food_name").uses("Fish"), 1,
+                         "Rolled back uses counted")
+
+    def test_rolled_back_load_forgotten(self):
+        """ A trie loaded while saving is loaded again after a rollback """
+
+        session.commit()
+        session.add(Medication(medication="Visirant 10mg",
+                               start_date=date.today()))
+        session.flush()
+        self.assertEqual(term_index.trie("medication").uses("Visirant 10mg"),
+                         1, "Saved term not loaded")
+        session.rollback()
+        self.assertEqual(term_index.trie("medication").uses("Visirant 10mg"),
+                         0, "Rolled back uses counted")
+
+    def test_changed_term_counted(self):
+        """ A changed value counts as a use of the new term """
+
+        term_index.suggest("food_name", "")
+        self.lines[1].food_name = "Rice"
+        session.commit()
+        self.assertEqual(term_index.trie("food_name").uses("Rice"), 1,
+                         "Changed term not counted")
+        self.assertEqual(TermIndex().suggest("application_type", ""),
+                         ["Don't eat"], "Unchanged field counted")
+
+    def test_uses_read_from_summary(self):
+        """ A new index reads the counted uses from the summary """
+
+        session.add(DietLines(food_name="Fish", application_type="Eat",
+                              diet=self.diet))
+        session.flush()
+        self.assertEqual(TermIndex().trie("food_name").uses("Fish"), 2,
+                         "Uses not read from summary")
+
+
+    def test_counted_elsewhere(self):
+        """ Uses counted by another workstation first are not saved twice """
+
+        session.add(TermUsage(field="medication", term="Asphacron 70mg",
+                              uses=2))
+        session.flush()
+        self.assertFalse(save_counted(session.connection(), "medication",
+                                      [("Visirant 10mg", 1),
+                                       ("Asphacron 70mg", 2)]),
+                         "Counted uses saved twice")
+        self.assertEqual(session.scalars(
+            select(TermUsage.term).where(TermUsage.field == "medication"))
+            .all(), ["Asphacron 70mg"], "Savepoint not rolled back")
+
+    def test_count_up_inserted_elsewhere(self):
+        """ A term inserted by another workstation is counted up """
+
+        session.add(TermUsage(field="food_name", term="Rice", uses=4))
+        session.flush()
+        connection = session.connection()
+        execute = connection.execute
+        statements = []
+
+        def missed_update(statement, *args, **kwargs):
+            statements.append(statement)
+            if len(statements) == 1:
+                return mock.Mock(rowcount=0)
+            return execute(statement, *args, **kwargs)
+
+        with mock.patch.object(connection, "execute", missed_update):
+            count_up(connection, "food_name", "Rice", 3)
+        self.assertEqual(session.scalar(
+            select(TermUsage.uses).where(TermUsage.field == "food_name",
+                                         TermUsage.term == "Rice")), 7,
+            "Uses not counted up after failed insert")
+
+    def test_saved_terms_once_per_instance(self):
+        """ Each new or changed instance is looked at once """
+
+        self.lines[0].food_name = "Rice"
+        session.add(DietLines(food_name="Rice", application_type="Eat",
+                              diet=self.diet))
+        self.assertEqual(saved_terms(session),
+                         Counter({("food_name", "Rice"): 2,
+                                  ("application_type", "Eat"): 1}),
+                         "Wrong terms saved")
+
+
+class TestTermCompleter(unittest.TestCase):
+
+    def setUp(self):
+
+        self.line_edit = QLineEdit()
+        self.completer = TermCompleter(
+            self.line_edit, PrefixTrie(["Meat", "Melon", "Water"]).suggest)
+
+    def test_terms_shown_for_text(self):
+        """ The terms for the text typed are in the completer """
+
+        self.completer.update_terms("Me")
+        self.assertEqual(self.completer.model().stringList(),
+                         ["Meat", "Melon"], "Wrong terms proposed")
+        self.assertIs(self.line_edit.completer(), self.completer,
+                      "Completer not on line edit")
+
+    def test_no_terms_for_empty_text(self):
+        """ Nothing is proposed before typing """
+
+        self.completer.update_terms("")
+        self.assertEqual(self.completer.model().stringList(), [],
+                         "Terms proposed for nothing")
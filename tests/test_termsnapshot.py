@@ -0,0 +1,142 @@
+#    Copyright 2025 Menno Hölscher
+#
+#    This file is part of carereport.
+
+#    carereport is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    carereport is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with carereport.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import unittest
+from datetime import timedelta
+from sqlalchemy import update, select, func
+import carereport as cr
+from carereport import session
+from carereport.models.medical import DietHeader, DietLines
+from carereport.models.suggestions import TermIndex, TermUsage, term_index
+from carereport.models.termsnapshot import (TermSnapshot, SnapshotError,
+                                            write_snapshot, open_snapshot,
+                                            save_snapshot)
+
+
+class TestTermSnapshot(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "terms.snapshot")
+        self.diet = DietHeader(diet_name="Vega", permanent_diet=True)
+        self.lines = [DietLines(food_name=food_name,
+                                application_type="Don't eat",
+                                diet=self.diet)
+                      for food_name in ("Meat", "Fish", "Meat", "Crème")]
+        session.add_all([self.diet, *self.lines])
+        session.commit()
+        self.index = TermIndex()
+
+    def tearDown(self):
+
+        if self.index.snapshot is not None:
+            self.index.snapshot.close()
+        self.directory.cleanup()
+        session.reset()
+        term_index.reset()
+        cr.Base.metadata.drop_all(cr.engine)
+        cr.Base.metadata.create_all(cr.engine)
+
+    def test_terms_from_snapshot(self):
+        """ The terms in the summary are read back from the snapshot """
+
+        watermark = write_snapshot(self.path)
+        snapshot = TermSnapshot(self.path)
+        self.assertEqual(snapshot.watermark, watermark, "Wrong watermark")
+        self.assertEqual(sorted(snapshot.terms("food_name")),
+                         [("Crème", 1), ("Fish", 1), ("Meat", 2)],
+                         "Wrong terms in snapshot")
+        self.assertNotIn("treatment_name", snapshot,
+                         "Unused field in snapshot")
+        snapshot.close()
+
+    def test_watermark_set_back(self):
+        """ The watermark is the margin before the last change """
+
+        last_change = session.scalar(select(func.max(TermUsage.updated_at)))
+        watermark = write_snapshot(self.path, margin=60)
+        self.assertLessEqual(watermark, last_change - timedelta(seconds=60),
+                             "Watermark not set back")
+
+    def test_uncommitted_not_written(self):
+        """ Uses not committed are not in the snapshot """
+
+        session.add(DietLines(food_name="Rice", application_type="Eat",
+                              diet=self.diet))
+        session.flush()
+        write_snapshot(self.path)
+        snapshot = TermSnapshot(self.path)
+        self.assertNotIn("Rice", dict(snapshot.terms("food_name")),
+                         "Uncommitted use in snapshot")
+        snapshot.close()
+        session.rollback()
+
+    def test_index_loads_snapshot(self):
+        """ An index with a snapshot proposes its terms """
+
+        write_snapshot(self.path)
+        self.assertTrue(open_snapshot(self.index, self.path),
+                        "Snapshot not opened")
+        self.assertEqual(self.index.suggest("food_name", ""),
+                         ["Meat", "Crème", "Fish"], "Snapshot not loaded")
+
+    def test_changes_since_watermark(self):
+        """ Uses changed after the snapshot was written are applied """
+
+        write_snapshot(self.path)
+        open_snapshot(self.index, self.path)
+        session.execute(update(TermUsage)
+                        .where(TermUsage.term == "Fish")
+                        .values(uses=5, updated_at=self.index.snapshot
+                                .watermark))
+        session.add(DietLines(food_name="Rice", application_type="Eat",
+                              diet=self.diet))
+        session.commit()
+        self.assertEqual(self.index.suggest("food_name", ""),
+                         ["Fish", "Meat", "Crème", "Rice"],
+                         "Changes not applied")
+
+    def test_bad_snapshot_skipped(self):
+        """ Without a readable snapshot the index reads the database """
+
+        with open(self.path, "wb") as snapshot_file:
+            snapshot_file.write(b"Not a snapshot at all")
+        with self.assertRaises(SnapshotError):
+            TermSnapshot(self.path)
+        self.assertFalse(open_snapshot(self.index, self.path),
+                         "Bad snapshot opened")
+        self.assertFalse(open_snapshot(self.index, self.path + ".none"),
+                         "Missing snapshot opened")
+        self.assertEqual(self.index.suggest("food_name", "M"), ["Meat"],
+                         "Database not read")
+
+    def test_save_replaces_snapshot(self):
+        """ Saving writes a new snapshot over the one opened """
+
+        write_snapshot(self.path)
+        open_snapshot(self.index, self.path)
+        session.add(DietLines(food_name="Rice", application_type="Eat",
+                              diet=self.diet))
+        session.commit()
+        save_snapshot(self.index, self.path)
+        self.assertIsNone(self.index.snapshot, "Snapshot not closed")
+        open_snapshot(self.index, self.path)
+        self.assertIn("Rice", dict(self.index.snapshot.terms("food_name")),
+                      "Snapshot not replaced")